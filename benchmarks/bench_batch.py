@@ -0,0 +1,65 @@
+"""
+Benchmarks for batch jobs rendered frame by frame against pipelined runs
+overlapping the catalog query, the rendering, the noise and the writing
+of consecutive frames, with the utilization of every pipelined stage
+"""
+import pathlib
+import tempfile
+
+from harness import benchmark
+from star_field_image_simulator.batch.job_spec import JobSpec
+from star_field_image_simulator.batch.runner import pipeline_metrics, run_job
+
+
+NUM_FRAMES = 16
+JOB = {
+    "num_frames": NUM_FRAMES,
+    "seed": 5,
+    "attitude": {"distribution": "uniform", "roll": [-90, 90]},
+    "parameters": {
+        "resX": 1024,
+        "resY": 1024,
+        "fovX": 20,
+        "fovY": 20,
+        "magnitude_limit": 8,
+        "num_missing_stars": 2,
+        "num_false_stars": 2,
+        "min_false_star_magnitude": 5,
+        "star_intensity": 100,
+        "star_sigma": 1.2,
+        "position_noise": 0.1,
+    },
+    "noise": {"nDC": 0.5, "tauDC": 1, "nRN": 0.1, "shot_noise": 0.2},
+}
+
+
+def run_once(pipelined: bool) -> dict[str, float]:
+    """Runs the job into a temporary directory, returns the utilizations"""
+    with tempfile.TemporaryDirectory(prefix="bench_batch_") as output:
+        run_job(
+            JobSpec(JOB),
+            output,
+            workers=1,
+            chunk_size=NUM_FRAMES,
+            progress=lambda count: None,
+            pipelined=pipelined,
+        )
+        metrics = pipeline_metrics(pathlib.Path(output))
+    if metrics is None:
+        return {}
+    return {
+        f"{stage}_utilization": round(utilization, 3)
+        for stage, utilization in metrics.utilization().items()
+    }
+
+
+def register_batch(pipelined: bool) -> None:
+    mode = "pipelined" if pipelined else "sequential"
+
+    @benchmark(f"batch/{NUM_FRAMES}frames/1worker/{mode}", repeat=3)
+    def setup():
+        return lambda: run_once(pipelined), run_once(pipelined)
+
+
+for pipelined in (False, True):
+    register_batch(pipelined)
@@ -0,0 +1,691 @@
+"""
+Benchmarks for the image generation stages
+
+Covers every branch of fetch_stars, the Star list construction in
+create_stars_list and draw_star_field_image over its lazy/integrated
+modes, resolutions and star counts, the perturbation stage with thousands
+of false stars, the on-disk star selection cache, the star density
+estimate used to screen attitudes, multi-head camera rigs with a shared
+or per-head catalog query, star selection from the catalog propagated
+to an epoch, the numpy and numba kernel backends, the numpy backend
+rendering bands of rows on 1 to os.cpu_count() threads, the
+flux-adaptive sub-image sizes on dense fields (with their flux
+conservation error), the FFT renderer (with its error against the exact
+integrated PSF), the tiled renderer on mosaics, Monte-Carlo trials
+moving a few stars of an IncrementalCanvas against redrawing the frame
+roll sweeps reusing the cached cone of a StarSelection, the
+vectorized renderer against the direct one on galactic plane fields, and
+wide galactic plane frames rendered from thinned catalogs.
+"""
+import numpy as np
+import os
+import tempfile
+
+from harness import benchmark
+from star_field_image_simulator.image_generation.camera_rig import (
+    CameraHead,
+    CameraRig,
+    mounting_rotation,
+)
+from star_field_image_simulator.image_generation.canvas_computation import (
+    draw_star_field_image,
+    generate_star_field_image,
+)
+from star_field_image_simulator.image_generation.catalog_thinning import (
+    thinned_catalog_path,
+)
+from star_field_image_simulator.image_generation.constants import (
+    U_COORDINATE_ORIGIN,
+    V_COORDINATE_ORIGIN,
+    get_database_path,
+)
+from star_field_image_simulator.image_generation.data_manipulation import (
+    Celestial2Image,
+    Star,
+    create_stars_list,
+    fetch_stars,
+    perturb_stars,
+    stars_to_array,
+)
+from star_field_image_simulator.image_generation.epoch_propagation import (
+    propagate_catalog,
+)
+from star_field_image_simulator.image_generation.incremental_canvas import (
+    IncrementalCanvas,
+)
+from star_field_image_simulator.image_generation.kernels import HAS_NUMBA
+from star_field_image_simulator.image_generation.selection_cache import (
+    StarSelectionCache,
+)
+from star_field_image_simulator.image_generation.star_density import (
+    count_stars_in_fov,
+)
+from star_field_image_simulator.image_generation.star_selection import (
+    StarSelection,
+)
+from star_field_image_simulator.image_generation.tiled_rendering import (
+    render_tiled_star_field_image,
+)
+from typing import Optional
+
+
+FOV = 12
+MAGNITUDE_LIMIT = 6.0
+STAR_INTENSITY = 100.0
+STAR_SIGMA = 1.2
+RESOLUTIONS = [256, 512, 1024, 2048]
+LAZY_STAR_COUNTS = [10, 100, 1000, 10_000]
+# the non-lazy renderer evaluates every star over the whole canvas
+FULL_CANVAS_STAR_COUNTS = [1, 10]
+
+"(alpha0, delta0) attitudes reaching each of the fetch_stars branches"
+FETCH_BRANCHES = {
+    "north_pole": (0.0, 90.0),
+    "south_pole": (0.0, -90.0),
+    "with_loop": (0.0, 87.3),
+    "with_overflow": (0.0, 0.0),
+    "no_loop": (180.0, 0.0),
+}
+
+
+def random_stars(num_stars: int, resX: int, resY: int) -> list[Star]:
+    """Creates reproducible stars scattered over the canvas"""
+    bench_rng = np.random.default_rng(num_stars)
+    stars = []
+    for index in range(num_stars):
+        star = Star(index, 0, 0, bench_rng.uniform(-1, MAGNITUDE_LIMIT))
+        star.u = bench_rng.uniform(0, resX)
+        star.v = bench_rng.uniform(0, resY)
+        stars.append(star)
+    return stars
+
+
+def register_fetch_stars(branch: str, alpha0: float, delta0: float) -> None:
+    @benchmark(f"fetch_stars/{branch}")
+    def setup():
+        return lambda: fetch_stars(
+            alpha0, delta0, FOV, FOV, MAGNITUDE_LIMIT, get_database_path()
+        )
+
+
+def register_create_stars_list(
+    branch: str, alpha0: float, delta0: float
+) -> None:
+    @benchmark(f"create_stars_list/{branch}")
+    def setup():
+        c2i = Celestial2Image(alpha0, delta0, 0, FOV, FOV, 1024, 1024)
+        return lambda: create_stars_list(
+            alpha0,
+            delta0,
+            MAGNITUDE_LIMIT,
+            FOV,
+            FOV,
+            U_COORDINATE_ORIGIN,
+            1024,
+            V_COORDINATE_ORIGIN,
+            1024,
+            c2i,
+            get_database_path(),
+        )
+
+
+def register_draw_star_field_image(
+    resolution: int, num_stars: int, integrated: bool, lazy: bool
+) -> None:
+    mode = (
+        f"{'lazy' if lazy else 'full'}_"
+        f"{'integrated' if integrated else 'gaussian'}"
+    )
+    quick = resolution in (256, 1024) and num_stars <= 1000
+    if not lazy:
+        quick = resolution == 256
+
+    @benchmark(
+        f"draw_star_field_image/{mode}/{resolution}px/{num_stars}stars",
+        quick=quick,
+        repeat=5 if lazy else 3,
+    )
+    def setup():
+        stars = random_stars(num_stars, resolution, resolution)
+        return lambda: draw_star_field_image(
+            stars,
+            resolution,
+            resolution,
+            STAR_INTENSITY,
+            STAR_SIGMA,
+            integrated,
+            lazy,
+            backend="numpy",
+        )
+
+
+def register_kernel_backend(
+    num_stars: int, integrated: bool, backend: str
+) -> None:
+    mode = f"lazy_{'integrated' if integrated else 'gaussian'}"
+
+    @benchmark(
+        f"draw_star_field_image/{backend}_backend/{mode}/{num_stars}stars",
+        quick=num_stars <= 1000,
+    )
+    def setup():
+        stars = random_stars(num_stars, 1024, 1024)
+
+        def run():
+            return draw_star_field_image(
+                stars,
+                1024,
+                1024,
+                STAR_INTENSITY,
+                STAR_SIGMA,
+                integrated,
+                backend=backend,
+            )
+
+        # compile outside of the timed calls
+        run()
+        return run
+
+
+for branch, (alpha0, delta0) in FETCH_BRANCHES.items():
+    register_fetch_stars(branch, alpha0, delta0)
+    register_create_stars_list(branch, alpha0, delta0)
+
+for lazy in (True, False):
+    for integrated in (True, False):
+        for resolution in RESOLUTIONS:
+            counts = LAZY_STAR_COUNTS if lazy else FULL_CANVAS_STAR_COUNTS
+            for num_stars in counts:
+                register_draw_star_field_image(
+                    resolution, num_stars, integrated, lazy
+                )
+
+for integrated in (True, False):
+    for num_stars in LAZY_STAR_COUNTS:
+        register_kernel_backend(num_stars, integrated, "numpy")
+        if HAS_NUMBA:
+            register_kernel_backend(num_stars, integrated, "numba")
+
+
+def register_render_threads(num_stars: int, lazy: bool, threads: int) -> None:
+    mode = "lazy" if lazy else "full"
+
+    @benchmark(
+        f"draw_star_field_image/numpy_backend/{mode}/{num_stars}stars"
+        f"/{threads}threads",
+        repeat=3,
+    )
+    def setup():
+        stars = random_stars(num_stars, 1024, 1024)
+        return lambda: draw_star_field_image(
+            stars,
+            1024,
+            1024,
+            STAR_INTENSITY,
+            STAR_SIGMA,
+            lazy=lazy,
+            backend="numpy",
+            threads=threads,
+        )
+
+
+for threads in sorted({1, 2, 4, os.cpu_count() or 1}):
+    register_render_threads(10_000, True, threads)
+    register_render_threads(20, False, threads)
+
+
+def register_epoch_selection(
+    branch: str, alpha0: float, delta0: float
+) -> None:
+    @benchmark(f"epoch_catalog_select/{branch}")
+    def setup():
+        c2i = Celestial2Image(alpha0, delta0, 0, FOV, FOV, 1024, 1024)
+        # propagated once per epoch, outside of the timed calls
+        catalog = propagate_catalog(2030.0)
+        return lambda: catalog.select(
+            c2i,
+            MAGNITUDE_LIMIT,
+            U_COORDINATE_ORIGIN,
+            1024,
+            V_COORDINATE_ORIGIN,
+            1024,
+        )
+
+
+for branch in ("north_pole", "with_overflow", "no_loop"):
+    register_epoch_selection(branch, *FETCH_BRANCHES[branch])
+
+
+def register_perturbation(num_stars: int, num_false_stars: int) -> None:
+    @benchmark(
+        f"perturb_stars/{num_stars}stars/{num_false_stars}false_stars",
+        quick=num_false_stars <= 10_000,
+    )
+    def setup():
+        stars = stars_to_array(random_stars(num_stars, 1024, 1024))
+        return lambda: perturb_stars(
+            stars, num_stars // 10, num_false_stars, 1024, 1024, 6.0, 0.5
+        )
+
+
+for num_false_stars in (1000, 10_000, 100_000):
+    register_perturbation(1000, num_false_stars)
+
+
+"removed when the interpreter exits"
+SELECTION_CACHE_DIRECTORY = tempfile.TemporaryDirectory()
+
+
+def register_selection_cache(cached: bool) -> None:
+    @benchmark(
+        "generate_star_field_image/galactic_plane/"
+        f"{'selection_cache_hit' if cached else 'no_selection_cache'}",
+        repeat=5,
+    )
+    def setup():
+        alpha0, delta0, phi0 = GALACTIC_PLANE_ATTITUDE
+        cache = None
+        if cached:
+            cache = StarSelectionCache(SELECTION_CACHE_DIRECTORY.name)
+        return lambda: generate_star_field_image(
+            alpha0,
+            delta0,
+            phi0,
+            1024,
+            1024,
+            20,
+            20,
+            MAGNITUDE_LIMIT,
+            0,
+            0,
+            MAGNITUDE_LIMIT,
+            STAR_INTENSITY,
+            STAR_SIGMA,
+            0,
+            selection_cache=cache,
+        )
+
+
+for cached in (False, True):
+    register_selection_cache(cached)
+
+
+def register_star_count(branch: str, alpha0: float, delta0: float) -> None:
+    @benchmark(f"count_stars_in_fov/{branch}")
+    def setup():
+        # build the density map outside of the timed calls
+        count_stars_in_fov(alpha0, delta0, 0, FOV, FOV, MAGNITUDE_LIMIT)
+        return lambda: count_stars_in_fov(
+            alpha0, delta0, 0, FOV, FOV, MAGNITUDE_LIMIT
+        )
+
+
+for branch in ("north_pole", "with_overflow"):
+    register_star_count(branch, *FETCH_BRANCHES[branch])
+
+
+def rig_heads(num_heads: int) -> list[CameraHead]:
+    """heads spread around the body y axis"""
+    return [
+        CameraHead(
+            mounting_rotation(0, 360 * i / num_heads), FOV, FOV, 1024, 1024
+        )
+        for i in range(num_heads)
+    ]
+
+
+def register_camera_rig(num_heads: int, shared: bool) -> None:
+    @benchmark(
+        f"camera_rig/{num_heads}heads/"
+        f"{'shared_query' if shared else 'query_per_head'}"
+    )
+    def setup():
+        rig = CameraRig(rig_heads(num_heads))
+        if shared:
+            return lambda: rig.project(20, 20, 0, MAGNITUDE_LIMIT)
+        rigs = [CameraRig([head]) for head in rig.heads]
+        return lambda: [
+            head_rig.project(20, 20, 0, MAGNITUDE_LIMIT) for head_rig in rigs
+        ]
+
+
+for num_heads in (1, 2, 4, 8):
+    for shared in (False, True):
+        register_camera_rig(num_heads, shared)
+
+
+def register_tiled_rendering(
+    resolution: int, num_stars: int, max_workers: int
+) -> None:
+    @benchmark(
+        f"render_tiled_star_field_image/{resolution}px/{num_stars}stars/"
+        f"{max_workers}workers",
+        quick=resolution <= 4096,
+        repeat=3,
+    )
+    def setup():
+        stars = random_stars(num_stars, resolution, resolution)
+        return lambda: render_tiled_star_field_image(
+            stars,
+            resolution,
+            resolution,
+            STAR_INTENSITY,
+            STAR_SIGMA,
+            writer=lambda v_origin, u_origin, tile: None,
+            max_workers=max_workers,
+        )
+
+
+for resolution, num_stars in [(4096, 10_000), (16384, 100_000)]:
+    for max_workers in (1, 4):
+        register_tiled_rendering(resolution, num_stars, max_workers)
+
+
+"galactic center, the densest region of the catalog"
+GALACTIC_PLANE_ATTITUDE = (266.4, -28.9, 0.0)
+
+
+def galactic_plane_stars(
+    resolution: int, fov: float = 25, magnitude: float = 12
+) -> list[Star]:
+    """Returns the catalog stars of a wide field on the galactic plane"""
+    alpha0, delta0, phi0 = GALACTIC_PLANE_ATTITUDE
+    c2i = Celestial2Image(
+        alpha0, delta0, phi0, fov, fov, resolution, resolution
+    )
+    return create_stars_list(
+        alpha0,
+        delta0,
+        magnitude,
+        fov,
+        fov,
+        U_COORDINATE_ORIGIN,
+        resolution,
+        V_COORDINATE_ORIGIN,
+        resolution,
+        c2i,
+        get_database_path(),
+    )
+
+
+def flux_error(image: np.ndarray, stars: list[Star], sigma: float) -> float:
+    """
+    Relative difference between the rendered and the true total flux of
+    the stars whose PSF lies well inside the canvas
+    """
+    magnitudes = np.array([star.magnitude for star in stars])
+    expected = np.sum(
+        STAR_INTENSITY / 2.512 ** magnitudes * 2 * np.pi * sigma ** 2
+    )
+    return float(abs(image.sum() - expected) / expected)
+
+
+def register_adaptive_window(
+    sigma: float, residual_threshold: Optional[float]
+) -> None:
+    resolution = 2048
+    window = (
+        "fixed"
+        if residual_threshold is None
+        else f"adaptive_{residual_threshold:g}"
+    )
+
+    @benchmark(
+        f"draw_star_field_image/{window}/sigma{sigma:g}/galactic_plane",
+        repeat=3,
+    )
+    def setup():
+        margin = 8 * sigma + 8
+        stars = [
+            star
+            for star in galactic_plane_stars(resolution)
+            if margin <= star.u <= resolution - margin  # type: ignore
+            and margin <= star.v <= resolution - margin  # type: ignore
+        ]
+
+        def render():
+            return draw_star_field_image(
+                stars,
+                resolution,
+                resolution,
+                STAR_INTENSITY,
+                sigma,
+                residual_threshold=residual_threshold,
+            )[0]
+
+        return render, {
+            "stars": len(stars),
+            "flux_error": flux_error(render(), stars, sigma),
+        }
+
+
+for sigma in (1.2, 3.0):
+    for residual_threshold in (None, 1e-3, 1e-1):
+        register_adaptive_window(sigma, residual_threshold)
+
+
+def register_fft(resolution: int, num_stars: int, sigma: float) -> None:
+    @benchmark(
+        f"draw_star_field_image/fft_integrated/sigma{sigma:g}/"
+        f"{resolution}px/{num_stars}stars",
+        quick=resolution <= 1024,
+        repeat=3,
+    )
+    def setup():
+        stars = random_stars(num_stars, resolution, resolution)
+
+        def render():
+            return draw_star_field_image(
+                stars,
+                resolution,
+                resolution,
+                STAR_INTENSITY,
+                sigma,
+                lazy=False,
+                method="fft",
+            )[0]
+
+        # accuracy against the exact integrated evaluation
+        exact, _ = draw_star_field_image(
+            stars[:100],
+            resolution,
+            resolution,
+            STAR_INTENSITY,
+            sigma,
+            True,
+            False,
+        )
+        approximate, _ = draw_star_field_image(
+            stars[:100],
+            resolution,
+            resolution,
+            STAR_INTENSITY,
+            sigma,
+            lazy=False,
+            method="fft",
+        )
+        return render, {
+            "max_error_over_peak": float(
+                np.abs(approximate - exact).max() / exact.max()
+            ),
+        }
+
+
+for resolution in (512, 2048):
+    for num_stars in (100, 10_000):
+        for sigma in (1.5, 4.0):
+            register_fft(resolution, num_stars, sigma)
+
+
+@benchmark("draw_star_field_image/fft/sigma3/galactic_plane", repeat=3)
+def setup_fft_galactic_plane():
+    stars = galactic_plane_stars(2048)
+    return lambda: draw_star_field_image(
+        stars, 2048, 2048, STAR_INTENSITY, 3.0, method="fft"
+    )
+
+
+def register_position_trial(num_stars: int, num_moved: int) -> None:
+    name = f"position_trial/{num_stars}stars/{num_moved}moved"
+
+    @benchmark(f"{name}/incremental_canvas")
+    def setup_incremental():
+        stars = stars_to_array(random_stars(num_stars, 1024, 1024))
+        canvas = IncrementalCanvas(1024, 1024, STAR_INTENSITY, STAR_SIGMA)
+        handles = canvas.add_stars(stars)
+        generator = np.random.default_rng(0)
+
+        def run():
+            moved = generator.choice(handles, num_moved, replace=False)
+            canvas.move_stars(
+                moved,
+                stars["u"][moved] + generator.normal(0, 0.5, num_moved),
+                stars["v"][moved] + generator.normal(0, 0.5, num_moved),
+            )
+
+        return run
+
+    @benchmark(f"{name}/redraw")
+    def setup_redraw():
+        stars = stars_to_array(random_stars(num_stars, 1024, 1024))
+        generator = np.random.default_rng(0)
+
+        def run():
+            trial = stars.copy()
+            moved = generator.choice(num_stars, num_moved, replace=False)
+            trial["u"][moved] += generator.normal(0, 0.5, num_moved)
+            trial["v"][moved] += generator.normal(0, 0.5, num_moved)
+            return draw_star_field_image(
+                trial,
+                1024,
+                1024,
+                STAR_INTENSITY,
+                STAR_SIGMA,
+                backend="numpy",
+            )
+
+        return run
+
+
+for num_stars in (100, 1000):
+    register_position_trial(num_stars, 5)
+
+
+ROLLS = np.linspace(-90, 90, 36)
+
+
+def register_roll_sweep(branch: str, alpha0: float, delta0: float) -> None:
+    def select_roll(select):
+        return [
+            select(Celestial2Image(alpha0, delta0, phi0, FOV, FOV, 1024, 1024))
+            for phi0 in ROLLS
+        ]
+
+    @benchmark(f"roll_sweep/{branch}/{len(ROLLS)}rolls/star_selection")
+    def setup_star_selection():
+        def run():
+            selection = StarSelection()
+            return select_roll(
+                lambda c2i: selection.select(
+                    c2i,
+                    MAGNITUDE_LIMIT,
+                    U_COORDINATE_ORIGIN,
+                    1024,
+                    V_COORDINATE_ORIGIN,
+                    1024,
+                )
+            )
+
+        return run
+
+    @benchmark(f"roll_sweep/{branch}/{len(ROLLS)}rolls/create_stars_list")
+    def setup_create_stars_list():
+        path = get_database_path()
+        return lambda: select_roll(
+            lambda c2i: create_stars_list(
+                alpha0,
+                delta0,
+                MAGNITUDE_LIMIT,
+                FOV,
+                FOV,
+                U_COORDINATE_ORIGIN,
+                1024,
+                V_COORDINATE_ORIGIN,
+                1024,
+                c2i,
+                path,
+            )
+        )
+
+
+for branch in ("no_loop", "north_pole"):
+    register_roll_sweep(branch, *FETCH_BRANCHES[branch])
+
+
+def register_vectorized(magnitude: float, method: str) -> None:
+    @benchmark(
+        f"draw_star_field_image/galactic_plane/magnitude{magnitude:g}"
+        f"/{method}",
+        repeat=3,
+    )
+    def setup():
+        stars = stars_to_array(galactic_plane_stars(2048, magnitude=magnitude))
+        return (
+            lambda: draw_star_field_image(
+                stars,
+                2048,
+                2048,
+                STAR_INTENSITY,
+                STAR_SIGMA,
+                method=method,
+                backend="numpy",
+            ),
+            {"num_stars": len(stars)},
+        )
+
+
+for magnitude in (7, 9, 12):
+    for method in ("direct", "vectorized"):
+        register_vectorized(magnitude, method)
+
+
+def register_thinned_catalog(stars_per_cell: Optional[int]) -> None:
+    thinning = (
+        "full" if stars_per_cell is None else f"{stars_per_cell}per_cell"
+    )
+
+    @benchmark(
+        f"generate_star_field_image/galactic_plane/25deg/magnitude12"
+        f"/{thinning}",
+        repeat=3,
+    )
+    def setup():
+        if stars_per_cell is not None:
+            # compiled once, outside the timings
+            thinned_catalog_path(stars_per_cell)
+        alpha0, delta0, phi0 = GALACTIC_PLANE_ATTITUDE
+
+        def run():
+            return generate_star_field_image(
+                alpha0,
+                delta0,
+                phi0,
+                2048,
+                2048,
+                25,
+                25,
+                12,
+                0,
+                0,
+                5,
+                STAR_INTENSITY,
+                STAR_SIGMA,
+                0,
+                stars_per_cell=stars_per_cell,
+            )
+
+        return run, {"num_stars": len(run()[1])}
+
+
+for stars_per_cell in (None, 1, 2, 4):
+    register_thinned_catalog(stars_per_cell)
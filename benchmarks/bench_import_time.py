@@ -0,0 +1,52 @@
+"""
+Import-time benchmarks
+
+Each benchmark starts a fresh interpreter importing one module, i.e. the
+cold start of a short-lived worker. The timed value is the wall time of
+the whole subprocess; the cumulative import time reported by
+``python -X importtime`` for the module is attached as
+``import_time_us``.
+"""
+import subprocess
+import sys
+
+from harness import benchmark
+
+
+MODULES = [
+    "star_field_image_simulator.noise_addition.noise_addition",
+    "star_field_image_simulator.image_generation.constants",
+    "star_field_image_simulator.image_generation.data_manipulation",
+    "star_field_image_simulator.image_generation.canvas_computation",
+]
+
+
+def import_time_us(module: str) -> int:
+    """Returns the cumulative import time of module in microseconds"""
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        check=True,
+        text=True,
+    )
+    # lines read "import time: <self> | <cumulative> | <name>"
+    for line in reversed(completed.stderr.splitlines()):
+        fields = line.split("|")
+        if len(fields) == 3 and fields[2].strip() == module:
+            return int(fields[1])
+    raise RuntimeError(f"{module} missing from the -X importtime output")
+
+
+def register_import_time(module: str) -> None:
+    @benchmark(f"import_time/{module}", repeat=5)
+    def setup():
+        samples = sorted(import_time_us(module) for _ in range(5))
+        command = [sys.executable, "-c", f"import {module}"]
+        return (
+            lambda: subprocess.run(command, check=True),
+            {"import_time_us": samples[len(samples) // 2]},
+        )
+
+
+for module in MODULES:
+    register_import_time(module)
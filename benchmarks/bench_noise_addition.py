@@ -0,0 +1,110 @@
+"""
+Benchmarks for the noise addition functions, the scaling of the banded
+dark current and shot noise over 1 to os.cpu_count() threads, and the
+sensor defects applied from cached maps, in memory or on disk, against
+drawing them per frame
+"""
+import numpy as np
+import os
+import tempfile
+
+from harness import benchmark
+from star_field_image_simulator.noise_addition.noise_addition import (
+    add_dark_current_noise,
+    add_read_noise,
+    add_shot_noise,
+)
+from star_field_image_simulator.noise_addition.sensor_model import (
+    SensorModel,
+    _generate_maps,
+)
+
+
+RESOLUTIONS = [256, 512, 1024, 2048]
+
+
+def clean_image(resolution: int) -> np.ndarray:
+    return np.random.default_rng(resolution).uniform(
+        0, 255, (resolution, resolution)
+    )
+
+
+def register_noise(resolution: int) -> None:
+    quick = resolution in (256, 1024)
+
+    @benchmark(f"add_dark_current_noise/{resolution}px", quick=quick)
+    def setup_dark_current():
+        image = clean_image(resolution)
+        return lambda: add_dark_current_noise(image, 0.5, 10)
+
+    @benchmark(f"add_shot_noise/{resolution}px", quick=quick)
+    def setup_shot():
+        image = clean_image(resolution)
+        return lambda: add_shot_noise(image, 1.0)
+
+    @benchmark(f"add_read_noise/{resolution}px", quick=quick)
+    def setup_read():
+        image = clean_image(resolution)
+        return lambda: add_read_noise(image, 0.5)
+
+
+for resolution in RESOLUTIONS:
+    register_noise(resolution)
+
+
+def register_noise_threads(threads: int) -> None:
+    @benchmark(f"add_dark_current_noise/2048px/{threads}threads")
+    def setup_dark_current():
+        image = clean_image(2048)
+        return lambda: add_dark_current_noise(
+            image, 0.5, 10, seed=0, threads=threads
+        )
+
+    @benchmark(f"add_shot_noise/2048px/{threads}threads")
+    def setup_shot():
+        image = clean_image(2048)
+        return lambda: add_shot_noise(image, 1.0, seed=0, threads=threads)
+
+
+for threads in sorted({1, 2, 4, os.cpu_count() or 1}):
+    register_noise_threads(threads)
+
+
+def register_sensor(resolution: int) -> None:
+    @benchmark(f"sensor_model/{resolution}px/cached_maps")
+    def setup_cached():
+        image = clean_image(resolution)
+        sensor = SensorModel(seed=1)
+        sensor.maps(resolution, resolution)
+        return lambda: sensor.apply(image)
+
+    @benchmark(f"sensor_model/{resolution}px/maps_on_disk")
+    def setup_on_disk():
+        image = clean_image(resolution)
+        # removed once the benchmark is dropped
+        directory = tempfile.TemporaryDirectory(prefix="bench_sensor_")
+        SensorModel(seed=1, cache_directory=directory.name).maps(
+            resolution, resolution
+        )
+
+        def run():
+            # every frame builds its model from the job parameters
+            sensor = SensorModel(seed=1, cache_directory=directory.name)
+            return sensor.apply(image)
+
+        return run
+
+    @benchmark(f"sensor_model/{resolution}px/maps_per_frame")
+    def setup_per_frame():
+        image = clean_image(resolution)
+        sensor = SensorModel(seed=1)
+
+        def run():
+            _generate_maps.cache_clear()
+            return sensor.apply(image)
+
+        return run
+
+
+for resolution in (1024, 2048):
+    register_sensor(resolution)
@@ -0,0 +1,56 @@
+"""
+Benchmarks for parameter sweeps with the memoized FramePipeline against
+render_frame, which reruns every stage for every frame
+"""
+import numpy as np
+
+from harness import benchmark
+from star_field_image_simulator.frames import render_frame
+from star_field_image_simulator.pipeline import FramePipeline
+
+
+PARAMS = {
+    "alpha0": 20,
+    "delta0": 20,
+    "phi0": 90,
+    "fovX": 20,
+    "fovY": 20,
+    "resX": 1024,
+    "resY": 1024,
+    "magnitude_limit": 6,
+    "num_missing_stars": 2,
+    "num_false_stars": 2,
+    "min_false_star_magnitude": 5,
+    "star_intensity": 100,
+    "star_sigma": 1.2,
+    "position_noise": 0.1,
+}
+SWEEPS = {
+    "shot_noise": np.linspace(0.1, 2, 50),
+    "star_sigma": np.linspace(0.8, 2, 10),
+}
+
+
+def register_sweep(name: str) -> None:
+    values = SWEEPS[name]
+
+    @benchmark(f"sweep/{name}/{len(values)}frames/pipeline", repeat=3)
+    def setup_pipeline():
+        def run():
+            pipeline = FramePipeline()
+            for value in values:
+                pipeline.render({**PARAMS, name: value})
+
+        return run
+
+    @benchmark(f"sweep/{name}/{len(values)}frames/render_frame", repeat=3)
+    def setup_render_frame():
+        def run():
+            for value in values:
+                render_frame({**PARAMS, name: value})
+
+        return run
+
+
+for name in SWEEPS:
+    register_sweep(name)
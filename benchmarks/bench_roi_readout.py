@@ -0,0 +1,55 @@
+"""
+Benchmarks for the ROI readout of tracking frames against rendering and
+adding noise to the full frame with render_frame
+"""
+import tempfile
+
+from harness import benchmark
+from star_field_image_simulator.frames import render_frame
+from star_field_image_simulator.image_generation.selection_cache import (
+    StarSelectionCache,
+)
+from star_field_image_simulator.roi_readout import generate_roi_readout
+
+
+NOISE = {"shot_noise": 0.5, "nDC": 0.5, "tauDC": 1, "nRN": 0.1}
+
+
+def frame(resolution: int) -> dict:
+    return {
+        "alpha0": 20,
+        "delta0": 20,
+        "phi0": 90,
+        "resX": resolution,
+        "resY": resolution,
+        "fovX": 20,
+        "fovY": 20,
+        "magnitude_limit": 5,
+        "num_missing_stars": 0,
+        "num_false_stars": 0,
+        "min_false_star_magnitude": 5,
+        "star_intensity": 100,
+        "star_sigma": 1.2,
+        "position_noise": 0.1,
+    }
+
+
+def register_tracking_frame(resolution: int) -> None:
+    # a tracking loop revisits its attitude, both cache the selection
+    @benchmark(f"tracking_frame/{resolution}px/roi_readout")
+    def setup_roi_readout():
+        cache = StarSelectionCache(tempfile.mkdtemp())
+        params = frame(resolution)
+        return lambda: generate_roi_readout(
+            **params, **NOISE, selection_cache=cache
+        )
+
+    @benchmark(f"tracking_frame/{resolution}px/full_frame", repeat=3)
+    def setup_full_frame():
+        cache = StarSelectionCache(tempfile.mkdtemp())
+        params = {**frame(resolution), **NOISE, "backend": "numpy"}
+        return lambda: render_frame(params, cache)
+
+
+for resolution in (1024, 2048):
+    register_tracking_frame(resolution)
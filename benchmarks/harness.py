@@ -0,0 +1,170 @@
+"""
+Minimal timing harness shared by the benchmark modules
+
+Benchmarks are registered with the ``benchmark`` decorator. The decorated
+function is the *setup* step: it builds every input the measurement needs
+and returns the zero-argument callable that is actually timed, optionally
+together with a dictionary of extra metrics (accuracy figures, counts, ...)
+that are copied verbatim into the results.
+
+Results are plain JSON so they can be diffed, archived by CI and compared
+against ``baseline.json`` to flag regressions.
+"""
+import json
+import platform
+import statistics
+import sys
+import time
+
+from typing import Any, Callable, Optional, Union
+
+
+Measured = Callable[[], Any]
+Setup = Callable[[], Union[Measured, tuple[Measured, dict[str, Any]]]]
+
+"registry of every benchmark, keyed by its unique name"
+BENCHMARKS: dict[str, "Benchmark"] = {}
+
+"relative slowdown (current / baseline median) reported as a regression"
+REGRESSION_THRESHOLD = 1.25
+
+"absolute slowdown in seconds below which differences are ignored"
+REGRESSION_MIN_SECONDS = 1e-4
+
+
+class Benchmark:
+    """
+    A single registered benchmark
+
+    Attributes
+    ----------
+    name : str
+        Unique name, "/"-separated from the general to the specific
+    setup : Callable
+        Builds the inputs and returns the callable to be timed
+    quick : bool
+        Whether the benchmark is part of the quick subset
+    repeat : int
+        Number of timed repetitions
+    """
+
+    def __init__(
+        self, name: str, setup: Setup, quick: bool, repeat: int
+    ) -> None:
+        self.name = name
+        self.setup = setup
+        self.quick = quick
+        self.repeat = repeat
+
+    def run(self, repeat: Optional[int] = None) -> dict[str, Any]:
+        """Runs the benchmark and returns its timing summary"""
+        prepared = self.setup()
+        extra: dict[str, Any] = {}
+        if isinstance(prepared, tuple):
+            measured, extra = prepared
+        else:
+            measured = prepared
+
+        # warm-up run, excluded from the statistics
+        measured()
+
+        timings = []
+        for _ in range(repeat or self.repeat):
+            start = time.perf_counter()
+            measured()
+            timings.append(time.perf_counter() - start)
+
+        result: dict[str, Any] = {
+            "min": min(timings),
+            "median": statistics.median(timings),
+            "mean": statistics.fmean(timings),
+            "repeat": len(timings),
+        }
+        result.update(extra)
+        return result
+
+
+def benchmark(
+    name: str, quick: bool = True, repeat: int = 5
+) -> Callable[[Setup], Setup]:
+    """Registers the decorated setup function as a benchmark"""
+
+    def register(setup: Setup) -> Setup:
+        if name in BENCHMARKS:
+            raise ValueError(f"benchmark {name!r} is already registered")
+        BENCHMARKS[name] = Benchmark(name, setup, quick, repeat)
+        return setup
+
+    return register
+
+
+def environment() -> dict[str, Any]:
+    """Returns a description of the machine and library versions"""
+    import numpy
+    import scipy
+
+    return {
+        "python": sys.version.split()[0],
+        "numpy": numpy.__version__,
+        "scipy": scipy.__version__,
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+    }
+
+
+def run_benchmarks(
+    names: list[str],
+    repeat: Optional[int] = None,
+    log: Callable[[str], None] = print,
+) -> dict[str, dict[str, Any]]:
+    """Runs the given benchmarks in order and collects their results"""
+    results = {}
+    for name in names:
+        result = BENCHMARKS[name].run(repeat)
+        log(f"{name:<60} {result['median'] * 1e3:>12.3f} ms")
+        results[name] = result
+    return results
+
+
+def load_results(path: str) -> dict[str, Any]:
+    with open(path) as results_file:
+        return json.load(results_file)  # type: ignore
+
+
+def save_results(path: str, report: dict[str, Any]) -> None:
+    with open(path, "w") as results_file:
+        json.dump(report, results_file, indent=2, sort_keys=True)
+        results_file.write("\n")
+
+
+def compare_to_baseline(
+    results: dict[str, dict[str, Any]],
+    baseline: dict[str, dict[str, Any]],
+    threshold: float = REGRESSION_THRESHOLD,
+    min_seconds: float = REGRESSION_MIN_SECONDS,
+) -> list[dict[str, Any]]:
+    """
+    Compares median timings against a baseline
+
+    Returns one entry per benchmark present in both reports with the
+    ratio current / baseline and whether it counts as a regression.
+    """
+    comparisons = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        current = result["median"]
+        reference = baseline[name]["median"]
+        ratio = current / reference if reference > 0 else float("inf")
+        comparisons.append(
+            {
+                "name": name,
+                "baseline": reference,
+                "current": current,
+                "ratio": ratio,
+                "regression": ratio > threshold
+                and current - reference > min_seconds,
+            }
+        )
+    return comparisons
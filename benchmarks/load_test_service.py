@@ -0,0 +1,124 @@
+"""
+Load test of the render service
+
+Usage
+-----
+    python benchmarks/load_test_service.py --requests 200 --concurrency 16
+    python benchmarks/load_test_service.py --port 8765  # running server
+
+Without --port or --path a server is started in this process. The
+requests are spread over --connections connections with --concurrency
+requests in flight overall, and the script reports the p50/p99 latency
+and the throughput in frames per second.
+"""
+import argparse
+import asyncio
+import json
+import numpy as np
+import time
+
+from star_field_image_simulator.service.client import RenderClient
+from star_field_image_simulator.service.server import RenderServer
+
+
+FRAME_PARAMS = dict(
+    alpha0=266.4,
+    delta0=-28.9,
+    phi0=0,
+    resX=512,
+    resY=512,
+    fovX=20,
+    fovY=20,
+    magnitude_limit=6,
+    num_missing_stars=0,
+    num_false_stars=0,
+    min_false_star_magnitude=5,
+    star_intensity=100,
+    star_sigma=1.5,
+    position_noise=0,
+)
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, help="use a running server")
+    parser.add_argument("--path", help="use a running Unix socket server")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--connections", type=int, default=4)
+    parser.add_argument("--resolution", type=int, default=512)
+    parser.add_argument("--workers", type=int, help="in-process server pool")
+    parser.add_argument("--max-batch-size", type=int, default=8)
+    parser.add_argument("--batch-window", type=float, default=0.002)
+    parser.add_argument("--output", help="write the results to this file")
+    return parser.parse_args()
+
+
+async def load_test(args: argparse.Namespace) -> dict:
+    server = None
+    host, port, path = args.host, args.port, args.path
+    if port is None and path is None:
+        server = RenderServer(
+            args.max_batch_size, args.batch_window, args.workers
+        )
+        await server.start(host)
+        port = server.address[1]
+
+    clients = [
+        await RenderClient.connect(host, port, path)
+        for _ in range(args.connections)
+    ]
+    params = dict(FRAME_PARAMS, resX=args.resolution, resY=args.resolution)
+    # warm every worker before measuring
+    await asyncio.gather(*(client.render(**params) for client in clients))
+
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies = []
+
+    async def request(client: RenderClient, alpha0: float) -> None:
+        async with semaphore:
+            start = time.perf_counter()
+            await client.render(**dict(params, alpha0=alpha0))
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(
+        *(
+            request(clients[i % len(clients)], (266.4 + i) % 360)
+            for i in range(args.requests)
+        )
+    )
+    elapsed = time.perf_counter() - start
+
+    for client in clients:
+        await client.close()
+    results = {
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "resolution": args.resolution,
+        "p50_latency": float(np.percentile(latencies, 50)),
+        "p99_latency": float(np.percentile(latencies, 99)),
+        "throughput": args.requests / elapsed,
+    }
+    if server is not None:
+        results["batches"] = server.batches
+        await server.close()
+    return results
+
+
+def main() -> None:
+    args = parse_args()
+    results = asyncio.run(load_test(args))
+    print(
+        f"p50 {results['p50_latency'] * 1e3:.1f} ms  "
+        f"p99 {results['p99_latency'] * 1e3:.1f} ms  "
+        f"throughput {results['throughput']:.1f} frames/s"
+    )
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""
+Runs the benchmark suite
+
+Usage
+-----
+    python benchmarks/run_benchmarks.py --quick
+    python benchmarks/run_benchmarks.py --filter draw_star_field_image/lazy
+    python benchmarks/run_benchmarks.py --output results.json
+    python benchmarks/run_benchmarks.py --save-baseline
+
+Results are written as JSON. When a baseline is available (by default
+benchmarks/baseline.json) every benchmark is compared against it and the
+script exits with status 1 if any of them regressed.
+"""
+import argparse
+import importlib
+import pathlib
+import sys
+
+from harness import (
+    BENCHMARKS,
+    REGRESSION_THRESHOLD,
+    compare_to_baseline,
+    environment,
+    load_results,
+    run_benchmarks,
+    save_results,
+)
+from star_field_image_simulator.image_generation.kernels import (
+    use_safe_threading_layer,
+)
+
+
+BENCHMARK_MODULES = [
+    "bench_batch",
+    "bench_image_generation",
+    "bench_import_time",
+    "bench_noise_addition",
+    "bench_pipeline",
+    "bench_roi_readout",
+]
+DEFAULT_BASELINE = pathlib.Path(__file__).parent / "baseline.json"
+
+
+def parse_args(argv: list[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument(
+        "--quick",
+        action="store_true",
+        help="only run the quick subset of the benchmarks",
+    )
+    parser.add_argument(
+        "--filter",
+        action="append",
+        default=[],
+        help="only run benchmarks whose name contains this substring",
+    )
+    parser.add_argument(
+        "--repeat", type=int, help="override the number of repetitions"
+    )
+    parser.add_argument("--output", help="write the results to this file")
+    parser.add_argument(
+        "--baseline",
+        default=str(DEFAULT_BASELINE),
+        help="results file to compare against",
+    )
+    parser.add_argument(
+        "--save-baseline",
+        action="store_true",
+        help="overwrite the baseline with the results of this run",
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=REGRESSION_THRESHOLD,
+        help="slowdown ratio reported as a regression",
+    )
+    parser.add_argument(
+        "--list", action="store_true", help="list the benchmarks and exit"
+    )
+    return parser.parse_args(argv)
+
+
+def select(quick: bool, filters: list[str]) -> list[str]:
+    return [
+        name
+        for name, bench in BENCHMARKS.items()
+        if (bench.quick or not quick)
+        and (not filters or any(f in name for f in filters))
+    ]
+
+
+def main(argv: list[str]) -> int:
+    # the batch and tiled benchmarks render on threads
+    use_safe_threading_layer()
+    args = parse_args(argv)
+    for module in BENCHMARK_MODULES:
+        importlib.import_module(module)
+
+    names = select(args.quick, args.filter)
+    if args.list:
+        print("\n".join(names))
+        return 0
+
+    report = {
+        "environment": environment(),
+        "quick": args.quick,
+        "results": run_benchmarks(names, args.repeat),
+    }
+
+    if args.output:
+        save_results(args.output, report)
+
+    baseline_path = pathlib.Path(args.baseline)
+    if args.save_baseline:
+        if baseline_path.exists():
+            # keep the entries of benchmarks that were not part of this run
+            previous = load_results(str(baseline_path))["results"]
+            previous.update(report["results"])
+            report["results"] = previous
+        save_results(str(baseline_path), report)
+        return 0
+
+    if not baseline_path.exists():
+        return 0
+
+    comparisons = compare_to_baseline(
+        report["results"],
+        load_results(str(baseline_path))["results"],
+        args.threshold,
+    )
+    regressions = [c for c in comparisons if c["regression"]]
+    print(
+        f"\n{len(comparisons)} benchmarks compared against {baseline_path}, "
+        f"{len(regressions)} regressed (threshold {args.threshold:.2f}x)"
+    )
+    for comparison in regressions:
+        print(
+            f"REGRESSION {comparison['name']}: "
+            f"{comparison['baseline'] * 1e3:.3f} ms -> "
+            f"{comparison['current'] * 1e3:.3f} ms "
+            f"({comparison['ratio']:.2f}x)"
+        )
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
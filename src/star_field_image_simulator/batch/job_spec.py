@@ -0,0 +1,315 @@
+"""
+Job specifications of the batch runner
+
+A job spec is a JSON file describing a set of frames
+
+    {
+        "num_frames": 1000,
+        "seed": 7,
+        "output": "runs/uniform",
+        "attitude": {"distribution": "uniform", "roll": [-90, 90]},
+        "parameters": {
+            "resX": 1024, "resY": 1024, "fovX": [10, 20], "fovY": [10, 20],
+            "magnitude_limit": 6, "num_missing_stars": [0, 3],
+            "num_false_stars": [0, 3], "min_false_star_magnitude": 5,
+            "star_intensity": 100, "star_sigma": [0.8, 1.5],
+            "position_noise": 0.1
+        },
+        "noise": {
+            "nDC": 0.5, "tauDC": 1, "nRN": 0.1, "shot_noise": 0.2,
+            "sensor": {"seed": 3, "prnu": 0.01, "hot_pixel_fraction": 1e-4}
+        },
+        "selection_cache": {"directory": "cache", "max_bytes": 1e9}
+    }
+
+Every parameter and noise setting is either a constant or a [low, high]
+range sampled uniformly per frame (integers for the resolution and star
+counts), except the optional sensor, the SensorModel keyword arguments
+shared by every frame. The attitude is either sampled uniformly over the
+sphere or given as a "list" of [alpha0, delta0, phi0] triplets, one per
+frame; a uniform attitude may set "min_stars" and "max_stars" to only keep the
+attitudes whose estimated star count (star_density.sample_attitudes)
+lies in between, before any frame is rendered. Without an attitude
+entry alpha0, delta0 and phi0 are taken from the parameters. Frame i is
+always drawn from SeedSequence([seed, i]): its parameters from the
+sequence itself and its perturbation and noise from its children (see
+frames.frame_streams), so the frames do not depend on how the job is
+sharded, resumed or pipelined. The
+optional selection_cache shares a StarSelectionCache between the
+workers, which pays off when the job revisits attitudes.
+"""
+import hashlib
+import inspect
+import json
+import math
+import pathlib
+
+from ..frames import NOISE_PARAMETERS, RENDER_PARAMETERS
+from ..image_generation.canvas_computation import generate_star_field_image
+from ..image_generation.star_density import sample_attitudes
+from ..noise_addition.sensor_model import SENSOR_PARAMETERS
+from numpy.random import default_rng
+from typing import Any, Optional, Union
+
+
+"positional parameters of generate_star_field_image a job must provide"
+REQUIRED_PARAMETERS = tuple(
+    name
+    for name, parameter in inspect.signature(
+        generate_star_field_image
+    ).parameters.items()
+    if parameter.default is inspect.Parameter.empty
+)
+ATTITUDE_PARAMETERS = ("alpha0", "delta0", "phi0")
+INTEGER_PARAMETERS = (
+    "resX",
+    "resY",
+    "num_missing_stars",
+    "num_false_stars",
+    "stars_per_cell",
+)
+
+"""
+inclusive (min, max) bounds of the parameters as documented in the README,
+None stands for no bound
+"""
+PARAMETER_BOUNDS: dict[str, tuple[Optional[float], Optional[float]]] = {
+    "alpha0": (0, 360),
+    "delta0": (-90, 90),
+    "phi0": (-90, 90),
+    "resX": (256, 2048),
+    "resY": (256, 2048),
+    "fovX": (5, 25),
+    "fovY": (5, 25),
+    "magnitude_limit": (-1.0876, None),
+    "num_missing_stars": (0, None),
+    "num_false_stars": (0, None),
+    "min_false_star_magnitude": (-1.0876, 6),
+    "star_intensity": (0, None),
+    "star_sigma": (0, None),
+    "position_noise": (0, None),
+    "stars_per_cell": (1, None),
+    "nDC": (0, 1),
+    "tauDC": (0, None),
+    "nRN": (0, 1),
+    "shot_noise": (0, None),
+}
+"parameters whose lower bound is excluded"
+STRICTLY_POSITIVE = ("star_intensity", "star_sigma")
+
+
+def check_bounds(name: str, value: float) -> Optional[str]:
+    """Returns why value is out of the bounds of name, None if it is not"""
+    low, high = PARAMETER_BOUNDS.get(name, (None, None))
+    if name in STRICTLY_POSITIVE and value <= 0:
+        return f"{name} = {value} must be greater than 0"
+    if low is not None and value < low:
+        return f"{name} = {value} must be at least {low}"
+    if high is not None and value > high:
+        return f"{name} = {value} must be at most {high}"
+    return None
+
+
+class JobSpec:
+    """
+    JobSpec class used to describe the frames of a batch job
+
+    Attributes
+    ----------
+    spec : dict
+        Job specification as loaded from JSON
+    num_frames : int
+        Number of frames of the job
+    seed : int
+        Seed the frame parameters are drawn from
+    output : Optional[str]
+        Directory the frames are written to
+    selection_cache : Optional[dict]
+        Directory and max_bytes of the StarSelectionCache to use
+
+    Methods
+    -------
+    from_file(path)
+        Loads a job spec from a JSON file
+    validate()
+        Raises ValueError listing every problem of the spec
+    frame_parameters(index)
+        Returns the render_frame keyword arguments of frame index
+    frame_seed(index)
+        Returns the render_frame seed of frame index
+    digest()
+        Returns a hash identifying the job
+    """
+
+    def __init__(self, spec: dict[str, Any]) -> None:
+        self.spec = spec
+        self.attitude = spec.get("attitude")
+        self.parameters = dict(spec.get("parameters", {}))
+        self.noise = dict(spec.get("noise", {}))
+        self.seed = int(spec.get("seed", 0))
+        self.output = spec.get("output")
+        self.selection_cache = spec.get("selection_cache")
+        if "num_frames" in spec:
+            self.num_frames = int(spec["num_frames"])
+        elif self.attitude is not None and "list" in self.attitude:
+            self.num_frames = len(self.attitude["list"])
+        else:
+            raise ValueError("the job spec needs num_frames")
+        self.validate()
+
+    @classmethod
+    def from_file(cls, path: Union[pathlib.Path, str]) -> "JobSpec":
+        with open(path) as file:
+            return cls(json.load(file))
+
+    def validate(self) -> None:
+        problems = []
+        if self.num_frames <= 0:
+            problems.append("num_frames must be greater than 0")
+        if self.selection_cache is not None and not (
+            isinstance(self.selection_cache, dict)
+            and "directory" in self.selection_cache
+        ):
+            problems.append("selection_cache needs a directory")
+
+        for name in self.parameters:
+            if name not in RENDER_PARAMETERS:
+                problems.append(f"unknown parameter {name}")
+        for name in self.noise:
+            if name not in NOISE_PARAMETERS:
+                problems.append(f"unknown noise setting {name}")
+        if "sensor" in self.noise:
+            sensor = self.noise["sensor"]
+            if not isinstance(sensor, dict) or not set(sensor) <= set(
+                SENSOR_PARAMETERS + ("cache_directory",)
+            ):
+                problems.append(
+                    f"sensor must be a dict of {list(SENSOR_PARAMETERS)}"
+                )
+
+        if self.attitude is None:
+            missing = [
+                name
+                for name in REQUIRED_PARAMETERS
+                if name not in self.parameters
+            ]
+        else:
+            missing = [
+                name
+                for name in REQUIRED_PARAMETERS
+                if name not in self.parameters
+                and name not in ATTITUDE_PARAMETERS
+            ]
+            problems.extend(self._attitude_problems())
+        if missing:
+            problems.append(f"missing parameters {missing}")
+
+        for name, value in {**self.parameters, **self.noise}.items():
+            values = value if isinstance(value, list) else [value]
+            if isinstance(value, list) and (
+                len(value) != 2 or value[0] > value[1]
+            ):
+                problems.append(f"{name} range must be [low, high]")
+                continue
+            for bound in values:
+                if isinstance(bound, (int, float)) and not isinstance(
+                    bound, bool
+                ):
+                    problem = check_bounds(name, bound)
+                    if problem is not None:
+                        problems.append(problem)
+
+        if problems:
+            raise ValueError("invalid job spec: " + "; ".join(problems))
+
+    def _attitude_problems(self) -> list[str]:
+        assert self.attitude is not None
+        problems = []
+        if "list" in self.attitude:
+            for attitude in self.attitude["list"]:
+                if len(attitude) != 3:
+                    problems.append(
+                        f"attitude {attitude} must be [alpha0, delta0, phi0]"
+                    )
+                    continue
+                for name, value in zip(ATTITUDE_PARAMETERS, attitude):
+                    problem = check_bounds(name, value)
+                    if problem is not None:
+                        problems.append(problem)
+        elif self.attitude.get("distribution") == "uniform":
+            for value in self.attitude.get("roll", [-90, 90]):
+                problem = check_bounds("phi0", value)
+                if problem is not None:
+                    problems.append(problem)
+            min_stars = self.attitude.get("min_stars", 0)
+            max_stars = self.attitude.get("max_stars", min_stars)
+            if min_stars < 0 or max_stars < min_stars:
+                problems.append(
+                    "attitude star counts must be 0 <= min_stars <= max_stars"
+                )
+        else:
+            problems.append(
+                'attitude must be {"distribution": "uniform"} or a "list"'
+            )
+        return problems
+
+    def frame_seed(self, index: int) -> list[int]:
+        return [self.seed, index]
+
+    def frame_parameters(self, index: int) -> dict[str, Any]:
+        rng = default_rng(self.frame_seed(index))
+        params: dict[str, Any] = {}
+        if self.attitude is not None:
+            if "list" in self.attitude:
+                attitude = self.attitude["list"][
+                    index % len(self.attitude["list"])
+                ]
+                params.update(zip(ATTITUDE_PARAMETERS, attitude))
+            elif not self._constrained_attitude():
+                # uniform over the sphere: sin(delta0) is uniform
+                low, high = self.attitude.get("roll", [-90, 90])
+                params["alpha0"] = float(rng.uniform(0, 360))
+                params["delta0"] = math.degrees(
+                    math.asin(rng.uniform(-1, 1))
+                )
+                params["phi0"] = float(rng.uniform(low, high))
+
+        for name, value in {**self.parameters, **self.noise}.items():
+            if not isinstance(value, list):
+                params[name] = value
+            elif name in INTEGER_PARAMETERS:
+                params[name] = int(rng.integers(value[0], value[1] + 1))
+            else:
+                params[name] = float(rng.uniform(value[0], value[1]))
+
+        if self._constrained_attitude():
+            # drawn last, the star count depends on the FOV and magnitude
+            assert self.attitude is not None
+            attitude = sample_attitudes(
+                1,
+                params["fovX"],
+                params["fovY"],
+                params["magnitude_limit"],
+                self.attitude.get("min_stars", 0),
+                self.attitude.get("max_stars"),
+                tuple(self.attitude.get("roll", [-90, 90])),  # type: ignore
+                rng,
+            )[0]
+            params.update(zip(ATTITUDE_PARAMETERS, map(float, attitude)))
+        return params
+
+    def _constrained_attitude(self) -> bool:
+        return (
+            self.attitude is not None
+            and "list" not in self.attitude
+            and ("min_stars" in self.attitude or "max_stars" in self.attitude)
+        )
+
+    def digest(self) -> str:
+        spec = dict(self.spec)
+        # where the frames and cached selections go does not change them
+        spec.pop("output", None)
+        spec.pop("selection_cache", None)
+        return hashlib.sha256(
+            json.dumps(spec, sort_keys=True).encode()
+        ).hexdigest()
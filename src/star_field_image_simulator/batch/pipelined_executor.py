@@ -0,0 +1,271 @@
+"""
+Pipelined execution of frame stages
+
+Rendering a frame chains stages that stress different resources: the
+catalog query and projection spend their time in SQLite, the rendering
+and the noise in NumPy, and writing the frame in the file system. Run in
+sequence, each stage waits for all the others. PipelinedExecutor runs
+every stage on its own thread, connected to the next one by a bounded
+queue, so frame i + 1 is selected while frame i renders and frame i - 1
+gets its noise, and a slow stage stalls the stages before it instead of
+piling up frames in memory.
+
+The threads only overlap where the stages release the GIL (SQLite
+queries, large NumPy operations, file writes). PipelineMetrics records
+how long every stage worked, waited for input and waited for room in
+its output queue: the stage with the highest utilization is the
+bottleneck, and stages mostly waiting for input are starved by it.
+"""
+import queue
+import threading
+import time
+
+from typing import Any, Callable, Iterable, Sequence
+
+
+"items a queue between two stages holds"
+PIPELINE_QUEUE_SIZE = 2
+"seconds between two checks whether the pipeline was stopped"
+_POLL_INTERVAL = 0.05
+
+_DONE = object()
+
+
+class _Stopped(Exception):
+    pass
+
+
+class PipelineMetrics:
+    """
+    PipelineMetrics class used to record where the stages of a pipeline
+    spend their time
+
+    Attributes
+    ----------
+    stages : tuple[str, ...]
+        Names of the stages, in pipeline order
+    items : dict[str, int]
+        Items processed by each stage
+    busy : dict[str, float]
+        Time each stage spent processing items
+        Represented in seconds
+    starved : dict[str, float]
+        Time each stage waited for an item
+        Represented in seconds
+    blocked : dict[str, float]
+        Time each stage waited for room in its output queue
+        Represented in seconds
+    wall_time : float
+        Duration of the run
+        Represented in seconds
+
+    Methods
+    -------
+    utilization()
+        Returns the fraction of the run each stage was busy
+    bottleneck()
+        Returns the stage with the highest utilization
+    merge(other)
+        Adds the times of another run
+    as_dict()
+        Returns the metrics as a JSON serializable dictionary
+    from_dict(metrics)
+        Returns the PipelineMetrics of an as_dict dictionary
+    report()
+        Returns a one line per stage summary
+    """
+
+    def __init__(self, stages: Sequence[str]) -> None:
+        self.stages = tuple(stages)
+        self.items = {stage: 0 for stage in self.stages}
+        self.busy = {stage: 0.0 for stage in self.stages}
+        self.starved = {stage: 0.0 for stage in self.stages}
+        self.blocked = {stage: 0.0 for stage in self.stages}
+        self.wall_time = 0.0
+
+    def utilization(self) -> dict[str, float]:
+        return {
+            stage: self.busy[stage] / self.wall_time if self.wall_time else 0.0
+            for stage in self.stages
+        }
+
+    def bottleneck(self) -> str:
+        utilization = self.utilization()
+        return max(self.stages, key=lambda stage: utilization[stage])
+
+    def merge(self, other: "PipelineMetrics") -> None:
+        """Adds the items and times of other, a run of the same stages"""
+        if other.stages != self.stages:
+            raise ValueError(f"other runs the stages {other.stages}")
+        for stage in self.stages:
+            self.items[stage] += other.items[stage]
+            self.busy[stage] += other.busy[stage]
+            self.starved[stage] += other.starved[stage]
+            self.blocked[stage] += other.blocked[stage]
+        self.wall_time += other.wall_time
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "stages": list(self.stages),
+            "items": self.items,
+            "busy": self.busy,
+            "starved": self.starved,
+            "blocked": self.blocked,
+            "wall_time": self.wall_time,
+        }
+
+    @classmethod
+    def from_dict(cls, metrics: dict[str, Any]) -> "PipelineMetrics":
+        self = cls(metrics["stages"])
+        for name in ("items", "busy", "starved", "blocked"):
+            getattr(self, name).update(metrics[name])
+        self.wall_time = metrics["wall_time"]
+        return self
+
+    def report(self) -> str:
+        utilization = self.utilization()
+        bottleneck = self.bottleneck()
+        return "\n".join(
+            f"{stage:>12}: {utilization[stage]:6.1%} busy, "
+            f"{self.starved[stage]:.2f} s starved, "
+            f"{self.blocked[stage]:.2f} s blocked"
+            + ("  <- bottleneck" if stage == bottleneck else "")
+            for stage in self.stages
+        )
+
+    def __repr__(self) -> str:
+        return f"PipelineMetrics({self.stages})"
+
+
+class PipelinedExecutor:
+    """
+    PipelinedExecutor class used to run items through stages on
+    concurrent threads
+
+    Every stage is a function of the output of the stage before it, the
+    first one of the items. Items go through the stages in order, so
+    the outputs keep the order of the items.
+
+    Attributes
+    ----------
+    stages : tuple[tuple[str, Callable[[Any], Any]], ...]
+        Names and functions of the stages, in pipeline order
+    queue_size : int
+        Items a queue between two stages holds
+    metrics : PipelineMetrics
+        Metrics of the last run
+
+    Methods
+    -------
+    run(items)
+        Returns the outputs of the last stage for items
+    """
+
+    def __init__(
+        self,
+        stages: Sequence[tuple[str, Callable[[Any], Any]]],
+        queue_size: int = PIPELINE_QUEUE_SIZE,
+    ) -> None:
+        if not stages:
+            raise ValueError("a pipeline needs at least one stage")
+        if queue_size < 1:
+            raise ValueError("queue_size must be at least 1")
+        self.stages = tuple(stages)
+        self.queue_size = queue_size
+        self.metrics = PipelineMetrics([name for name, _ in self.stages])
+
+    def run(self, items: Iterable[Any]) -> list[Any]:
+        """
+        Returns the outputs of the last stage for items, in order
+
+        The first exception raised by a stage stops every stage and is
+        raised again here.
+        """
+        metrics = self.metrics = PipelineMetrics(
+            [name for name, _ in self.stages]
+        )
+        stop = threading.Event()
+        errors: list[BaseException] = []
+        # the last queue is emptied by this thread, it need not be bounded
+        queues: list["queue.Queue[Any]"] = [
+            queue.Queue(self.queue_size) for _ in self.stages[:-1]
+        ] + [queue.Queue()]
+        source = iter(items)
+
+        def get(index: int) -> Any:
+            if index == 0:
+                return next(source, _DONE)
+            while not stop.is_set():
+                try:
+                    return queues[index - 1].get(timeout=_POLL_INTERVAL)
+                except queue.Empty:
+                    continue
+            raise _Stopped
+
+        def put(index: int, item: Any) -> None:
+            while not stop.is_set():
+                try:
+                    queues[index].put(item, timeout=_POLL_INTERVAL)
+                    return
+                except queue.Full:
+                    continue
+            raise _Stopped
+
+        def work(
+            index: int, name: str, function: Callable[[Any], Any]
+        ) -> None:
+            try:
+                while True:
+                    start = time.perf_counter()
+                    item = get(index)
+                    received = time.perf_counter()
+                    metrics.starved[name] += received - start
+                    if item is _DONE:
+                        put(index, _DONE)
+                        return
+                    output = function(item)
+                    done = time.perf_counter()
+                    metrics.busy[name] += done - received
+                    metrics.items[name] += 1
+                    put(index, output)
+                    metrics.blocked[name] += time.perf_counter() - done
+            except _Stopped:
+                return
+            except BaseException as error:
+                errors.append(error)
+                stop.set()
+
+        start = time.perf_counter()
+        threads = [
+            threading.Thread(
+                target=work, args=(index, name, function), daemon=True
+            )
+            for index, (name, function) in enumerate(self.stages)
+        ]
+        for thread in threads:
+            thread.start()
+        outputs = []
+        try:
+            while True:
+                try:
+                    output = queues[-1].get(timeout=_POLL_INTERVAL)
+                except queue.Empty:
+                    if stop.is_set():
+                        break
+                    continue
+                if output is _DONE:
+                    break
+                outputs.append(output)
+        finally:
+            # also reached on KeyboardInterrupt, which only this thread gets
+            stop.set()
+            for thread in threads:
+                thread.join()
+            metrics.wall_time = time.perf_counter() - start
+        if errors:
+            raise errors[0]
+        return outputs
+
+    def __repr__(self) -> str:
+        names = tuple(name for name, _ in self.stages)
+        return f"PipelinedExecutor({names}, {self.queue_size})"
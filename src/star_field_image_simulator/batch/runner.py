@@ -0,0 +1,339 @@
+"""
+Resumable batch runner
+
+A job writes into its output directory
+
+    job.json                  the job spec and its digest
+    frames/frame_000042.npz   image, centroids and parameters of a frame
+    checkpoints/<pid>.jsonl   one line per finished frame and worker
+    metrics/<pid>.jsonl       pipelined runs, one line per chunk and worker
+
+Frames are written to a temporary file and renamed into place before they
+are recorded in a checkpoint, so a frame listed in a checkpoint is always
+complete. Restarting an interrupted job in the same directory only renders
+the frames that are missing.
+
+Pipelined runs overlap the stages of consecutive frames within every
+worker, see pipelined_executor, and record the PipelineMetrics of every
+chunk.
+"""
+import concurrent.futures
+import datetime
+import json
+import numpy as np
+import numpy.typing as npt
+import os
+import pathlib
+import sys
+import time
+
+from ..frames import (
+    Centroids,
+    add_frame_noise,
+    draw_frame,
+    render_frame,
+    select_frame_stars,
+)
+from ..image_generation.constants import SELECTION_CACHE_MAX_BYTES
+from ..image_generation.kernels import worker_context
+from ..image_generation.selection_cache import StarSelectionCache
+from .job_spec import JobSpec
+from .pipelined_executor import PipelinedExecutor, PipelineMetrics
+from typing import IO, Any, Callable, Optional, TextIO, Union
+
+
+DEFAULT_CHUNK_SIZE = 4
+"stages of a frame in pipelined runs"
+FRAME_STAGES = ("selection", "render", "noise", "write")
+
+
+def frame_path(output: pathlib.Path, index: int) -> pathlib.Path:
+    return output / "frames" / f"frame_{index:06d}.npz"
+
+
+def completed_frames(output: pathlib.Path) -> set[int]:
+    """Returns the frames recorded in the checkpoints of output"""
+    completed = set()
+    for checkpoint in (output / "checkpoints").glob("*.jsonl"):
+        with open(checkpoint) as file:
+            for line in file:
+                try:
+                    completed.add(json.loads(line)["frame"])
+                except (ValueError, KeyError):
+                    # a line cut short by the interruption
+                    continue
+    return {
+        index for index in completed if frame_path(output, index).exists()
+    }
+
+
+def prepare_output(spec: JobSpec, output: pathlib.Path) -> None:
+    """Creates the output directory, or checks it holds the same job"""
+    job_path = output / "job.json"
+    if job_path.exists():
+        with open(job_path) as file:
+            digest = json.load(file)["digest"]
+        if digest != spec.digest():
+            raise ValueError(
+                f"{output} holds the frames of a different job spec"
+            )
+        return
+    (output / "frames").mkdir(parents=True, exist_ok=True)
+    (output / "checkpoints").mkdir(exist_ok=True)
+    with open(job_path, "w") as file:
+        json.dump({"digest": spec.digest(), "spec": spec.spec}, file, indent=2)
+
+
+def write_frame(
+    output: pathlib.Path,
+    index: int,
+    params: dict[str, Any],
+    image: npt.NDArray[np.float64],
+    centroids: Centroids,
+) -> None:
+    """Writes frame index of the job at output, see frame_path"""
+    path = frame_path(output, index)
+    temporary_path = path.with_suffix(".tmp")
+    with open(temporary_path, "wb") as file:
+        np.savez(
+            file,
+            image=image,
+            centroids=centroids,
+            params=json.dumps(params),
+        )
+    os.replace(temporary_path, path)
+
+
+def record_frame(checkpoint: IO[str], index: int, seconds: float) -> None:
+    checkpoint.write(json.dumps({"frame": index, "seconds": seconds}) + "\n")
+    checkpoint.flush()
+
+
+def render_pipelined(
+    job: JobSpec,
+    output: pathlib.Path,
+    indices: list[int],
+    selection_cache: Optional[StarSelectionCache],
+    checkpoint: IO[str],
+) -> PipelineMetrics:
+    """
+    Renders and checkpoints frames indices of the job through the
+    FRAME_STAGES of a PipelinedExecutor and returns its metrics
+    """
+
+    def select(index: int) -> tuple[Any, ...]:
+        start = time.perf_counter()
+        params = job.frame_parameters(index)
+        stars = select_frame_stars(params, selection_cache)
+        return index, start, params, stars
+
+    def render(frame: tuple[Any, ...]) -> tuple[Any, ...]:
+        index, start, params, stars = frame
+        return (
+            index,
+            start,
+            params,
+            *draw_frame(stars, params, job.frame_seed(index)),
+        )
+
+    def noise(frame: tuple[Any, ...]) -> tuple[Any, ...]:
+        index, start, params, image, centroids = frame
+        image = add_frame_noise(image, params, job.frame_seed(index))
+        return index, start, params, image, centroids
+
+    def write(frame: tuple[Any, ...]) -> int:
+        index, start, params, image, centroids = frame
+        write_frame(output, index, params, image, centroids)
+        record_frame(checkpoint, index, time.perf_counter() - start)
+        return index  # type: ignore
+
+    executor = PipelinedExecutor(
+        list(zip(FRAME_STAGES, (select, render, noise, write)))
+    )
+    executor.run(indices)
+    return executor.metrics
+
+
+def render_chunk(
+    spec: dict[str, Any],
+    output: str,
+    indices: list[int],
+    pipelined: bool = False,
+) -> int:
+    """
+    Renders and checkpoints frames indices of the job, with the stages of
+    consecutive frames overlapped when pipelined is set
+    """
+    job = JobSpec(spec)
+    directory = pathlib.Path(output)
+    selection_cache = None
+    if job.selection_cache is not None:
+        selection_cache = StarSelectionCache(
+            job.selection_cache["directory"],
+            int(
+                job.selection_cache.get(
+                    "max_bytes", SELECTION_CACHE_MAX_BYTES
+                )
+            ),
+        )
+    checkpoint_path = directory / "checkpoints" / f"{os.getpid()}.jsonl"
+    with open(checkpoint_path, "a") as checkpoint:
+        if pipelined:
+            metrics = render_pipelined(
+                job, directory, indices, selection_cache, checkpoint
+            )
+            metrics_path = directory / "metrics" / f"{os.getpid()}.jsonl"
+            metrics_path.parent.mkdir(exist_ok=True)
+            with open(metrics_path, "a") as file:
+                file.write(json.dumps(metrics.as_dict()) + "\n")
+            return len(indices)
+
+        for index in indices:
+            start = time.perf_counter()
+            params = job.frame_parameters(index)
+            image, centroids = render_frame(
+                params, selection_cache, job.frame_seed(index)
+            )
+            write_frame(directory, index, params, image, centroids)
+            record_frame(checkpoint, index, time.perf_counter() - start)
+    return len(indices)
+
+
+def pipeline_metrics(output: pathlib.Path) -> Optional[PipelineMetrics]:
+    """
+    Returns the PipelineMetrics of every pipelined chunk of the job at
+    output summed, None when no chunk was pipelined
+    """
+    total = None
+    for path in sorted((output / "metrics").glob("*.jsonl")):
+        with open(path) as file:
+            for line in file:
+                try:
+                    metrics = PipelineMetrics.from_dict(json.loads(line))
+                except (ValueError, KeyError):
+                    continue
+                if total is None:
+                    total = metrics
+                else:
+                    total.merge(metrics)
+    return total
+
+
+class ProgressReporter:
+    """
+    ProgressReporter class used to print the throughput and ETA of a job
+
+    Attributes
+    ----------
+    total : int
+        Number of frames left to render when the run started
+    done : int
+        Number of frames rendered so far
+    interval : float
+        Minimum time between two reports
+        Represented in seconds
+    stream : TextIO
+        Stream the reports are printed to
+
+    Methods
+    -------
+    update(count)
+        Records count more frames and prints a report if it is due
+    report()
+        Prints the progress
+    """
+
+    def __init__(
+        self, total: int, interval: float = 5.0, stream: TextIO = sys.stderr
+    ) -> None:
+        self.total = total
+        self.done = 0
+        self.interval = interval
+        self.stream = stream
+        self.start = time.perf_counter()
+        self.last_report = self.start
+
+    def update(self, count: int) -> None:
+        self.done += count
+        now = time.perf_counter()
+        if now - self.last_report >= self.interval or self.done == self.total:
+            self.last_report = now
+            self.report()
+
+    def report(self) -> None:
+        elapsed = time.perf_counter() - self.start
+        rate = self.done / elapsed if elapsed > 0 else 0.0
+        eta = (self.total - self.done) / rate if rate > 0 else float("inf")
+        eta_text = (
+            str(datetime.timedelta(seconds=round(eta)))
+            if eta != float("inf")
+            else "?"
+        )
+        print(
+            f"[{self.done}/{self.total}] {rate:.2f} frames/s  ETA {eta_text}",
+            file=self.stream,
+            flush=True,
+        )
+
+
+def run_job(
+    spec: JobSpec,
+    output: Optional[Union[pathlib.Path, str]] = None,
+    workers: Optional[int] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    progress: Optional[Callable[[int], None]] = None,
+    pipelined: bool = False,
+) -> int:
+    """
+    Renders the frames of the job that are not done yet
+
+    The frames are split into chunks of chunk_size frames that are
+    rendered by workers processes (in this process when workers is 1).
+    progress is called with the number of frames of every finished chunk,
+    by default a ProgressReporter prints the throughput and ETA.
+
+    When pipelined is set every worker overlaps the stages of the frames
+    of a chunk, which pays off with chunks of tens of frames, and the
+    metrics of the stages are recorded, see pipeline_metrics.
+
+    Returns the number of frames rendered.
+    """
+    if output is None:
+        output = spec.output
+    if output is None:
+        raise ValueError("the job spec has no output, pass one")
+    output = pathlib.Path(output)
+    prepare_output(spec, output)
+
+    done = completed_frames(output)
+    pending = [index for index in range(spec.num_frames) if index not in done]
+    chunks = [
+        pending[i : i + chunk_size] for i in range(0, len(pending), chunk_size)
+    ]
+    if progress is None:
+        progress = ProgressReporter(len(pending)).update
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers == 1:
+        for chunk in chunks:
+            progress(render_chunk(spec.spec, str(output), chunk, pipelined))
+        return len(pending)
+
+    executor = concurrent.futures.ProcessPoolExecutor(
+        workers, mp_context=worker_context()
+    )
+    try:
+        futures = [
+            executor.submit(
+                render_chunk, spec.spec, str(output), chunk, pipelined
+            )
+            for chunk in chunks
+        ]
+        for future in concurrent.futures.as_completed(futures):
+            progress(future.result())
+    finally:
+        # on interruption drop the chunks that did not start yet, finished
+        # frames are already checkpointed
+        executor.shutdown(cancel_futures=True)
+    return len(pending)
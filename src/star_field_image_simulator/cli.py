@@ -0,0 +1,125 @@
+"""
+Command-line interface
+
+Usage
+-----
+    star-field-image-simulator validate job.json
+    star-field-image-simulator run job.json --workers 8
+    star-field-image-simulator run job.json --pipelined --chunk-size 32
+    star-field-image-simulator serve --port 8765
+    star-field-image-simulator thin-catalog --stars-per-cell 2
+
+See batch.job_spec for the job spec format. Interrupted runs are resumed
+by running the same job spec into the same output directory again.
+"""
+import argparse
+import pathlib
+import sys
+
+from .image_generation.constants import THINNING_STARS_PER_CELL
+from typing import Optional
+
+
+def parse_args(argv: Optional[list[str]]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="star-field-image-simulator",
+        description="Generates star field images",
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    validate = subparsers.add_parser("validate", help="check a job spec")
+    validate.add_argument("job", help="job spec JSON file")
+
+    run = subparsers.add_parser("run", help="render (or resume) a job")
+    run.add_argument("job", help="job spec JSON file")
+    run.add_argument("--output", help="override the output of the job spec")
+    run.add_argument(
+        "--workers", type=int, help="number of processes, defaults to CPUs"
+    )
+    run.add_argument(
+        "--chunk-size",
+        type=int,
+        default=4,
+        help="frames handed to a process at a time",
+    )
+    run.add_argument(
+        "--pipelined",
+        action="store_true",
+        help="overlap the stages of consecutive frames and report them",
+    )
+
+    thin = subparsers.add_parser(
+        "thin-catalog", help="compile a thinned catalog"
+    )
+    thin.add_argument(
+        "--stars-per-cell",
+        type=int,
+        default=THINNING_STARS_PER_CELL,
+        help="brightest stars kept per sky cell",
+    )
+    thin.add_argument("--catalog", help="source catalog, the packaged one")
+
+    # listed for the help only, main hands its arguments to the service
+    subparsers.add_parser("serve", help="start the render service")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    from .image_generation.kernels import use_safe_threading_layer
+
+    # before anything imports numba
+    use_safe_threading_layer()
+    if argv is None:
+        argv = sys.argv[1:]
+    if argv[:1] == ["serve"]:
+        from .service.server import main as serve
+
+        serve(argv[1:])
+        return
+    args = parse_args(argv)
+
+    if args.command == "thin-catalog":
+        import sqlite3
+
+        from .image_generation.catalog_thinning import thinned_catalog_path
+
+        path = thinned_catalog_path(args.stars_per_cell, args.catalog)
+        (num_stars,) = sqlite3.connect(path).execute(
+            "SELECT COUNT(*) FROM star_catalog;"
+        ).fetchone()
+        print(f"{path}: {num_stars} stars")
+        return
+
+    from .batch.job_spec import JobSpec
+
+    try:
+        spec = JobSpec.from_file(args.job)
+    except ValueError as error:
+        sys.exit(str(error))
+
+    if args.command == "validate":
+        print(f"{args.job}: {spec.num_frames} frames")
+        return
+
+    from .batch.runner import pipeline_metrics, run_job
+
+    try:
+        rendered = run_job(
+            spec,
+            args.output,
+            args.workers,
+            args.chunk_size,
+            pipelined=args.pipelined,
+        )
+    except KeyboardInterrupt:
+        sys.exit("interrupted, run the same command again to resume")
+    print(f"rendered {rendered} frames", file=sys.stderr)
+    if args.pipelined:
+        output = args.output or spec.output
+        metrics = pipeline_metrics(pathlib.Path(output))  # type: ignore
+        if metrics is not None:
+            print(metrics.report(), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
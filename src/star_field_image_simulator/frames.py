@@ -0,0 +1,182 @@
+import inspect
+import numpy as np
+import numpy.typing as npt
+
+from .image_generation.canvas_computation import (
+    draw_star_field_image,
+    generate_star_field_image,
+    select_stars,
+)
+from .image_generation.data_manipulation import perturb_stars
+from .image_generation.selection_cache import StarSelectionCache
+from .noise_addition.noise_addition import (
+    add_dark_current_noise,
+    add_read_noise,
+    add_shot_noise,
+)
+from .noise_addition.sensor_model import shared_sensor_model
+from numpy.random import SeedSequence, default_rng
+from typing import Any, Optional, Sequence, Union
+
+
+"optional noise keyword arguments of render_frame"
+NOISE_PARAMETERS = ("nDC", "tauDC", "nRN", "shot_noise", "sensor")
+"arguments of generate_star_field_image that are not frame settings"
+_NON_RENDER_PARAMETERS = (
+    "return_stats",
+    "stats_path",
+    "selection_cache",
+    "star_selection",
+)
+"keyword arguments of render_frame passed to generate_star_field_image"
+RENDER_PARAMETERS = tuple(
+    name
+    for name in inspect.signature(generate_star_field_image).parameters
+    if name not in _NON_RENDER_PARAMETERS
+)
+
+"keyword arguments of render_frame passed to draw_star_field_image"
+DRAW_PARAMETERS = tuple(
+    name
+    for name in inspect.signature(draw_star_field_image).parameters
+    if name in RENDER_PARAMETERS
+    and name not in ("resX", "resY", "star_intensity", "star_sigma")
+)
+"render_frame parameters without a default"
+_REQUIRED_PARAMETERS = tuple(
+    name
+    for name, parameter in inspect.signature(
+        generate_star_field_image
+    ).parameters.items()
+    if parameter.default is inspect.Parameter.empty
+)
+
+"CENTROID_DTYPE structured array, see create_centroids_list"
+Centroids = npt.NDArray[np.void]
+"entropy of the SeedSequence of a frame, None for an unseeded frame"
+FrameSeed = Optional[Union[int, Sequence[int]]]
+"random streams of a frame, in the order they are spawned from its seed"
+FRAME_STREAMS = ("perturbation", "shot_noise", "dark_current")
+
+
+def frame_streams(seed: FrameSeed) -> dict[str, Optional[SeedSequence]]:
+    """
+    Returns the SeedSequence of each of FRAME_STREAMS of a frame, the
+    children of SeedSequence(seed), or None for each without a seed, in
+    which case the module generators are used
+    """
+    if seed is None:
+        return dict.fromkeys(FRAME_STREAMS)
+    return dict(
+        zip(FRAME_STREAMS, SeedSequence(seed).spawn(len(FRAME_STREAMS)))
+    )
+
+
+def render_frame(
+    params: dict[str, Any],
+    selection_cache: Optional[StarSelectionCache] = None,
+    seed: FrameSeed = None,
+) -> tuple[npt.NDArray[np.float64], Centroids]:
+    """
+    Renders one frame from generate_star_field_image keyword arguments,
+    optionally followed by shot noise (shot_noise), the defects of a
+    sensor (sensor, SensorModel keyword arguments), dark current (nDC,
+    tauDC) and read (nRN) noise
+
+    The frame goes through select_frame_stars, draw_frame and
+    add_frame_noise, the steps batch runs overlap. With a seed the same
+    parameters always give the same frame, see frame_streams.
+    """
+    unknown = set(params) - set(RENDER_PARAMETERS) - set(NOISE_PARAMETERS)
+    if unknown:
+        raise ValueError(f"unknown parameters {sorted(unknown)}")
+    missing = [name for name in _REQUIRED_PARAMETERS if name not in params]
+    if missing:
+        raise ValueError(f"missing parameters {missing}")
+
+    image, centroids = draw_frame(
+        select_frame_stars(params, selection_cache), params, seed
+    )
+    return add_frame_noise(image, params, seed), centroids
+
+
+def select_frame_stars(
+    params: dict[str, Any],
+    selection_cache: Optional[StarSelectionCache] = None,
+) -> npt.NDArray[np.void]:
+    """
+    Returns the in-canvas stars of the frame of render_frame parameters,
+    the first step of render_frame, see select_stars
+    """
+    return select_stars(
+        params["alpha0"],
+        params["delta0"],
+        params["phi0"],
+        params["resX"],
+        params["resY"],
+        params["fovX"],
+        params["fovY"],
+        params["magnitude_limit"],
+        selection_cache,
+        params.get("epoch"),
+        stars_per_cell=params.get("stars_per_cell"),
+    )
+
+
+def draw_frame(
+    stars: npt.NDArray[np.void],
+    params: dict[str, Any],
+    seed: FrameSeed = None,
+) -> tuple[npt.NDArray[np.float64], Centroids]:
+    """
+    Returns the clean image and the centroids of the stars of
+    select_frame_stars, perturbed and drawn as in render_frame
+    """
+    perturbation = frame_streams(seed)["perturbation"]
+    frame_stars = perturb_stars(
+        stars,
+        params["num_missing_stars"],
+        params["num_false_stars"],
+        params["resX"],
+        params["resY"],
+        params["min_false_star_magnitude"],
+        params["position_noise"],
+        None if perturbation is None else default_rng(perturbation),
+    )
+    return draw_star_field_image(  # type: ignore
+        frame_stars,
+        params["resX"],
+        params["resY"],
+        params["star_intensity"],
+        params["star_sigma"],
+        **{name: params[name] for name in DRAW_PARAMETERS if name in params},
+    )
+
+
+def add_frame_noise(
+    image: npt.NDArray[np.float64],
+    params: dict[str, Any],
+    seed: FrameSeed = None,
+) -> npt.NDArray[np.float64]:
+    """Returns image with the noise settings of params, see render_frame"""
+    streams = frame_streams(seed)
+    clean = image
+    if params.get("shot_noise"):
+        image = add_shot_noise(
+            image, params["shot_noise"], streams["shot_noise"]
+        )
+    if params.get("sensor"):
+        # in place unless image is still the caller's
+        image = shared_sensor_model(params["sensor"]).apply(
+            image, None if image is clean else image
+        )
+    if params.get("nDC") and params.get("tauDC"):
+        image = add_dark_current_noise(
+            image,
+            params["nDC"],
+            params["tauDC"],
+            streams["dark_current"],
+        )
+    if params.get("nRN"):
+        image = add_read_noise(image, params["nRN"])
+    return image
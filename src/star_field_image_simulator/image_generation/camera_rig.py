@@ -0,0 +1,305 @@
+import math
+import numpy as np
+import numpy.typing as npt
+import pathlib
+
+from .canvas_computation import draw_star_field_image
+from .constants import (
+    ALPHA_MAX,
+    U_COORDINATE_ORIGIN,
+    V_COORDINATE_ORIGIN,
+    get_database_path,
+)
+from .data_manipulation import (
+    STAR_DTYPE,
+    Celestial2Image,
+    cone_condition,
+    get_catalog_connection,
+    perturb_stars,
+)
+from .instrumentation import PipelineStats, time_stage
+from typing import Any, Optional, Union
+
+
+def mounting_rotation(
+    pitch: float = 0, yaw: float = 0, roll: float = 0
+) -> npt.NDArray[np.float64]:
+    """
+    Returns the rotation from the body sensor frame to a head sensor frame
+    tilted by pitch about the sensor x axis, then yaw about its y axis and
+    roll about its boresight, in degrees
+    """
+    pitch, yaw, roll = map(math.radians, (pitch, yaw, roll))
+    about_x = np.array(
+        [
+            [1, 0, 0],
+            [0, math.cos(pitch), -math.sin(pitch)],
+            [0, math.sin(pitch), math.cos(pitch)],
+        ]
+    )
+    about_y = np.array(
+        [
+            [math.cos(yaw), 0, math.sin(yaw)],
+            [0, 1, 0],
+            [-math.sin(yaw), 0, math.cos(yaw)],
+        ]
+    )
+    about_z = np.array(
+        [
+            [math.cos(roll), -math.sin(roll), 0],
+            [math.sin(roll), math.cos(roll), 0],
+            [0, 0, 1],
+        ]
+    )
+    return about_z @ about_y @ about_x  # type: ignore
+
+
+class CameraHead:
+    """
+    CameraHead class used to represent a star tracker head of a rig
+
+    Attributes
+    ----------
+    mounting : numpy.ndarray[shape=(3,3), dtype[numpy.float]]
+        Rotation from the body sensor frame to the head sensor frame,
+        see mounting_rotation
+    fovX : float
+        Head horizontal field of view
+    fovY : float
+        Head vertical field of view
+    resX : int
+        Head horizontal pixel count (resolution)
+    resY : int
+        Head vertical pixel count (resolution)
+    projection_matrix : numpy.ndarray[shape=(3,3), dtype[numpy.float]]
+        Head's internal parameters
+    """
+
+    def __init__(
+        self,
+        mounting: npt.ArrayLike,
+        fovX: float,
+        fovY: float,
+        resX: int,
+        resY: int,
+    ) -> None:
+        self.mounting = np.asarray(mounting, dtype=np.float64)
+        self.fovX = fovX
+        self.fovY = fovY
+        self.resX = resX
+        self.resY = resY
+
+    @property
+    def projection_matrix(self) -> npt.ArrayLike:
+        return Celestial2Image(
+            0, 0, 0, self.fovX, self.fovY, self.resX, self.resY
+        ).projection_matrix
+
+    @property
+    def radius(self) -> float:
+        """Returns the angular radius of the FOV"""
+        return math.sqrt(self.fovX ** 2 + self.fovY ** 2) / 2
+
+    def __repr__(self) -> str:
+        return f"CameraHead( {self.mounting.tolist()}, {self.fovX},\
+        {self.fovY}, {self.resX}, {self.resY},)"
+
+
+class CameraRig:
+    """
+    CameraRig class used to render the heads of a multi-head star tracker
+
+    All heads share a single catalog query, the union of the boxes
+    fetch_stars would query for each of them, and the fetched stars are
+    projected into every head with one batched matrix product, so adding
+    a head only adds its rendering.
+
+    Attributes
+    ----------
+    heads : list[CameraHead]
+        Heads of the rig
+
+    Methods
+    -------
+    head_rotations(alpha0, delta0, phi0)
+        Returns the celestial to sensor rotation of every head
+    fetch_stars(rotations, magnitude, path)
+        Returns the catalog stars seen by any head
+    project(alpha0, delta0, phi0, magnitude, path)
+        Returns the in-canvas stars of every head
+    render(alpha0, delta0, phi0, magnitude_limit, ...)
+        Returns the image and centroids of every head
+    """
+
+    def __init__(self, heads: list[CameraHead]) -> None:
+        if not heads:
+            raise ValueError("a camera rig needs at least one head")
+        self.heads = heads
+
+    def head_rotations(
+        self, alpha0: float, delta0: float, phi0: float
+    ) -> npt.NDArray[np.float64]:
+        """
+        Returns the (heads, 3, 3) rotations from celestial coordinates to
+        the head sensor frames for the body attitude (alpha0, delta0, phi0)
+        """
+        body = np.asarray(
+            Celestial2Image(alpha0, delta0, phi0, 1, 1, 1, 1).rotation_matrix
+        )
+        mountings = np.stack([head.mounting for head in self.heads])
+        return mountings @ body  # type: ignore
+
+    def fetch_stars(
+        self,
+        rotations: npt.NDArray[np.float64],
+        magnitude: float,
+        path: Union[pathlib.Path, str],
+    ) -> npt.NDArray[np.float64]:
+        """Returns the (index, ra, dec, magnitude) rows seen by any head"""
+        conditions = []
+        params: dict[str, float] = {"magnitude": magnitude}
+        for i, (head, rotation) in enumerate(zip(self.heads, rotations)):
+            # the third row of the rotation is minus the boresight
+            x, y, z = -rotation[2]
+            condition, head_params = cone_condition(
+                math.degrees(math.atan2(y, x)) % ALPHA_MAX,
+                math.degrees(math.asin(max(-1.0, min(1.0, z)))),
+                head.radius,
+                f"_{i}",
+            )
+            conditions.append(f"({condition})")
+            params.update(head_params)
+        rows = (
+            get_catalog_connection(path)
+            .execute(
+                f"""SELECT * FROM star_catalog
+                WHERE magnitude <= :magnitude
+                AND ({" OR ".join(conditions)});""",
+                params,
+            )
+            .fetchall()
+        )
+        return np.array(rows, dtype=np.float64).reshape(-1, 4)
+
+    def project(
+        self,
+        alpha0: float,
+        delta0: float,
+        phi0: float,
+        magnitude: float,
+        path: Optional[Union[pathlib.Path, str]] = None,
+        stats: Optional[PipelineStats] = None,
+    ) -> list[npt.NDArray[np.void]]:
+        """
+        Returns the stars in the canvas of every head, as STAR_DTYPE
+        structured arrays ordered like the heads
+        """
+        if path is None:
+            path = get_database_path()
+        rotations = self.head_rotations(alpha0, delta0, phi0)
+        with time_stage(stats, "fetch"):
+            rows = self.fetch_stars(rotations, magnitude, path)
+
+        with time_stage(stats, "projection"):
+            right_ascension = np.radians(rows[:, 1])
+            declination = np.radians(rows[:, 2])
+            directions = np.stack(
+                [
+                    np.cos(declination) * np.cos(right_ascension),
+                    np.cos(declination) * np.sin(right_ascension),
+                    np.sin(declination),
+                ]
+            )
+            camera_matrices = (
+                np.stack([head.projection_matrix for head in self.heads])
+                @ rotations
+            )
+            homogeneous = np.einsum("hij,jn->hin", camera_matrices, directions)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                u = homogeneous[:, 0] / homogeneous[:, 2]
+                v = homogeneous[:, 1] / homogeneous[:, 2]
+
+        with time_stage(stats, "canvas_selection"):
+            resX = np.array([head.resX for head in self.heads])[:, None]
+            resY = np.array([head.resY for head in self.heads])[:, None]
+            # stars behind a head project into its canvas mirrored
+            in_canvas = (
+                (homogeneous[:, 2] < 0)
+                & (U_COORDINATE_ORIGIN <= u)
+                & (u <= resX)
+                & (V_COORDINATE_ORIGIN <= v)
+                & (v <= resY)
+            )
+            selections = []
+            for head in range(len(self.heads)):
+                visible = np.flatnonzero(in_canvas[head])
+                stars = np.zeros(len(visible), dtype=STAR_DTYPE)
+                stars["index"] = rows[visible, 0]
+                stars["u"] = stars["true_u"] = u[head, visible]
+                stars["v"] = stars["true_v"] = v[head, visible]
+                stars["magnitude"] = rows[visible, 3]
+                selections.append(stars)
+
+        if stats is not None:
+            stats.stars_fetched += len(rows)
+            stats.stars_in_canvas += int(in_canvas.sum())
+        return selections
+
+    def render(
+        self,
+        alpha0: float,
+        delta0: float,
+        phi0: float,
+        magnitude_limit: float,
+        num_missing_stars: int,
+        num_false_stars: int,
+        min_false_star_magnitude: float,
+        star_intensity: float,
+        star_sigma: float,
+        position_noise: float,
+        integrated: bool = True,
+        lazy: bool = True,
+        method: str = "direct",
+        generator: Optional[np.random.Generator] = None,
+        stats: Optional[PipelineStats] = None,
+    ) -> list[tuple[npt.NDArray[np.float64], npt.NDArray[np.void]]]:
+        """
+        Renders every head for the body attitude (alpha0, delta0, phi0)
+
+        The remaining arguments are those of generate_star_field_image and
+        apply to every head, whose missing stars, false stars and position
+        noise are drawn independently from generator.
+
+        Returns the (image, centroids) of every head, ordered like heads.
+        """
+        frames: list[Any] = []
+        selections = self.project(
+            alpha0, delta0, phi0, magnitude_limit, stats=stats
+        )
+        for head, stars in zip(self.heads, selections):
+            with time_stage(stats, "perturbation"):
+                frame_stars = perturb_stars(
+                    stars,
+                    num_missing_stars,
+                    num_false_stars,
+                    head.resX,
+                    head.resY,
+                    min_false_star_magnitude,
+                    position_noise,
+                    generator,
+                )
+            with time_stage(stats, "render"):
+                frames.append(
+                    draw_star_field_image(
+                        frame_stars,
+                        head.resX,
+                        head.resY,
+                        star_intensity,
+                        star_sigma,
+                        integrated,
+                        lazy,
+                        stats,
+                        method=method,
+                    )
+                )
+        return frames
@@ -1,103 +1,605 @@
 import numpy as np
 import numpy.typing as npt
+import os
+import pathlib
+import warnings
 
 from .constants import (
-    DATABASE_PATH,
+    FFT_DENSITY_THRESHOLD,
+    FFT_SIGMA_MIN,
     SUB_IMAGE_SIZE,
     U_COORDINATE_ORIGIN,
     V_COORDINATE_ORIGIN,
-    STAR_INTENSITY_LEVEL,
+    get_database_path,
 )
 from .data_manipulation import (
     Celestial2Image,
-    Star,
-    create_false_stars,
+    Stars,
+    create_centroids_list,
     create_stars_list,
-    remove_random_stars,
+    perturb_stars,
+    resolve_catalog_path,
+    stars_to_array,
 )
-from numpy.random import default_rng
-from scipy.special import erf
+from .instrumentation import PipelineStats, time_stage
+from .kernels import (
+    bucket_stars_by_band,
+    render_stars_numba,
+    resolve_backend,
+)
+from typing import TYPE_CHECKING, Optional, Union
+
+if TYPE_CHECKING:
+    from .selection_cache import StarSelectionCache
+    from .star_selection import StarSelection
+
+
+RENDER_METHODS = ("direct", "fft", "auto", "vectorized")
+"rows of the canvas rendered by one task of render_bands"
+RENDER_BAND_HEIGHT = 64
+"padded window pixels evaluated at once by render_vectorized"
+VECTORIZED_BATCH_PIXELS = 1 << 20
+
+
+def adaptive_half_sizes(
+    flux: npt.NDArray[np.float64],
+    star_sigma: float,
+    residual_threshold: float,
+) -> npt.NDArray[np.int64]:
+    """
+    Returns per-star sub-image half sizes such that every pixel left out
+    of a star's window receives less than residual_threshold from it
+
+    A pixel whose nearest point lies r pixels away from the star receives
+    at most flux * exp(-r ** 2 / (2 * star_sigma ** 2)). Stars whose peak
+    intensity does not exceed the threshold get a half size of 0, i.e. an
+    empty window, and are skipped.
+    """
+    if residual_threshold <= 0:
+        raise ValueError("residual_threshold must be greater than 0")
+
+    ratio = flux / residual_threshold
+    radius = star_sigma * np.sqrt(2 * np.log(np.maximum(ratio, 1)))
+    # the window is centered on the nearest pixel, which is up to half a
+    # pixel away from the star, and its upper bound is exclusive
+    return np.where(ratio > 1, np.ceil(radius + 1.5), 0).astype(np.int64)
+
+
+def star_windows(
+    u: npt.NDArray[np.float64],
+    v: npt.NDArray[np.float64],
+    resX: int,
+    resY: int,
+    lazy: bool = True,
+    half_sizes: Optional[npt.NDArray[np.int64]] = None,
+) -> tuple[npt.NDArray[np.int64], ...]:
+    """
+    Returns the (u_start, u_stop, v_start, v_stop) pixel bounds of the
+    sub-image each star is evaluated on, clipped to the canvas
 
+    In lazy mode the window spans 2 * half_size pixels around the pixel
+    nearest to the star, SUB_IMAGE_SIZE - 1 unless per-star half_sizes
+    are given, otherwise it is the whole canvas.
+    """
+    num_stars = len(u)
+    if not lazy:
+        return (
+            np.full(num_stars, U_COORDINATE_ORIGIN),
+            np.full(num_stars, resX),
+            np.full(num_stars, V_COORDINATE_ORIGIN),
+            np.full(num_stars, resY),
+        )
+
+    sub_image_half_size: Union[int, npt.NDArray[np.int64]] = (
+        SUB_IMAGE_SIZE - 1
+    ) // 2
+    if half_sizes is not None:
+        sub_image_half_size = half_sizes
+    # compute center pixel, rounding half to even like round()
+    x_center = np.rint(u).astype(np.int64)
+    y_center = np.rint(v).astype(np.int64)
+    return (
+        np.maximum(x_center - sub_image_half_size, U_COORDINATE_ORIGIN),
+        np.minimum(x_center + sub_image_half_size, resX),
+        np.maximum(y_center - sub_image_half_size, V_COORDINATE_ORIGIN),
+        np.minimum(y_center + sub_image_half_size, resY),
+    )
+
+
+def add_star_contribution(
+    canvas: npt.NDArray[np.float64],
+    u_origin: int,
+    v_origin: int,
+    u_start: int,
+    u_stop: int,
+    v_start: int,
+    v_stop: int,
+    Ui: float,
+    Vi: float,
+    flux: float,
+    star_sigma: float,
+    integrated: bool,
+) -> None:
+    """
+    Adds the PSF of one star over the pixels [v_start, v_stop) x
+    [u_start, u_stop) of canvas, whose top-left pixel is at
+    (u_origin, v_origin) of the full image
+    """
+    if u_start >= u_stop or v_start >= v_stop:
+        return
+
+    indices_u = np.arange(u_start, u_stop)
+    indices_v = np.arange(v_start, v_stop)
+    scope = (
+        slice(v_start - v_origin, v_stop - v_origin),
+        slice(u_start - u_origin, u_stop - u_origin),
+    )
+    if integrated:
+        # scipy is only needed here, import it on first use to keep the
+        # package cheap to import for workers that never render
+        from scipy.special import erf
+
+        # input to erf, the PSF is separable so the rows and columns of
+        # the sub-image are evaluated once
+        x1 = (indices_u + 1 - Ui) / (np.sqrt(2) * star_sigma)
+        x2 = (indices_u - Ui) / (np.sqrt(2) * star_sigma)
+        y1 = (indices_v + 1 - Vi) / (np.sqrt(2) * star_sigma)
+        y2 = (indices_v - Vi) / (np.sqrt(2) * star_sigma)
+
+        # computing starContribution
+        starContribution = (
+            flux
+            * (np.pi * star_sigma ** 2 / 2)
+            * (erf(x1) - erf(x2))[np.newaxis, :]
+            * (erf(y1) - erf(y2))[:, np.newaxis]
+        )
+    else:
+        x = (indices_u - Ui)[np.newaxis, :]
+        y = (indices_v - Vi)[:, np.newaxis]
+
+        # computing starContribution
+        starContribution = flux * (
+            np.exp(-(x ** 2 + y ** 2) / (2 * star_sigma ** 2))
+        )
 
-rng = default_rng()
+    canvas[scope] += starContribution
+
+
+def render_bands(
+    canvas: npt.NDArray[np.float64],
+    u_start: npt.NDArray[np.int64],
+    u_stop: npt.NDArray[np.int64],
+    v_start: npt.NDArray[np.int64],
+    v_stop: npt.NDArray[np.int64],
+    u: npt.NDArray[np.float64],
+    v: npt.NDArray[np.float64],
+    flux: npt.NDArray[np.float64],
+    star_sigma: float,
+    integrated: bool,
+    threads: int,
+    band_height: int = RENDER_BAND_HEIGHT,
+) -> None:
+    """
+    Adds the PSFs of the stars over their windows of canvas, one band of
+    band_height rows per task of a pool of threads threads
+
+    Every band only adds the rows of the stars whose window overlaps it,
+    in star order, so the bands write disjoint pixels and the image is
+    the same as when the stars are added one after the other. NumPy and
+    scipy release the GIL while they evaluate the PSFs.
+    """
+    offsets, band_stars = bucket_stars_by_band(
+        v_start, v_stop, canvas.shape[0], band_height
+    )
+
+    def render_band(band: int) -> None:
+        first_row = band * band_height
+        last_row = min(first_row + band_height, canvas.shape[0])
+        for i in band_stars[offsets[band] : offsets[band + 1]]:
+            add_star_contribution(
+                canvas,
+                U_COORDINATE_ORIGIN,
+                V_COORDINATE_ORIGIN,
+                u_start[i],
+                u_stop[i],
+                max(v_start[i], first_row),
+                min(v_stop[i], last_row),
+                u[i],
+                v[i],
+                flux[i],
+                star_sigma,
+                integrated,
+            )
+
+    # concurrent.futures is only needed here, import it on first use to
+    # keep the package cheap to import
+    import concurrent.futures
+
+    num_bands = len(offsets) - 1
+    with concurrent.futures.ThreadPoolExecutor(
+        max(1, min(threads, num_bands))
+    ) as executor:
+        # consuming the results re-raises the exceptions of the bands
+        list(executor.map(render_band, range(num_bands)))
+
+
+def _psf_factors(
+    start: npt.NDArray[np.int64],
+    stop: npt.NDArray[np.int64],
+    center: npt.NDArray[np.float64],
+    length: int,
+    star_sigma: float,
+    integrated: bool,
+) -> tuple[npt.NDArray[np.int64], npt.NDArray[np.float64]]:
+    """
+    Returns the (N, length) pixel indices from start and the separable
+    PSF factors of the stars over them, 0 from stop on
+    """
+    indices = start[:, np.newaxis] + np.arange(length)
+    offsets = indices - center[:, np.newaxis]
+    scale = np.sqrt(2) * star_sigma
+    if integrated:
+        # scipy is only needed here, import it on first use
+        from scipy.special import erf
+
+        factors = erf((offsets + 1) / scale) - erf(offsets / scale)
+    else:
+        factors = np.exp(-(offsets ** 2) / scale ** 2)
+    factors *= indices < stop[:, np.newaxis]
+    return indices, factors
+
+
+def render_vectorized(
+    canvas: npt.NDArray[np.float64],
+    u_start: npt.NDArray[np.int64],
+    u_stop: npt.NDArray[np.int64],
+    v_start: npt.NDArray[np.int64],
+    v_stop: npt.NDArray[np.int64],
+    u: npt.NDArray[np.float64],
+    v: npt.NDArray[np.float64],
+    flux: npt.NDArray[np.float64],
+    star_sigma: float,
+    integrated: bool,
+    batch_pixels: int = VECTORIZED_BATCH_PIXELS,
+) -> None:
+    """
+    Adds the PSFs of the stars over their windows of canvas with a few
+    vectorized evaluations instead of one per star
+
+    The stars are batched by window size, up to batch_pixels padded
+    window pixels per batch. The row and column factors of a batch are
+    evaluated at once over its largest window, zeroed outside the window
+    of each star, and their products are scattered into canvas with
+    np.add.at, which accumulates the overlapping windows of close stars.
+    A batch whose stars share one window, such as the whole canvas out
+    of lazy mode, is summed into it with a single matrix product.
+    """
+    visible = np.flatnonzero((u_start < u_stop) & (v_start < v_stop))
+    if len(visible) == 0:
+        return
+    u_start, u_stop = u_start[visible], u_stop[visible]
+    v_start, v_stop = v_start[visible], v_stop[visible]
+    u, v, flux = u[visible], v[visible], flux[visible]
+    heights = v_stop - v_start
+    widths = u_stop - u_start
+    amplitude = flux * (np.pi * star_sigma ** 2 / 2 if integrated else 1)
+    # windows within a factor 2 of each other are padded together
+    size_class = np.ceil(np.log2(np.maximum(heights, widths))).astype(int)
+    for size in np.unique(size_class):
+        members = np.flatnonzero(size_class == size)
+        height = int(heights[members].max())
+        width = int(widths[members].max())
+        batch_size = max(1, batch_pixels // (height * width))
+        for first in range(0, len(members), batch_size):
+            batch = members[first : first + batch_size]
+            rows_v, rows = _psf_factors(
+                v_start[batch],
+                v_stop[batch],
+                v[batch],
+                height,
+                star_sigma,
+                integrated,
+            )
+            columns_u, columns = _psf_factors(
+                u_start[batch],
+                u_stop[batch],
+                u[batch],
+                width,
+                star_sigma,
+                integrated,
+            )
+            rows *= amplitude[batch, np.newaxis]
+            bounds = (u_start, u_stop, v_start, v_stop)
+            if all((b[batch] == b[batch[0]]).all() for b in bounds):
+                scope = (
+                    slice(v_start[batch[0]], v_stop[batch[0]]),
+                    slice(u_start[batch[0]], u_stop[batch[0]]),
+                )
+                canvas[scope] += (
+                    rows[:, : heights[batch[0]]].T
+                    @ columns[:, : widths[batch[0]]]
+                )
+                continue
+            # the padding is 0, clip its indices into the canvas
+            pixels = (
+                np.minimum(rows_v, canvas.shape[0] - 1)[:, :, np.newaxis]
+                * canvas.shape[1]
+                + np.minimum(columns_u, canvas.shape[1] - 1)[:, np.newaxis, :]
+            )
+            np.add.at(
+                canvas.reshape(-1),
+                pixels.reshape(-1),
+                (rows[:, :, np.newaxis] * columns[:, np.newaxis, :]).reshape(
+                    -1
+                ),
+            )
 
 
 def draw_star_field_image(
-    stars: list[Star],
+    stars: Stars,
     resX: int,
     resY: int,
     star_intensity: float,
     star_sigma: float,
     integrated: bool = True,
     lazy: bool = True,
+    stats: Optional[PipelineStats] = None,
+    residual_threshold: Optional[float] = None,
+    method: str = "direct",
+    backend: Optional[str] = None,
+    threads: Optional[int] = 1,
 ):
-    indices_u, indices_v = np.meshgrid(np.arange(resX), np.arange(resY))
+    """
+    Draws the stars on a resY x resX canvas
 
-    star_field_image = np.zeros([resY, resX])
+    With lazy set each star is only evaluated on a sub-image around it.
+    Its size is SUB_IMAGE_SIZE unless residual_threshold is given, in
+    which case it is picked per star from star_sigma and the star's flux
+    so that the pixels left out receive less than the threshold, and
+    stars fainter than the threshold are skipped altogether.
 
-    sub_image_half_size = (SUB_IMAGE_SIZE - 1) // 2
+    method selects how the PSFs are evaluated: "direct" evaluates every
+    star over its own sub-image, "fft" deposits the stars on the pixel
+    grid and convolves it once with the PSF (see render_fft), "vectorized"
+    evaluates batches of stars at once (see render_vectorized), and
+    "auto" picks "fft" when the star
+    density times the sub-image area exceeds FFT_DENSITY_THRESHOLD and
+    star_sigma is at least FFT_SIGMA_MIN, below which the PSF is too
+    narrow for the FFT renderer to be accurate.
 
-    centroids = []
+    backend selects the kernel of the "direct" method, "numpy" or "numba"
+    (see kernels), by default numba when it is installed. With the numpy
+    backend, threads > 1 renders bands of rows concurrently on as many
+    threads (all cores when None), see render_bands. The numba kernel runs
+    on numba's own threads and warns when threads is not 1.
 
-    for star in stars:
-        Mi = star.magnitude
-        Ui = star.u
-        Vi = star.v
-        IDi = star.index
+    stars is a list of Star objects or a STAR_DTYPE structured array.
 
-        centroids.append((IDi, Ui, Vi))
+    Returns the image and the centroids as a CENTROID_DTYPE structured
+    array, see create_centroids_list.
+    """
+    if residual_threshold is not None and not lazy:
+        raise ValueError("residual_threshold requires lazy mode")
+    if method not in RENDER_METHODS:
+        raise ValueError(f"method must be one of {RENDER_METHODS}")
+    backend = resolve_backend(backend)
 
-        if lazy:
-            # compute center pixel
-            x_center = round(Ui)  # type: ignore
-            y_center = round(Vi)  # type: ignore
+    centroids = create_centroids_list(stars, star_intensity)
 
-            # get index of the subimage
-            uScope = np.arange(
-                max(x_center - sub_image_half_size, U_COORDINATE_ORIGIN),
-                min(x_center + sub_image_half_size, resX),
-            )
-            vScope = np.arange(
-                max(y_center - sub_image_half_size, V_COORDINATE_ORIGIN),
-                min(y_center + sub_image_half_size, resY),
-            )
-        else:
-            # use the whole resolution
-            uScope = np.arange(U_COORDINATE_ORIGIN, resX)
-            vScope = np.arange(V_COORDINATE_ORIGIN, resY)
-
-        scope = np.ix_(vScope.astype(int), uScope.astype(int))  # type: ignore
-        if integrated:
-            # input to erf
-            x1 = (indices_u[scope] + 1 - Ui) / (np.sqrt(2) * star_sigma)
-            x2 = (indices_u[scope] - Ui) / (np.sqrt(2) * star_sigma)
-            y1 = (indices_v[scope] + 1 - Vi) / (np.sqrt(2) * star_sigma)
-            y2 = (indices_v[scope] - Vi) / (np.sqrt(2) * star_sigma)
-
-            # computing starContribution
-            starContribution = (
-                (star_intensity / STAR_INTENSITY_LEVEL ** Mi)
-                * (np.pi * star_sigma ** 2 / 2)
-                * (erf(x1) - erf(x2))
-                * (erf(y1) - erf(y2))
-            )
+    u, v = centroids["u"], centroids["v"]
+    flux = centroids["flux"]
+    half_sizes = None
+    if residual_threshold is not None:
+        half_sizes = adaptive_half_sizes(flux, star_sigma, residual_threshold)
+    u_start, u_stop, v_start, v_stop = star_windows(
+        u, v, resX, resY, lazy, half_sizes
+    )
 
-            star_field_image[scope] += starContribution
-        else:
+    # stars skipped by the adaptive window have an empty sub-image
+    visible = np.flatnonzero((u_stop > u_start) & (v_stop > v_start))
+    window_pixels = int(
+        np.sum((u_stop - u_start)[visible] * (v_stop - v_start)[visible])
+    )
+
+    if method == "auto":
+        density = window_pixels / (resX * resY)
+        method = (
+            "fft"
+            if density > FFT_DENSITY_THRESHOLD and star_sigma >= FFT_SIGMA_MIN
+            else "direct"
+        )
+
+    if stats is not None:
+        stats.stars_rendered += len(stars)
+        # the FFT renderer convolves the whole canvas
+        stats.pixels_touched += (
+            resX * resY if method == "fft" else window_pixels
+        )
+
+    if method == "fft":
+        from .fft_rendering import render_fft
+
+        star_field_image = render_fft(
+            u[visible],
+            v[visible],
+            flux[visible],
+            resX,
+            resY,
+            star_sigma,
+            integrated,
+        )
+        return star_field_image, centroids
+
+    star_field_image = np.zeros([resY, resX])
+    if method == "vectorized":
+        render_vectorized(
+            star_field_image,
+            u_start[visible],
+            u_stop[visible],
+            v_start[visible],
+            v_stop[visible],
+            u[visible],
+            v[visible],
+            flux[visible],
+            star_sigma,
+            integrated,
+        )
+        return star_field_image, centroids
 
-            x = indices_u[scope] - Ui
-            y = indices_v[scope] - Vi
+    if backend == "numba":
+        if threads != 1:
+            warnings.warn(
+                "threads only applies to the numpy backend, the numba "
+                "kernel runs on numba's threads (NUMBA_NUM_THREADS)",
+                stacklevel=2,
+            )
+        render_stars_numba(
+            star_field_image,
+            u_start[visible],
+            u_stop[visible],
+            v_start[visible],
+            v_stop[visible],
+            u[visible],
+            v[visible],
+            flux[visible],
+            star_sigma,
+            integrated,
+        )
+        return star_field_image, centroids
 
-            # computing starContribution
-            starContribution = (
-                star_intensity / STAR_INTENSITY_LEVEL ** Mi
-            ) * (np.exp(-(x ** 2 + y ** 2) / (2 * star_sigma ** 2)))
+    if threads is None:
+        threads = os.cpu_count() or 1
+    if threads > 1:
+        render_bands(
+            star_field_image,
+            u_start[visible],
+            u_stop[visible],
+            v_start[visible],
+            v_stop[visible],
+            u[visible],
+            v[visible],
+            flux[visible],
+            star_sigma,
+            integrated,
+            threads,
+        )
+        return star_field_image, centroids
 
-            star_field_image[scope] += starContribution
+    for i in visible:
+        add_star_contribution(
+            star_field_image,
+            U_COORDINATE_ORIGIN,
+            V_COORDINATE_ORIGIN,
+            u_start[i],
+            u_stop[i],
+            v_start[i],
+            v_stop[i],
+            u[i],
+            v[i],
+            flux[i],
+            star_sigma,
+            integrated,
+        )
 
     return star_field_image, centroids
 
 
+def select_stars(
+    alpha0: float,
+    delta0: float,
+    phi0: float,
+    resX: int,
+    resY: int,
+    fovX: float,
+    fovY: float,
+    magnitude_limit: float,
+    selection_cache: Optional["StarSelectionCache"] = None,
+    epoch: Optional[float] = None,
+    stats: Optional[PipelineStats] = None,
+    star_selection: Optional["StarSelection"] = None,
+    stars_per_cell: Optional[int] = None,
+) -> npt.NDArray[np.void]:
+    """
+    Returns the catalog stars projected in the canvas as a STAR_DTYPE
+    array, looked up in and stored to selection_cache when one is given,
+    and taken from the catalog propagated to epoch when one is given or
+    else from the cached cone of star_selection when one is given and
+    holds the catalog. The catalog is the thinned catalog keeping
+    stars_per_cell stars per sky cell when it is given, see
+    catalog_thinning.
+    """
+    c2i = Celestial2Image(alpha0, delta0, phi0, fovX, fovY, resX, resY)
+    database_path = resolve_catalog_path(get_database_path(), stars_per_cell)
+    if star_selection is not None and star_selection.path != pathlib.Path(
+        database_path
+    ):
+        star_selection = None
+    stars = None
+    if selection_cache is not None:
+        with time_stage(stats, "selection_cache"):
+            cache_key = selection_cache.key(
+                alpha0,
+                delta0,
+                phi0,
+                fovX,
+                fovY,
+                resX,
+                resY,
+                magnitude_limit,
+                database_path,
+                epoch,
+            )
+            stars = selection_cache.get(cache_key)
+        if stars is not None and stats is not None:
+            stats.selection_cache_hits += 1
+            stats.stars_in_canvas += len(stars)
+    if stars is None:
+        if epoch is None and star_selection is not None:
+            stars = star_selection.select(
+                c2i,
+                magnitude_limit,
+                U_COORDINATE_ORIGIN,
+                resX,
+                V_COORDINATE_ORIGIN,
+                resY,
+                stats,
+            )
+        elif epoch is None:
+            stars = stars_to_array(
+                create_stars_list(
+                    alpha0,
+                    delta0,
+                    magnitude_limit,
+                    fovX,
+                    fovY,
+                    U_COORDINATE_ORIGIN,
+                    resX,
+                    V_COORDINATE_ORIGIN,
+                    resY,
+                    c2i,
+                    database_path,
+                    stats,
+                )
+            )
+        else:
+            # only frames with an epoch need the propagation module
+            from .epoch_propagation import propagate_catalog
+
+            stars = propagate_catalog(epoch, database_path).select(
+                c2i,
+                magnitude_limit,
+                U_COORDINATE_ORIGIN,
+                resX,
+                V_COORDINATE_ORIGIN,
+                resY,
+                stats,
+            )
+        if selection_cache is not None:
+            with time_stage(stats, "selection_cache"):
+                selection_cache.put(cache_key, stars)
+    return stars  # type: ignore
+
+
 def generate_star_field_image(
     alpha0: float,
     delta0: float,
@@ -115,35 +617,114 @@ def generate_star_field_image(
     position_noise: float,
     integrated: bool = True,
     lazy: bool = True,
+    return_stats: bool = False,
+    stats_path: Optional[Union[pathlib.Path, str]] = None,
+    residual_threshold: Optional[float] = None,
+    method: str = "direct",
+    selection_cache: Optional["StarSelectionCache"] = None,
+    backend: Optional[str] = None,
+    epoch: Optional[float] = None,
+    threads: Optional[int] = 1,
+    star_selection: Optional["StarSelection"] = None,
+    stars_per_cell: Optional[int] = None,
 ) -> npt.ArrayLike:
-    c2i = Celestial2Image(alpha0, delta0, phi0, fovX, fovY, resX, resY)
-    stars = create_stars_list(
+    """
+    Generates a star field image and its centroids
+
+    When return_stats is set a PipelineStats holding per-stage wall times
+    and star/pixel counters is returned as a third element, and when
+    stats_path is given the same statistics are appended to it as a JSON
+    line. Instrumentation is skipped entirely when neither is requested.
+
+    residual_threshold selects flux-adaptive sub-image sizes, method the
+    PSF evaluation strategy, backend its kernel and threads the number of
+    threads of the numpy kernel, see draw_star_field_image.
+
+    When a selection_cache is given the projected in-canvas stars are
+    looked up there before querying the catalog, and stored there after.
+
+    When an epoch (Julian years) is given the stars are selected from the
+    catalog propagated to it by their proper motions, see
+    epoch_propagation.propagate_catalog. Otherwise, when a
+    star_selection is given, they are selected from its cached catalog
+    cone, which roll, resolution and FOV changes reuse without a query.
+
+    When stars_per_cell is given the stars are selected from the thinned
+    catalog keeping the stars_per_cell brightest stars of every sky cell,
+    which bounds the number of stars of wide FOVs, see catalog_thinning.
+    """
+    stats = PipelineStats() if return_stats or stats_path else None
+    if stats is not None:
+        stats.parameters = {
+            "alpha0": alpha0,
+            "delta0": delta0,
+            "phi0": phi0,
+            "resX": resX,
+            "resY": resY,
+            "fovX": fovX,
+            "fovY": fovY,
+            "magnitude_limit": magnitude_limit,
+            "integrated": integrated,
+            "lazy": lazy,
+            "residual_threshold": residual_threshold,
+            "method": method,
+            "backend": backend,
+            "epoch": epoch,
+            "threads": threads,
+            "stars_per_cell": stars_per_cell,
+        }
+
+    stars = select_stars(
         alpha0,
         delta0,
-        magnitude_limit,
-        fovX,
-        fovY,
-        U_COORDINATE_ORIGIN,
+        phi0,
         resX,
-        V_COORDINATE_ORIGIN,
         resY,
-        c2i,
-        DATABASE_PATH,
+        fovX,
+        fovY,
+        magnitude_limit,
+        selection_cache,
+        epoch,
+        stats,
+        star_selection,
+        stars_per_cell,
     )
-    stars = remove_random_stars(stars, num_missing_stars)
-    stars.extend(
-        create_false_stars(
-            num_false_stars, resX, resY, min_false_star_magnitude
+
+    with time_stage(stats, "perturbation"):
+        frame_stars = perturb_stars(
+            stars,
+            num_missing_stars,
+            num_false_stars,
+            resX,
+            resY,
+            min_false_star_magnitude,
+            position_noise,
         )
-    )
 
-    if position_noise:
-        for star in stars:
-            pixels_u = rng.normal(0, position_noise)
-            pixels_v = rng.normal(0, position_noise)
-            star.u = np.clip(star.u + pixels_u, 0, resX)  # type: ignore
-            star.v = np.clip(star.v + pixels_v, 0, resY)  # type: ignore
+    if stats is not None:
+        stats.stars_removed += len(stars) - int(
+            np.sum(~frame_stars["is_false"])
+        )
+        stats.false_stars_added += num_false_stars
+
+    with time_stage(stats, "render"):
+        star_field_image, centroids = draw_star_field_image(
+            frame_stars,
+            resX,
+            resY,
+            star_intensity,
+            star_sigma,
+            integrated,
+            lazy,
+            stats,
+            residual_threshold,
+            method,
+            backend,
+            threads,
+        )
 
-    return draw_star_field_image(  # type: ignore
-        stars, resX, resY, star_intensity, star_sigma, integrated, lazy
-    )  # type: ignore
+    if stats_path is not None:
+        stats.append_json_line(stats_path)  # type: ignore
+    if return_stats:
+        return star_field_image, centroids, stats  # type: ignore
+    return star_field_image, centroids  # type: ignore
@@ -0,0 +1,210 @@
+"""
+Thinned catalogs for wide fields of view
+
+At wide FOVs and faint magnitude limits thousands of stars land in a
+frame, most of which a star tracker ignores, and the render time grows
+with them. A thinned catalog keeps only the stars_per_cell brightest
+stars of every cell of an equal-area sky grid (the grid of
+StarDensityMap), so any FOV holds at most stars_per_cell times the number
+of cells it overlaps, whatever the magnitude limit, while sparse regions
+keep all their stars.
+
+compile_thinned_catalog writes a thinned catalog with the tables and
+schema of its source, so every reader of star_catalog.db (fetch_stars,
+StarSelection, the epoch propagation, the selection cache) reads it
+unchanged. thinned_catalog_path compiles it once, next to the source or
+in the cache directory of the package, under a name holding the thinning
+parameters and the source version.
+"""
+import numpy as np
+import numpy.typing as npt
+import os
+import pathlib
+import sqlite3
+import tempfile
+
+from .constants import (
+    THINNING_NUM_DEC,
+    THINNING_NUM_RA,
+    THINNING_STARS_PER_CELL,
+    get_cache_directory,
+    get_database_path,
+    is_extracted,
+)
+from .selection_cache import catalog_version
+from typing import Optional, Union
+
+
+def sky_cells(
+    right_ascension: npt.ArrayLike,
+    declination: npt.ArrayLike,
+    num_ra: int,
+    num_dec: int,
+) -> npt.NDArray[np.int64]:
+    """
+    Returns the cells of the directions (degrees) in a grid of num_dec
+    bands of equal width in sin(declination) by num_ra columns of equal
+    width in right ascension, numbered row * num_ra + column
+    """
+    right_ascension = np.asarray(right_ascension, dtype=np.float64)
+    declination = np.asarray(declination, dtype=np.float64)
+    columns = np.minimum(
+        (right_ascension % 360 / 360 * num_ra).astype(np.int64), num_ra - 1
+    )
+    rows = np.minimum(
+        ((np.sin(np.radians(declination)) + 1) / 2 * num_dec).astype(
+            np.int64
+        ),
+        num_dec - 1,
+    )
+    return rows * num_ra + columns  # type: ignore
+
+
+def thin_stars(
+    right_ascension: npt.ArrayLike,
+    declination: npt.ArrayLike,
+    magnitude: npt.ArrayLike,
+    stars_per_cell: int = THINNING_STARS_PER_CELL,
+    num_ra: int = THINNING_NUM_RA,
+    num_dec: int = THINNING_NUM_DEC,
+) -> npt.NDArray[np.int64]:
+    """
+    Returns the sorted indices of the stars_per_cell brightest stars of
+    every sky cell, see sky_cells
+    """
+    if stars_per_cell < 1:
+        raise ValueError("stars_per_cell must be at least 1")
+    cells = sky_cells(right_ascension, declination, num_ra, num_dec)
+    # by cell, then brightest first
+    order = np.lexsort((np.asarray(magnitude), cells))
+    cells = cells[order]
+    first = np.flatnonzero(np.r_[True, cells[1:] != cells[:-1]])
+    rank = np.arange(len(cells)) - np.repeat(
+        first, np.diff(np.r_[first, len(cells)])
+    )
+    return np.sort(order[rank < stars_per_cell])  # type: ignore
+
+
+def compile_thinned_catalog(
+    output_path: Union[pathlib.Path, str],
+    stars_per_cell: int = THINNING_STARS_PER_CELL,
+    path: Optional[Union[pathlib.Path, str]] = None,
+    num_ra: int = THINNING_NUM_RA,
+    num_dec: int = THINNING_NUM_DEC,
+) -> int:
+    """
+    Writes the thinned catalog of the catalog at path (the packaged one
+    by default) to output_path and returns its number of stars
+
+    The catalog is written to a temporary file and renamed into place,
+    so concurrent readers see either a whole catalog or none.
+    """
+    if path is None:
+        path = get_database_path()
+    output_path = pathlib.Path(output_path)
+    source = sqlite3.connect(path)
+    try:
+        schema = [
+            sql
+            for (sql,) in source.execute(
+                """SELECT sql FROM sqlite_master
+                WHERE tbl_name IN ('star_catalog', 'proper_motion')
+                AND sql IS NOT NULL ORDER BY type DESC;"""
+            )
+        ]
+        stars = source.execute("SELECT * FROM star_catalog;").fetchall()
+        has_proper_motion = any("proper_motion" in sql for sql in schema)
+        proper_motions = (
+            source.execute("SELECT * FROM proper_motion;").fetchall()
+            if has_proper_motion
+            else []
+        )
+    finally:
+        source.close()
+
+    _, right_ascension, declination, magnitude = (
+        np.array(stars, dtype=np.float64).reshape(-1, 4).T
+    )
+    kept = [
+        stars[i]
+        for i in thin_stars(
+            right_ascension,
+            declination,
+            magnitude,
+            stars_per_cell,
+            num_ra,
+            num_dec,
+        ).tolist()
+    ]
+    kept_ids = {star[0] for star in kept}
+
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    descriptor, temporary_path = tempfile.mkstemp(
+        dir=output_path.parent, suffix=".tmp"
+    )
+    os.close(descriptor)
+    try:
+        connection = sqlite3.connect(temporary_path)
+        try:
+            with connection:
+                for sql in schema:
+                    connection.execute(sql)
+                connection.executemany(
+                    "INSERT INTO star_catalog VALUES (?, ?, ?, ?);", kept
+                )
+                if has_proper_motion:
+                    connection.executemany(
+                        "INSERT INTO proper_motion VALUES (?, ?, ?);",
+                        (row for row in proper_motions if row[0] in kept_ids),
+                    )
+        finally:
+            connection.close()
+        os.replace(temporary_path, output_path)
+    except BaseException:
+        pathlib.Path(temporary_path).unlink(missing_ok=True)
+        raise
+    return len(kept)
+
+
+def thinned_catalog_path(
+    stars_per_cell: int = THINNING_STARS_PER_CELL,
+    path: Optional[Union[pathlib.Path, str]] = None,
+    num_ra: int = THINNING_NUM_RA,
+    num_dec: int = THINNING_NUM_DEC,
+    directory: Optional[Union[pathlib.Path, str]] = None,
+) -> pathlib.Path:
+    """
+    Returns the path of the thinned catalog of the catalog at path (the
+    packaged one by default), compiled on first use into directory
+
+    By default the thinned catalog is stored next to its source, or in
+    get_cache_directory() when that directory is read-only or the source
+    was extracted from a zipped install for this process only.
+    """
+    path = pathlib.Path(get_database_path() if path is None else path)
+    name = (
+        f"{path.stem}_thinned_{stars_per_cell}_{num_ra}x{num_dec}"
+        f"_{catalog_version(path)[:16]}{path.suffix}"
+    )
+    if directory is not None:
+        directories = [pathlib.Path(directory)]
+    elif is_extracted(str(path)):
+        directories = [pathlib.Path(get_cache_directory())]
+    else:
+        directories = [path.parent, pathlib.Path(get_cache_directory())]
+    for candidate in directories:
+        if (candidate / name).exists():
+            return candidate / name
+    for candidate in directories[:-1]:
+        try:
+            compile_thinned_catalog(
+                candidate / name, stars_per_cell, path, num_ra, num_dec
+            )
+            return candidate / name
+        except OSError:
+            # read-only, e.g. site-packages
+            continue
+    compile_thinned_catalog(
+        directories[-1] / name, stars_per_cell, path, num_ra, num_dec
+    )
+    return directories[-1] / name
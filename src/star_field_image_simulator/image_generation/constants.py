@@ -1,10 +1,74 @@
-import importlib.resources
+import atexit
+import contextlib
+import functools
+import os
 
 
-with importlib.resources.path(
-    "star_field_image_simulator.data", "star_catalog.db"
-) as database_path:
-    DATABASE_PATH = str(database_path)
+"files extracted from zipped installs, removed at interpreter exit"
+_extracted_resources = contextlib.ExitStack()
+atexit.register(_extracted_resources.close)
+"paths of the extracted files"
+_extracted_paths: set[str] = set()
+
+
+@functools.lru_cache(maxsize=None)
+def get_data_path(name: str) -> str:
+    """
+    Returns a filesystem path to the packaged data file name
+
+    The path is resolved on first use only. When the package is installed
+    as a zip archive the file is extracted once and kept until exit, so
+    the returned path stays valid for sqlite3 and numpy.
+    """
+    # importlib.resources pulls in pathlib, zipfile and tempfile
+    import importlib.resources
+
+    resource = importlib.resources.files("star_field_image_simulator.data")
+    path = str(
+        _extracted_resources.enter_context(
+            importlib.resources.as_file(resource / name)
+        )
+    )
+    if path != str(resource / name):
+        _extracted_paths.add(path)
+    return path
+
+
+def is_extracted(path: str) -> bool:
+    """
+    Returns whether path is a packaged data file extracted from a zipped
+    install, which only lasts as long as the process
+    """
+    return path in _extracted_paths
+
+
+def get_database_path() -> str:
+    """Returns a filesystem path to the packaged star catalog"""
+    return get_data_path("star_catalog.db")
+
+
+def get_cache_directory() -> str:
+    """
+    Returns the directory derived data such as star density maps is
+    cached in: $STAR_FIELD_CACHE_DIR, or star_field_image_simulator under
+    $XDG_CACHE_HOME (~/.cache by default)
+    """
+    directory = os.environ.get(CACHE_DIRECTORY_VARIABLE)
+    if directory:
+        return directory
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(
+        os.path.expanduser("~"), ".cache"
+    )
+    return os.path.join(base, "star_field_image_simulator")
+
+
+def __getattr__(name: str) -> str:
+    # DATABASE_PATH is kept for backwards compatibility but resolved
+    # lazily so that importing this module stays cheap
+    if name == "DATABASE_PATH":
+        return get_database_path()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 TABLE_NAME = "star_catalog"
 ALPHA_MIN = 0
@@ -18,3 +82,17 @@ V_COORDINATE_ORIGIN = 0
 NUMBER_OF_STARS_MIN = 3
 STAR_INTENSITY_LEVEL = 2.512
 SUB_IMAGE_SIZE = 9
+FFT_KERNEL_RADIUS = 6
+FFT_DEPOSIT_SIGMA_MAX = 1.5
+FFT_DENSITY_THRESHOLD = 8
+FFT_SIGMA_MIN = 1.5
+SELECTION_CACHE_MAX_BYTES = 1 << 30
+SELECTION_CACHE_ATTITUDE_QUANTUM = 1e-6
+CACHE_DIRECTORY_VARIABLE = "STAR_FIELD_CACHE_DIR"
+DENSITY_MAP_NUM_RA = 720
+DENSITY_MAP_NUM_DEC = 360
+THINNING_STARS_PER_CELL = 2
+THINNING_NUM_RA = 180
+THINNING_NUM_DEC = 90
+CATALOG_EPOCH = 1991.25
+MILLIARCSECONDS_PER_DEGREE = 3.6e6
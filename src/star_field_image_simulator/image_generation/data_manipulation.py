@@ -2,8 +2,8 @@ import math
 import numpy as np
 import numpy.typing as npt
 import pathlib
-import random
 import sqlite3
+import threading
 
 from .constants import (
     ALPHA_MAX,
@@ -13,13 +13,62 @@ from .constants import (
     HALF_REVOLUTION,
     NUMBER_OF_STARS_MIN,
     REL,
+    STAR_INTENSITY_LEVEL,
+    get_database_path,
 )
+from .instrumentation import PipelineStats, time_stage
 from numpy.random import default_rng
 from typing import Optional, Union
 
 
 rng = default_rng()
 
+"""
+structured array layout of the stars of a frame, see stars_to_array;
+true_u and true_v hold the position before position noise and false
+stars get the negative indices -1, -2, ...
+"""
+STAR_DTYPE = np.dtype(
+    [
+        ("index", np.int64),
+        ("u", np.float64),
+        ("v", np.float64),
+        ("true_u", np.float64),
+        ("true_v", np.float64),
+        ("magnitude", np.float64),
+        ("is_false", np.bool_),
+    ]
+)
+"structured array layout of the centroids, see create_centroids_list"
+CENTROID_DTYPE = np.dtype(
+    [
+        ("id", np.int64),
+        ("u", np.float64),
+        ("v", np.float64),
+        ("true_u", np.float64),
+        ("true_v", np.float64),
+        ("magnitude", np.float64),
+        ("flux", np.float64),
+        ("is_false", np.bool_),
+    ]
+)
+
+"stars of a frame, as Star objects or a STAR_DTYPE structured array"
+Stars = Union[list["Star"], npt.NDArray[np.void]]
+
+"per-thread cache of open catalog connections, keyed by path"
+_catalog_connections = threading.local()
+
+
+class _ThreadConnections(dict[str, sqlite3.Connection]):
+    """Catalog connections of a thread, closed when the thread ends"""
+
+    def __del__(self) -> None:
+        # the thread-local storage of a thread is dropped in the thread
+        # itself as it ends, the only one allowed to close them
+        for connection in self.values():
+            connection.close()
+
 
 class Star:
     """
@@ -296,6 +345,53 @@ SQL wrapper functions
 """
 
 
+def get_catalog_connection(
+    path: Union[pathlib.Path, str]
+) -> sqlite3.Connection:
+    """
+    Returns a connection to the catalog at path, opened once per thread
+    and closed when the thread ends
+
+    Long-lived processes such as the render service reuse the same
+    connection, and with it SQLite's page cache, for every frame.
+    """
+    connections = getattr(_catalog_connections, "connections", None)
+    if connections is None:
+        connections = _catalog_connections.connections = _ThreadConnections()
+    key = str(path)
+    if key not in connections:
+        connections[key] = sqlite3.connect(path)
+    return connections[key]  # type: ignore
+
+
+def close_catalog_connections() -> None:
+    """Closes the catalog connections of the calling thread"""
+    connections = getattr(_catalog_connections, "connections", None)
+    if connections is not None:
+        del _catalog_connections.connections
+
+
+def resolve_catalog_path(
+    path: Optional[Union[pathlib.Path, str]] = None,
+    stars_per_cell: Optional[int] = None,
+) -> str:
+    """
+    Returns the path of the catalog stars are read from: the catalog at
+    path (the packaged one by default), or its thinned catalog keeping
+    stars_per_cell stars per sky cell when it is given, see
+    catalog_thinning
+    """
+    if path is None:
+        path = get_database_path()
+    if stars_per_cell is None:
+        return str(path)
+    # catalog_thinning pulls in tempfile and the selection cache, import
+    # it on first use to keep the package cheap to import
+    from .catalog_thinning import thinned_catalog_path
+
+    return str(thinned_catalog_path(stars_per_cell, path))
+
+
 def fetch_star_delta_is_northpole(
     curs: sqlite3.Cursor, radius: float, magnitude: float
 ) -> npt.ArrayLike:
@@ -392,8 +488,14 @@ def fetch_stars(
     fovY: float,
     magnitude: float,
     path: Union[pathlib.Path, str],
+    stars_per_cell: Optional[int] = None,
 ) -> npt.ArrayLike:
-    conn = sqlite3.connect(path)
+    """
+    Returns the catalog rows in the box around the FOV, from the thinned
+    catalog of path keeping stars_per_cell stars per sky cell when it is
+    given, see resolve_catalog_path
+    """
+    conn = get_catalog_connection(resolve_catalog_path(path, stars_per_cell))
     curs = conn.cursor()
 
     radius = np.sqrt(fovX ** 2 + fovY ** 2) / 2
@@ -425,6 +527,43 @@ def fetch_stars(
     )
 
 
+def cone_condition(
+    alpha0: float, delta0: float, radius: float, suffix: str
+) -> tuple[str, dict[str, float]]:
+    """
+    Returns the SQL condition selecting the catalog box fetch_stars queries
+    around (alpha0, delta0), with its parameters named with suffix
+    """
+    dec_fov_min = max(delta0 - radius, DELTA_MIN)
+    dec_fov_max = min(delta0 + radius, DELTA_MAX)
+    params = {
+        f"dec_fov_min{suffix}": dec_fov_min,
+        f"dec_fov_max{suffix}": dec_fov_max,
+    }
+    declination = (
+        f"declination BETWEEN :dec_fov_min{suffix} AND :dec_fov_max{suffix}"
+    )
+    # poles included, where the cosine is ~1e-17
+    if radius / math.cos(math.radians(delta0)) >= HALF_REVOLUTION:
+        return declination, params
+
+    ra_fov_min = alpha0 - radius / math.cos(math.radians(delta0))
+    ra_fov_max = alpha0 + radius / math.cos(math.radians(delta0))
+    params[f"ra_fov_min{suffix}"] = ra_fov_min % ALPHA_MAX
+    params[f"ra_fov_max{suffix}"] = ra_fov_max % ALPHA_MAX
+    if ra_fov_max >= ALPHA_MAX or ra_fov_min <= 0:
+        right_ascension = (
+            f"right_ascension NOT BETWEEN :ra_fov_max{suffix}"
+            f" AND :ra_fov_min{suffix}"
+        )
+    else:
+        right_ascension = (
+            f"right_ascension BETWEEN :ra_fov_min{suffix}"
+            f" AND :ra_fov_max{suffix}"
+        )
+    return f"{right_ascension} AND {declination}", params
+
+
 def is_within_canvass(
     star: Star,
     u_coordinate_origin: int,
@@ -450,44 +589,146 @@ def create_stars_list(
     resY: int,
     c2i: Celestial2Image,
     path: Union[pathlib.Path, str],
+    stats: Optional[PipelineStats] = None,
 ) -> list[Star]:
-    stars_as_list = fetch_stars(alpha0, delta0, fovX, fovY, magnitude, path)
-    stars = [  # type: ignore
-        Star(idx, ra, dec, mag)  # type: ignore
-        for idx, ra, dec, mag in stars_as_list  # type: ignore
-    ]  # type: ignore
-    for star in stars:
-        star.compute_pixel_coordinate(
-            c2i.camera_matrix,
+    with time_stage(stats, "fetch"):
+        stars_as_list = fetch_stars(
+            alpha0, delta0, fovX, fovY, magnitude, path
         )
-    ret = [  # type: ignore
-        star  # type: ignore
-        for star in stars  # type: ignore
-        if is_within_canvass(  # type: ignore
-            star,  # type: ignore
-            u_coordinate_origin,  # type: ignore
-            resX,  # type: ignore
-            v_coordinate_origin,  # type: ignore
-            resY,  # type: ignore
-        )  # type: ignore
-    ]  # type: ignore
+    with time_stage(stats, "construction"):
+        stars = [  # type: ignore
+            Star(idx, ra, dec, mag)  # type: ignore
+            for idx, ra, dec, mag in stars_as_list  # type: ignore
+        ]  # type: ignore
+    with time_stage(stats, "projection"):
+        camera_matrix = c2i.camera_matrix
+        for star in stars:
+            star.compute_pixel_coordinate(
+                camera_matrix,
+            )
+    with time_stage(stats, "canvas_selection"):
+        ret = [  # type: ignore
+            star  # type: ignore
+            for star in stars  # type: ignore
+            if is_within_canvass(  # type: ignore
+                star,  # type: ignore
+                u_coordinate_origin,  # type: ignore
+                resX,  # type: ignore
+                v_coordinate_origin,  # type: ignore
+                resY,  # type: ignore
+            )  # type: ignore
+        ]  # type: ignore
+    if stats is not None:
+        stats.stars_fetched += len(stars)
+        stats.stars_in_canvas += len(ret)
     return ret
 
 
-def remove_random_stars(
-    stars: list[Star], num_missing_stars: int
-) -> list[Star]:
-    num_stars = len(stars)
+def stars_to_array(stars: list[Star]) -> npt.NDArray[np.void]:
+    """Returns the stars as a STAR_DTYPE structured array"""
+    array = np.zeros(len(stars), dtype=STAR_DTYPE)
+    array["index"] = [star.index for star in stars]
+    array["u"] = [star.u for star in stars]
+    array["v"] = [star.v for star in stars]
+    array["magnitude"] = [star.magnitude for star in stars]
+    array["true_u"] = array["u"]
+    array["true_v"] = array["v"]
+    return array
+
+
+def select_remaining_stars(
+    num_stars: int,
+    num_missing_stars: int,
+    generator: Optional[np.random.Generator] = None,
+) -> npt.NDArray[np.bool_]:
+    """
+    Returns a mask of the stars kept once num_missing_stars random stars
+    are removed, never removing stars below NUMBER_OF_STARS_MIN
+    """
+    keep = np.ones(num_stars, dtype=np.bool_)
     if num_stars < NUMBER_OF_STARS_MIN:
-        return stars
+        return keep
     if num_missing_stars < 0:
         raise ValueError("num_missing_stars can't be less than 0")
-    if num_missing_stars == 0:
-        return stars
-    num_remaining_stars = max(
+    num_removed = num_stars - max(
         num_stars - num_missing_stars, NUMBER_OF_STARS_MIN
     )
-    return random.sample(stars, num_remaining_stars)
+    if num_removed > 0:
+        generator = rng if generator is None else generator
+        keep[generator.choice(num_stars, num_removed, replace=False)] = False
+    return keep
+
+
+def create_false_stars_array(
+    num_false_stars: int,
+    resX: int,
+    resY: int,
+    min_false_star_magnitude: float,
+    generator: Optional[np.random.Generator] = None,
+) -> npt.NDArray[np.void]:
+    """
+    Returns num_false_stars stars spread uniformly over the canvas with
+    magnitudes uniform between 0 and min_false_star_magnitude, as a
+    STAR_DTYPE structured array indexed -1, -2, ...
+    """
+    generator = rng if generator is None else generator
+    false_stars = np.zeros(num_false_stars, dtype=STAR_DTYPE)
+    false_stars["index"] = -np.arange(1, num_false_stars + 1)
+    false_stars["magnitude"] = min_false_star_magnitude * generator.random(
+        num_false_stars
+    )
+    false_stars["u"] = resX * generator.random(num_false_stars)
+    false_stars["v"] = resY * generator.random(num_false_stars)
+    false_stars["true_u"] = false_stars["u"]
+    false_stars["true_v"] = false_stars["v"]
+    false_stars["is_false"] = True
+    return false_stars
+
+
+def perturb_stars(
+    stars: npt.NDArray[np.void],
+    num_missing_stars: int,
+    num_false_stars: int,
+    resX: int,
+    resY: int,
+    min_false_star_magnitude: float,
+    position_noise: float,
+    generator: Optional[np.random.Generator] = None,
+) -> npt.NDArray[np.void]:
+    """
+    Removes num_missing_stars random stars, appends num_false_stars false
+    stars and shifts every star by normal position noise of standard
+    deviation position_noise, clipped to the canvas
+
+    stars is a STAR_DTYPE structured array; a new one is returned, whose
+    true_u and true_v keep the positions before the noise.
+    """
+    generator = rng if generator is None else generator
+    keep = select_remaining_stars(len(stars), num_missing_stars, generator)
+    stars = np.concatenate(
+        [
+            stars[keep],
+            create_false_stars_array(
+                num_false_stars,
+                resX,
+                resY,
+                min_false_star_magnitude,
+                generator,
+            ),
+        ]
+    )
+    if position_noise:
+        noise = generator.normal(0, position_noise, (2, len(stars)))
+        stars["u"] = np.clip(stars["u"] + noise[0], 0, resX)
+        stars["v"] = np.clip(stars["v"] + noise[1], 0, resY)
+    return stars
+
+
+def remove_random_stars(
+    stars: list[Star], num_missing_stars: int
+) -> list[Star]:
+    keep = select_remaining_stars(len(stars), num_missing_stars)
+    return [star for star, kept in zip(stars, keep) if kept]
 
 
 def create_false_stars(
@@ -496,23 +737,48 @@ def create_false_stars(
     resY: int,
     min_false_star_magnitude: float,
 ) -> list[Star]:
+    false_stars_array = create_false_stars_array(
+        num_false_stars, resX, resY, min_false_star_magnitude
+    )
     false_stars = []
-    for _ in range(num_false_stars):
-        star = Star(0, 0, 0, min_false_star_magnitude * rng.random())
-        star.u = resX * rng.random()
-        star.v = resY * rng.random()
+    for index, star_u, star_v, magnitude in zip(
+        false_stars_array["index"].tolist(),
+        false_stars_array["u"].tolist(),
+        false_stars_array["v"].tolist(),
+        false_stars_array["magnitude"].tolist(),
+    ):
+        star = Star(index, 0, 0, magnitude)
+        star.u = star_u
+        star.v = star_v
         false_stars.append(star)
     return false_stars
 
 
-def create_centroids_list(stars: list[Star]):
-    centroids = []
-
-    for star in stars:
-        Ui = star.u
-        Vi = star.v
-        IDi = star.index
+def star_flux(
+    magnitudes: npt.ArrayLike, star_intensity: float
+) -> npt.NDArray[np.float64]:
+    """Returns the peak PSF intensity of stars of the given magnitudes"""
+    return star_intensity / STAR_INTENSITY_LEVEL ** np.asarray(
+        magnitudes, dtype=np.float64
+    )
 
-        centroids.append((IDi, Ui, Vi))
 
+def create_centroids_list(
+    stars: Stars, star_intensity: Optional[float] = None
+) -> npt.NDArray[np.void]:
+    """
+    Returns the ground truth of the stars as a CENTROID_DTYPE structured
+    array, with the flux of star_intensity (NaN when it is not given)
+    """
+    if not isinstance(stars, np.ndarray):
+        stars = stars_to_array(stars)
+    centroids = np.empty(len(stars), dtype=CENTROID_DTYPE)
+    centroids["id"] = stars["index"]
+    for name in ("u", "v", "true_u", "true_v", "magnitude", "is_false"):
+        centroids[name] = stars[name]
+    centroids["flux"] = (
+        np.nan
+        if star_intensity is None
+        else star_flux(stars["magnitude"], star_intensity)
+    )
     return centroids
@@ -0,0 +1,271 @@
+"""
+Catalog epoch propagation
+
+star_catalog.db holds the positions of the stars at the catalog epoch
+(CATALOG_EPOCH). Their proper motions are kept in a separate table
+
+    proper_motion(star_id, pm_ra_cosdec, pm_dec)   in mas / year
+
+so that the star_catalog rows, and every query on them, are unchanged.
+Stars without a proper_motion row, or catalogs without the table, do not
+move. build_catalog writes both tables from a catalog matrix.
+
+propagate_catalog moves every star along its great circle to the
+requested epoch in one vectorized step and keeps the resulting unit
+vectors, sorted by magnitude, in memory, so that all frames rendered at
+that epoch only select and project stars from the table.
+"""
+import functools
+import math
+import numpy as np
+import numpy.typing as npt
+import pathlib
+import sqlite3
+
+from .constants import (
+    CATALOG_EPOCH,
+    MILLIARCSECONDS_PER_DEGREE,
+    get_data_path,
+    get_database_path,
+)
+from .data_manipulation import (
+    STAR_DTYPE,
+    Celestial2Image,
+    get_catalog_connection,
+)
+from .instrumentation import PipelineStats, time_stage
+from .selection_cache import catalog_version
+from typing import Optional, Union
+
+
+def build_catalog(
+    database_path: Union[pathlib.Path, str],
+    source: Optional[Union[pathlib.Path, str]] = None,
+) -> None:
+    """
+    Writes the star_catalog and proper_motion tables of database_path
+    from the "catalog" matrix of the MATLAB file source, the packaged
+    Hipparcos matrix by default
+
+    The rows of the matrix are (star_id, right_ascension, declination,
+    magnitude) in degrees, optionally followed by (pm_ra_cosdec, pm_dec)
+    in mas / year. Without the proper motion columns every proper motion
+    is 0, as with the packaged matrix, which only has the first four.
+    """
+    from scipy.io import loadmat
+
+    if source is None:
+        source = get_data_path("hipparcos_2_star_catalog_matlab_matrix.mat")
+    catalog = np.asarray(loadmat(source)["catalog"], dtype=np.float64)
+    if catalog.ndim != 2 or catalog.shape[1] not in (4, 6):
+        raise ValueError(
+            "the catalog matrix must have 4 or 6 columns, "
+            f"not {catalog.shape}"
+        )
+    proper_motions = (
+        catalog[:, 4:6]
+        if catalog.shape[1] == 6
+        else np.zeros((len(catalog), 2))
+    )
+    star_ids = catalog[:, 0].astype(np.int64).tolist()
+
+    connection = sqlite3.connect(database_path)
+    try:
+        with connection:
+            connection.execute(
+                """CREATE TABLE IF NOT EXISTS star_catalog (
+                star_id INTEGER NOT NULL PRIMARY KEY,
+                right_ascension REAL NOT NULL,
+                declination REAL NOT NULL,
+                magnitude REAL NOT NULL
+                );"""
+            )
+            connection.execute(
+                """CREATE TABLE IF NOT EXISTS proper_motion (
+                star_id INTEGER NOT NULL PRIMARY KEY,
+                pm_ra_cosdec REAL NOT NULL,
+                pm_dec REAL NOT NULL
+                );"""
+            )
+            connection.executemany(
+                "INSERT OR REPLACE INTO star_catalog VALUES (?, ?, ?, ?);",
+                zip(star_ids, *catalog[:, 1:4].T.tolist()),
+            )
+            connection.executemany(
+                "INSERT OR REPLACE INTO proper_motion VALUES (?, ?, ?);",
+                zip(star_ids, *proper_motions.T.tolist()),
+            )
+    finally:
+        connection.close()
+
+
+def propagate_directions(
+    right_ascension: npt.NDArray[np.float64],
+    declination: npt.NDArray[np.float64],
+    pm_ra_cosdec: npt.NDArray[np.float64],
+    pm_dec: npt.NDArray[np.float64],
+    years: float,
+) -> npt.NDArray[np.float64]:
+    """
+    Returns the (N, 3) unit vectors of stars at right_ascension and
+    declination (degrees) moved along their great circle by their proper
+    motion (mas / year) for years
+    """
+    ra, dec = np.radians(right_ascension), np.radians(declination)
+    position = np.stack(
+        [np.cos(dec) * np.cos(ra), np.cos(dec) * np.sin(ra), np.sin(dec)],
+        axis=-1,
+    )
+    east = np.stack([-np.sin(ra), np.cos(ra), np.zeros_like(ra)], axis=-1)
+    north = np.stack(
+        [-np.sin(dec) * np.cos(ra), -np.sin(dec) * np.sin(ra), np.cos(dec)],
+        axis=-1,
+    )
+    # tangent velocity in radians / year
+    motion = np.radians(
+        (
+            np.asarray(pm_ra_cosdec)[:, np.newaxis] * east
+            + np.asarray(pm_dec)[:, np.newaxis] * north
+        )
+        / MILLIARCSECONDS_PER_DEGREE
+    )
+    rate = np.linalg.norm(motion, axis=-1, keepdims=True)
+    angle = rate * years
+    with np.errstate(divide="ignore", invalid="ignore"):
+        direction = np.where(rate > 0, motion / rate, 0.0)
+    return position * np.cos(angle) + direction * np.sin(angle)  # type: ignore
+
+
+class EpochCatalog:
+    """
+    EpochCatalog class used to select stars at a given epoch
+
+    Attributes
+    ----------
+    epoch : float
+        Epoch of the positions
+        Represented in Julian years
+    index : numpy.ndarray[shape=(N,), dtype[numpy.int64]]
+        Star indices, sorted by magnitude
+    magnitude : numpy.ndarray[shape=(N,), dtype[numpy.float64]]
+        Star magnitudes, in increasing order
+    directions : numpy.ndarray[shape=(N, 3), dtype[numpy.float64]]
+        Unit vectors of the stars at epoch
+
+    Methods
+    -------
+    select(c2i, magnitude, u_coordinate_origin, resX, v_coordinate_origin,
+           resY)
+        Returns the stars in the canvas of c2i as a STAR_DTYPE array
+    """
+
+    def __init__(
+        self,
+        epoch: float,
+        index: npt.NDArray[np.int64],
+        magnitude: npt.NDArray[np.float64],
+        directions: npt.NDArray[np.float64],
+    ) -> None:
+        order = np.argsort(magnitude, kind="stable")
+        self.epoch = epoch
+        self.index = index[order]
+        self.magnitude = magnitude[order]
+        self.directions = np.ascontiguousarray(directions[order])
+
+    def select(
+        self,
+        c2i: Celestial2Image,
+        magnitude: float,
+        u_coordinate_origin: int,
+        resX: int,
+        v_coordinate_origin: int,
+        resY: int,
+        stats: Optional[PipelineStats] = None,
+    ) -> npt.NDArray[np.void]:
+        with time_stage(stats, "fetch"):
+            # the stars up to magnitude are a prefix of the table
+            count = int(np.searchsorted(self.magnitude, magnitude, "right"))
+            rotation = np.asarray(c2i.rotation_matrix)
+            radius = math.sqrt(c2i.fovX ** 2 + c2i.fovY ** 2) / 2
+            # the third row of the rotation is minus the boresight
+            in_cone = np.flatnonzero(
+                self.directions[:count] @ -rotation[2]
+                >= math.cos(math.radians(radius))
+            )
+        with time_stage(stats, "projection"):
+            camera_matrix = np.asarray(c2i.camera_matrix)
+            u, v, w = camera_matrix @ self.directions[in_cone].T
+            u, v = u / w, v / w
+        with time_stage(stats, "canvas_selection"):
+            in_canvas = np.flatnonzero(
+                (u_coordinate_origin <= u)
+                & (u <= resX)
+                & (v_coordinate_origin <= v)
+                & (v <= resY)
+            )
+            # in catalog order, like create_stars_list
+            in_canvas = in_canvas[
+                np.argsort(self.index[in_cone[in_canvas]], kind="stable")
+            ]
+            stars = np.zeros(len(in_canvas), dtype=STAR_DTYPE)
+            selected = in_cone[in_canvas]
+            stars["index"] = self.index[selected]
+            stars["u"] = stars["true_u"] = u[in_canvas]
+            stars["v"] = stars["true_v"] = v[in_canvas]
+            stars["magnitude"] = self.magnitude[selected]
+        if stats is not None:
+            stats.stars_fetched += len(in_cone)
+            stats.stars_in_canvas += len(stars)
+        return stars
+
+
+def read_catalog(
+    path: Union[pathlib.Path, str]
+) -> tuple[npt.NDArray[np.float64], npt.NDArray[np.float64]]:
+    """
+    Returns the (star_id, right_ascension, declination, magnitude) rows of
+    the catalog at path and their (pm_ra_cosdec, pm_dec), 0 for the stars
+    without a proper_motion row
+    """
+    connection = get_catalog_connection(path)
+    has_proper_motion = connection.execute(
+        """SELECT COUNT(*) FROM sqlite_master
+        WHERE type = 'table' AND name = 'proper_motion';"""
+    ).fetchone()[0]
+    if has_proper_motion:
+        query = """SELECT star_catalog.*,
+            COALESCE(pm_ra_cosdec, 0), COALESCE(pm_dec, 0)
+            FROM star_catalog LEFT JOIN proper_motion USING (star_id);"""
+    else:
+        query = "SELECT *, 0, 0 FROM star_catalog;"
+    rows = np.array(
+        connection.execute(query).fetchall(), dtype=np.float64
+    ).reshape(-1, 6)
+    return rows[:, :4], rows[:, 4:]
+
+
+@functools.lru_cache(maxsize=4)
+def _propagate_catalog(path: str, version: str, epoch: float) -> EpochCatalog:
+    stars, proper_motions = read_catalog(path)
+    directions = propagate_directions(
+        stars[:, 1],
+        stars[:, 2],
+        proper_motions[:, 0],
+        proper_motions[:, 1],
+        epoch - CATALOG_EPOCH,
+    )
+    return EpochCatalog(
+        epoch, stars[:, 0].astype(np.int64), stars[:, 3], directions
+    )
+
+
+def propagate_catalog(
+    epoch: float, path: Optional[Union[pathlib.Path, str]] = None
+) -> EpochCatalog:
+    """
+    Returns the catalog at path propagated to epoch (Julian years),
+    computed once per process, epoch and catalog version
+    """
+    if path is None:
+        path = get_database_path()
+    return _propagate_catalog(str(path), catalog_version(path), float(epoch))
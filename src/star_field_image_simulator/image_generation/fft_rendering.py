@@ -0,0 +1,180 @@
+import functools
+import math
+import numpy as np
+import numpy.typing as npt
+
+from .constants import FFT_DEPOSIT_SIGMA_MAX, FFT_KERNEL_RADIUS
+from typing import Optional
+
+
+def split_sigma(star_sigma: float) -> tuple[float, float]:
+    """
+    Splits the PSF width into the (deposit, kernel) Gaussian widths
+
+    Convolving two Gaussians adds their variances, so a star deposited as
+    a Gaussian of width deposit_sigma and convolved with a kernel of width
+    kernel_sigma has the width star_sigma. Splitting the variance evenly
+    keeps both well sampled; the deposit width is capped so that its
+    footprint stays small for wide PSFs.
+    """
+    deposit_sigma = min(star_sigma / math.sqrt(2), FFT_DEPOSIT_SIGMA_MAX)
+    kernel_sigma = math.sqrt(star_sigma ** 2 - deposit_sigma ** 2)
+    return deposit_sigma, kernel_sigma
+
+
+def kernel_radius(sigma: float) -> int:
+    """Returns the radius in pixels a Gaussian of width sigma spans"""
+    return math.ceil(FFT_KERNEL_RADIUS * sigma) + 1
+
+
+def psf_kernel_1d(
+    star_sigma: float, integrated: bool
+) -> npt.NDArray[np.float64]:
+    """
+    Returns one axis of the separable PSF kernel at offsets -R..R
+
+    The kernel has the width left once the deposit width is taken out of
+    star_sigma. The integrated kernel holds the probability mass over the
+    pixel centered on each offset, the other one the density sampled at
+    it; both are scaled so that the 2D kernel has the amplitude of the
+    PSFs of draw_star_field_image.
+    """
+    _, kernel_sigma = split_sigma(star_sigma)
+    radius = kernel_radius(kernel_sigma)
+    offsets = np.arange(-radius, radius + 1)
+    # square root of the 2 * pi * star_sigma ** 2 PSF normalization
+    amplitude = np.sqrt(2 * np.pi) * star_sigma
+    if integrated:
+        from scipy.special import erf
+
+        return (  # type: ignore
+            amplitude
+            / 2
+            * (
+                erf((offsets + 0.5) / (np.sqrt(2) * kernel_sigma))
+                - erf((offsets - 0.5) / (np.sqrt(2) * kernel_sigma))
+            )
+        )
+    return (  # type: ignore
+        amplitude
+        * np.exp(-(offsets ** 2) / (2 * kernel_sigma ** 2))
+        / (np.sqrt(2 * np.pi) * kernel_sigma)
+    )
+
+
+@functools.lru_cache(maxsize=16)
+def psf_kernel_spectrum(
+    star_sigma: float, integrated: bool, shape: tuple[int, int]
+) -> npt.NDArray[np.complex128]:
+    """
+    Returns the real FFT of the 2D PSF kernel zero-padded to shape
+
+    The kernel is centered on index (0, 0) with negative offsets wrapped
+    around. Spectra are cached per (star_sigma, integrated, shape) so a
+    sequence of frames with the same PSF and resolution only pays for the
+    transforms of the star grid.
+    """
+    import scipy.fft
+
+    kernel_1d = psf_kernel_1d(star_sigma, integrated)
+    radius = len(kernel_1d) // 2
+    kernel = np.zeros(shape)
+    kernel[: 2 * radius + 1, : 2 * radius + 1] = np.outer(
+        kernel_1d, kernel_1d
+    )
+    kernel = np.roll(kernel, (-radius, -radius), axis=(0, 1))
+    spectrum = scipy.fft.rfft2(kernel)
+    spectrum.setflags(write=False)
+    return spectrum  # type: ignore
+
+
+def deposit_stars(
+    u: npt.NDArray[np.float64],
+    v: npt.NDArray[np.float64],
+    flux: npt.NDArray[np.float64],
+    shape: tuple[int, int],
+    deposit_sigma: float,
+) -> npt.NDArray[np.float64]:
+    """
+    Spreads each star's flux over the grid points around (u, v) with
+    normalized Gaussian weights of width deposit_sigma
+
+    The weights keep the sub-pixel position of the stars. Every star
+    must lie at least kernel_radius(deposit_sigma) points inside the grid.
+    """
+    radius = kernel_radius(deposit_sigma)
+    offsets = np.arange(-radius, radius + 1)
+    columns = np.rint(u).astype(np.int64)[:, np.newaxis] + offsets
+    rows = np.rint(v).astype(np.int64)[:, np.newaxis] + offsets
+
+    normalization = np.sqrt(2 * np.pi) * deposit_sigma
+    u_weights = np.exp(
+        -((columns - u[:, np.newaxis]) ** 2) / (2 * deposit_sigma ** 2)
+    )
+    v_weights = (flux / normalization ** 2)[:, np.newaxis] * np.exp(
+        -((rows - v[:, np.newaxis]) ** 2) / (2 * deposit_sigma ** 2)
+    )
+
+    indices = rows[:, :, np.newaxis] * shape[1] + columns[:, np.newaxis, :]
+    weights = v_weights[:, :, np.newaxis] * u_weights[:, np.newaxis, :]
+    grid = np.bincount(
+        indices.ravel(), weights.ravel(), minlength=shape[0] * shape[1]
+    )
+    return grid.reshape(shape)  # type: ignore
+
+
+def render_fft(
+    u: npt.NDArray[np.float64],
+    v: npt.NDArray[np.float64],
+    flux: npt.NDArray[np.float64],
+    resX: int,
+    resY: int,
+    star_sigma: float,
+    integrated: bool = True,
+    workers: Optional[int] = None,
+) -> npt.NDArray[np.float64]:
+    """
+    Renders stars by depositing their flux on the pixel grid and
+    convolving it once with the PSF kernel
+
+    The cost is that of one real FFT pair over the (padded) canvas plus a
+    small fixed footprint per star, no matter how large the PSF is. Each
+    star is deposited as a narrow sampled Gaussian, which keeps its
+    sub-pixel position, and the kernel is narrowed by the same amount
+    (see split_sigma). The PSF is evaluated up to FFT_KERNEL_RADIUS sigmas
+    from every star.
+    """
+    import scipy.fft
+
+    deposit_sigma, kernel_sigma = split_sigma(star_sigma)
+    deposit_radius = kernel_radius(deposit_sigma)
+    # linear convolution: leave room for the deposits and the kernel on
+    # both sides of the canvas
+    padding = kernel_radius(kernel_sigma) + deposit_radius + 1
+    shape = (
+        scipy.fft.next_fast_len(resY + 2 * padding + 1, real=True),
+        scipy.fft.next_fast_len(resX + 2 * padding + 1, real=True),
+    )
+
+    # the integrated PSF of pixel j covers [j, j + 1), so it is centered
+    # half a pixel after the index
+    shift = 0.5 if integrated else 0.0
+    grid_u = u - shift + padding
+    grid_v = v - shift + padding
+    # stars too far outside the canvas to contribute to it
+    inside = (
+        (grid_u >= deposit_radius)
+        & (grid_u < shape[1] - deposit_radius - 1)
+        & (grid_v >= deposit_radius)
+        & (grid_v < shape[0] - deposit_radius - 1)
+    )
+    grid = deposit_stars(
+        grid_u[inside], grid_v[inside], flux[inside], shape, deposit_sigma
+    )
+
+    spectrum = scipy.fft.rfft2(grid, workers=workers)
+    spectrum *= psf_kernel_spectrum(star_sigma, integrated, shape)
+    image = scipy.fft.irfft2(spectrum, shape, workers=workers)
+    return image[  # type: ignore
+        padding : padding + resY, padding : padding + resX
+    ]
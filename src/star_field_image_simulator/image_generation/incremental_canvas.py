@@ -0,0 +1,225 @@
+"""
+Incremental re-rendering of a star field
+
+Monte-Carlo trials over position noise or missing stars only change a
+few stars of a frame, yet draw_star_field_image renders every star from
+a blank canvas. IncrementalCanvas keeps the rendered image together with
+the contribution of every star over its lazy sub-image, so removing a
+star subtracts its window, adding one adds a new window and moving one
+does both: a trial that changes k stars costs k windows.
+
+Subtracting windows leaves rounding errors of the order of 1e-16 times
+the pixel values, which refresh() clears by summing the stored windows
+again.
+"""
+import numpy as np
+import numpy.typing as npt
+
+from .canvas_computation import (
+    adaptive_half_sizes,
+    add_star_contribution,
+    star_windows,
+)
+from .data_manipulation import STAR_DTYPE, create_centroids_list, star_flux
+from typing import Optional
+
+
+class IncrementalCanvas:
+    """
+    IncrementalCanvas class used to update a rendered star field star by
+    star
+
+    Stars are STAR_DTYPE records, rendered like draw_star_field_image in
+    lazy mode. Every star added gets a handle, an integer that stays valid
+    until the star is removed.
+
+    Attributes
+    ----------
+    resX : int
+        Horizontal pixel count (resolution)
+    resY : int
+        Vertical pixel count (resolution)
+    star_intensity : float
+        Intensity of a magnitude 0 star, see star_flux
+    star_sigma : float
+        Standard deviation of the PSF
+    integrated : bool
+        Whether the PSF is integrated over the pixels
+    residual_threshold : Optional[float]
+        Selects flux-adaptive sub-image sizes, see adaptive_half_sizes
+    image : numpy.ndarray[shape=(resY, resX), dtype[numpy.float64]]
+        Rendered image, updated in place
+
+    Methods
+    -------
+    add_stars(stars)
+        Renders stars and returns their handles
+    remove_stars(handles)
+        Removes stars and returns their records
+    move_stars(handles, u, v)
+        Moves stars to new positions
+    handles()
+        Returns the handles of the rendered stars
+    stars()
+        Returns the records of the rendered stars
+    centroids()
+        Returns the centroids of the rendered stars
+    refresh()
+        Rebuilds the image from the stored windows
+    """
+
+    def __init__(
+        self,
+        resX: int,
+        resY: int,
+        star_intensity: float,
+        star_sigma: float,
+        integrated: bool = True,
+        residual_threshold: Optional[float] = None,
+    ) -> None:
+        self.resX = resX
+        self.resY = resY
+        self.star_intensity = star_intensity
+        self.star_sigma = star_sigma
+        self.integrated = integrated
+        self.residual_threshold = residual_threshold
+        self.image = np.zeros([resY, resX])
+        self._records: dict[int, np.void] = {}
+        # (u_start, u_stop, v_start, v_stop) and the values of each window
+        self._windows: dict[
+            int, tuple[tuple[int, int, int, int], npt.NDArray[np.float64]]
+        ] = {}
+        self._next_handle = 0
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def _render(
+        self, stars: npt.NDArray[np.void]
+    ) -> list[tuple[tuple[int, int, int, int], npt.NDArray[np.float64]]]:
+        """Returns the window of every star, without adding it"""
+        flux = star_flux(stars["magnitude"], self.star_intensity)
+        half_sizes = None
+        if self.residual_threshold is not None:
+            half_sizes = adaptive_half_sizes(
+                flux, self.star_sigma, self.residual_threshold
+            )
+        bounds = np.stack(
+            star_windows(
+                stars["u"],
+                stars["v"],
+                self.resX,
+                self.resY,
+                half_sizes=half_sizes,
+            ),
+            axis=-1,
+        ).tolist()
+        windows = []
+        for star, flux_i, (u_start, u_stop, v_start, v_stop) in zip(
+            stars, flux, bounds
+        ):
+            u_stop, v_stop = max(u_start, u_stop), max(v_start, v_stop)
+            window = np.zeros([v_stop - v_start, u_stop - u_start])
+            add_star_contribution(
+                window,
+                u_start,
+                v_start,
+                u_start,
+                u_stop,
+                v_start,
+                v_stop,
+                star["u"],
+                star["v"],
+                flux_i,
+                self.star_sigma,
+                self.integrated,
+            )
+            windows.append(((u_start, u_stop, v_start, v_stop), window))
+        return windows
+
+    def _scope(
+        self, bounds: tuple[int, int, int, int]
+    ) -> tuple[slice, slice]:
+        u_start, u_stop, v_start, v_stop = bounds
+        return slice(v_start, v_stop), slice(u_start, u_stop)
+
+    def add_stars(self, stars: npt.NDArray[np.void]) -> npt.NDArray[np.int64]:
+        """Renders the STAR_DTYPE stars and returns their handles"""
+        stars = np.asarray(stars, dtype=STAR_DTYPE).reshape(-1)
+        handles = np.arange(self._next_handle, self._next_handle + len(stars))
+        self._next_handle += len(stars)
+        for handle, star, (bounds, window) in zip(
+            handles.tolist(), stars, self._render(stars)
+        ):
+            self.image[self._scope(bounds)] += window
+            self._records[handle] = star.copy()
+            self._windows[handle] = (bounds, window)
+        return handles
+
+    def remove_stars(self, handles: npt.ArrayLike) -> npt.NDArray[np.void]:
+        """
+        Subtracts the windows of the stars of handles and returns their
+        records, which add_stars accepts back
+        """
+        handles = np.asarray(handles, dtype=np.int64).reshape(-1).tolist()
+        unknown = [h for h in handles if h not in self._records]
+        if unknown:
+            raise KeyError(f"unknown star handles {unknown}")
+        removed = np.zeros(len(handles), dtype=STAR_DTYPE)
+        for i, handle in enumerate(handles):
+            bounds, window = self._windows.pop(handle)
+            self.image[self._scope(bounds)] -= window
+            removed[i] = self._records.pop(handle)
+        return removed
+
+    def move_stars(
+        self, handles: npt.ArrayLike, u: npt.ArrayLike, v: npt.ArrayLike
+    ) -> None:
+        """
+        Moves the stars of handles to (u, v), keeping their true_u and
+        true_v
+        """
+        handles = np.asarray(handles, dtype=np.int64).reshape(-1).tolist()
+        unknown = [h for h in handles if h not in self._records]
+        if unknown:
+            raise KeyError(f"unknown star handles {unknown}")
+        moved = np.array(
+            [self._records[handle] for handle in handles], dtype=STAR_DTYPE
+        )
+        moved["u"] = u
+        moved["v"] = v
+        for handle, star, (bounds, window) in zip(
+            handles, moved, self._render(moved)
+        ):
+            old_bounds, old_window = self._windows[handle]
+            self.image[self._scope(old_bounds)] -= old_window
+            self.image[self._scope(bounds)] += window
+            self._records[handle] = star.copy()
+            self._windows[handle] = (bounds, window)
+
+    def handles(self) -> npt.NDArray[np.int64]:
+        """Returns the handles of the rendered stars, in increasing order"""
+        return np.array(sorted(self._records), dtype=np.int64)
+
+    def stars(self) -> npt.NDArray[np.void]:
+        """Returns the STAR_DTYPE records of the stars, ordered by handle"""
+        return np.array(
+            [self._records[handle] for handle in sorted(self._records)],
+            dtype=STAR_DTYPE,
+        ).reshape(-1)
+
+    def centroids(self) -> npt.NDArray[np.void]:
+        """Returns the centroids of the stars, see create_centroids_list"""
+        return create_centroids_list(self.stars(), self.star_intensity)
+
+    def refresh(self) -> None:
+        """Rebuilds the image by adding the windows of the stars again"""
+        self.image[...] = 0
+        for handle in sorted(self._windows):
+            bounds, window = self._windows[handle]
+            self.image[self._scope(bounds)] += window
+
+    def __repr__(self) -> str:
+        return f"IncrementalCanvas({self.resX}, {self.resY},\
+        {self.star_intensity}, {self.star_sigma}, {self.integrated},\
+        {self.residual_threshold},)"
@@ -0,0 +1,107 @@
+import contextlib
+import json
+import pathlib
+import time
+
+from typing import Any, Iterator, Optional, Union
+
+
+class PipelineStats:
+    """
+    PipelineStats class used to collect per-frame timings and counters
+
+    Instances are filled in by generate_star_field_image and its callees
+    when instrumentation is requested. Stages that run outside of it
+    (e.g. noise addition) can be timed with time_stage as well.
+
+    Attributes
+    ----------
+    parameters : dict[str, Any]
+        Frame parameters the statistics belong to
+    stage_times : dict[str, float]
+        Wall time spent in each stage
+        Represented in seconds
+    stars_fetched : int
+        Stars returned by the catalog query
+    stars_in_canvas : int
+        Fetched stars kept by is_within_canvass
+    selection_cache_hits : int
+        Star selections read from a StarSelectionCache
+    stars_removed : int
+        Stars dropped by remove_random_stars
+    false_stars_added : int
+        Stars added by create_false_stars
+    stars_rendered : int
+        Stars drawn on the canvas
+    pixels_touched : int
+        Pixel evaluations performed by the renderer
+
+    Methods
+    -------
+    time_stage(name)
+        Context manager adding the wall time of its body to stage name
+    as_dict()
+        Returns the statistics as a JSON serializable dictionary
+    append_json_line(path)
+        Appends the statistics as a single JSON line to path
+    """
+
+    def __init__(self) -> None:
+        self.parameters: dict[str, Any] = {}
+        self.stage_times: dict[str, float] = {}
+        self.stars_fetched = 0
+        self.stars_in_canvas = 0
+        self.selection_cache_hits = 0
+        self.stars_removed = 0
+        self.false_stars_added = 0
+        self.stars_rendered = 0
+        self.pixels_touched = 0
+
+    @contextlib.contextmanager
+    def time_stage(self, name: str) -> Iterator[None]:
+        """Adds the wall time of the managed block to stage name"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stage_times[name] = (
+                self.stage_times.get(name, 0.0) + time.perf_counter() - start
+            )
+
+    @property
+    def total_time(self) -> float:
+        """Returns the wall time summed over every stage"""
+        return sum(self.stage_times.values())
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "parameters": self.parameters,
+            "stage_times": self.stage_times,
+            "total_time": self.total_time,
+            "stars_fetched": self.stars_fetched,
+            "stars_in_canvas": self.stars_in_canvas,
+            "selection_cache_hits": self.selection_cache_hits,
+            "stars_removed": self.stars_removed,
+            "false_stars_added": self.false_stars_added,
+            "stars_rendered": self.stars_rendered,
+            "pixels_touched": self.pixels_touched,
+        }
+
+    def append_json_line(self, path: Union[pathlib.Path, str]) -> None:
+        with open(path, "a") as stats_file:
+            stats_file.write(json.dumps(self.as_dict()) + "\n")
+
+    def __repr__(self) -> str:
+        return f"PipelineStats({self.as_dict()})"
+
+
+_DISABLED = contextlib.nullcontext()
+
+
+def time_stage(
+    stats: Optional[PipelineStats], name: str
+) -> contextlib.AbstractContextManager[None]:
+    """Times stage name on stats, or does nothing when stats is None"""
+    if stats is None:
+        return _DISABLED
+    return stats.time_stage(name)
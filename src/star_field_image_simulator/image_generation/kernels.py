@@ -0,0 +1,278 @@
+"""
+Rendering kernel backends of draw_star_field_image
+
+The "numpy" backend evaluates the PSF of one star at a time over its
+sub-image (add_star_contribution), which is bound by the interpreter once
+a frame holds thousands of stars. The "numba" backend renders all stars
+in compiled code: the separable row and column factors of every star are
+evaluated in parallel over the stars, then the canvas is accumulated in
+parallel over bands of rows, each band only adding the stars whose window
+overlaps it, so no two threads write the same pixel.
+
+numba is optional. It is imported and the kernels are compiled on first
+use, and "numba" is the default backend whenever it is installed. The
+compiled kernels are only cached on disk when NUMBA_CACHE_DIR points numba
+at a writable cache directory, otherwise every process compiles them.
+
+The kernels run on the threading layer numba picks, which
+NUMBA_THREADING_LAYER overrides. The TBB layer hangs the interpreter at
+exit once a process launched a parallel kernel from a thread other than
+the main one, or forked after launching one, so the command-line tools,
+which render on threads, default to the workqueue layer (see
+use_safe_threading_layer) and the process pools of the batch runner and
+the render service start their workers from a fork server (see
+worker_context). The workqueue layer does not support concurrent
+launches: on it one thread at a time launches the parallel kernel, and
+the threads rendering meanwhile run a serial copy of the kernel instead
+of waiting.
+"""
+import functools
+import importlib.util
+import math
+import numpy as np
+import numpy.typing as npt
+import os
+import threading
+
+from typing import TYPE_CHECKING, Callable, Optional
+
+if TYPE_CHECKING:
+    from multiprocessing.context import BaseContext
+
+
+RENDER_BACKENDS = ("numpy", "numba")
+"rows of the canvas accumulated by one parallel iteration"
+BAND_HEIGHT = 16
+
+HAS_NUMBA = importlib.util.find_spec("numba") is not None
+
+"threading layer the command-line tools default to"
+SAFE_THREADING_LAYER = "workqueue"
+
+"held by the thread launching the parallel kernel on the workqueue layer"
+_launch_lock = threading.Lock()
+_compile_lock = threading.Lock()
+
+
+def _reset_launch_lock() -> None:
+    # a fork in the middle of a launch leaves the child's copy held
+    global _launch_lock
+    _launch_lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_launch_lock)
+
+
+def use_safe_threading_layer() -> None:
+    """
+    Makes numba default to SAFE_THREADING_LAYER in this process unless
+    NUMBA_THREADING_LAYER is set
+
+    numba reads the variable when it is imported, so the entry points of
+    the command-line tools call this first thing.
+    """
+    os.environ.setdefault("NUMBA_THREADING_LAYER", SAFE_THREADING_LAYER)
+
+
+def worker_context() -> Optional["BaseContext"]:
+    """
+    Returns the multiprocessing context of the worker process pools, a
+    fork server where the platform has one and the default otherwise
+    """
+    import multiprocessing
+
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("forkserver")
+    return None
+
+
+def default_backend() -> str:
+    return "numba" if HAS_NUMBA else "numpy"
+
+
+def resolve_backend(backend: Optional[str]) -> str:
+    """Returns the backend to render with, checking it is available"""
+    if backend is None:
+        return default_backend()
+    if backend not in RENDER_BACKENDS:
+        raise ValueError(f"backend must be one of {RENDER_BACKENDS}")
+    if backend == "numba" and not HAS_NUMBA:
+        raise ValueError("the numba backend requires numba to be installed")
+    return backend
+
+
+@functools.lru_cache(maxsize=None)
+def _compile(parallel: bool) -> Callable[..., None]:
+    """
+    Imports numba and compiles the render kernel, parallel over the stars
+    and the bands of rows or serial
+    """
+    import numba  # type: ignore
+
+    @numba.njit(
+        cache="NUMBA_CACHE_DIR" in os.environ, nogil=True, parallel=parallel
+    )  # type: ignore
+    def render_stars(  # pragma: no cover - compiled
+        canvas,
+        u_start,
+        u_stop,
+        v_start,
+        v_stop,
+        u,
+        v,
+        flux,
+        star_sigma,
+        integrated,
+        band_height,
+        band_offsets,
+        band_stars,
+    ):
+        num_stars = len(u)
+        width = max(1, np.max(u_stop - u_start)) if num_stars else 1
+        height = max(1, np.max(v_stop - v_start)) if num_stars else 1
+        columns = np.zeros((num_stars, width))
+        rows = np.zeros((num_stars, height))
+        scale = math.sqrt(2.0) * star_sigma
+        # separable PSF factors, the flux goes into the rows
+        for i in numba.prange(num_stars):
+            amplitude = flux[i]
+            if integrated:
+                amplitude *= math.pi * star_sigma ** 2 / 2
+            for k in range(u_stop[i] - u_start[i]):
+                x = u_start[i] + k - u[i]
+                if integrated:
+                    columns[i, k] = math.erf((x + 1) / scale) - math.erf(
+                        x / scale
+                    )
+                else:
+                    columns[i, k] = math.exp(-(x ** 2) / scale ** 2)
+            for k in range(v_stop[i] - v_start[i]):
+                y = v_start[i] + k - v[i]
+                if integrated:
+                    rows[i, k] = amplitude * (
+                        math.erf((y + 1) / scale) - math.erf(y / scale)
+                    )
+                else:
+                    rows[i, k] = amplitude * math.exp(-(y ** 2) / scale ** 2)
+
+        for band in numba.prange(len(band_offsets) - 1):
+            first_row = band * band_height
+            last_row = min(first_row + band_height, canvas.shape[0])
+            # in star order, like the numpy backend
+            for j in range(band_offsets[band], band_offsets[band + 1]):
+                i = band_stars[j]
+                for row in range(
+                    max(v_start[i], first_row), min(v_stop[i], last_row)
+                ):
+                    factor = rows[i, row - v_start[i]]
+                    for k in range(u_stop[i] - u_start[i]):
+                        canvas[row, u_start[i] + k] += factor * columns[i, k]
+
+    # numba compiles on the first call, make it on an empty canvas
+    no_stars = np.zeros(0, dtype=np.int64)
+    render_stars(  # type: ignore
+        np.zeros((0, 0)),
+        *[no_stars] * 4,
+        *[np.zeros(0)] * 3,
+        1.0,
+        True,
+        BAND_HEIGHT,
+        np.zeros(2, dtype=np.int64),
+        no_stars,
+    )
+    return render_stars  # type: ignore
+
+
+def get_kernel(parallel: bool = True) -> Callable[..., None]:
+    """Returns the compiled render kernel, compiling it once per process"""
+    with _compile_lock:
+        return _compile(parallel)
+
+
+def _serializes_launches() -> bool:
+    import numba
+
+    try:
+        return numba.threading_layer() == "workqueue"  # type: ignore
+    except ValueError:
+        # the layer is picked at the first parallel launch
+        return True
+
+
+def bucket_stars_by_band(
+    v_start: npt.NDArray[np.int64],
+    v_stop: npt.NDArray[np.int64],
+    resY: int,
+    band_height: int = BAND_HEIGHT,
+) -> tuple[npt.NDArray[np.int64], npt.NDArray[np.int64]]:
+    """
+    Returns the (offsets, stars) CSR lists of the stars whose window
+    overlaps each band of band_height rows: the stars of band b are
+    stars[offsets[b]:offsets[b + 1]], in increasing order
+    """
+    num_bands = max(1, -(-resY // band_height))
+    visible = np.flatnonzero(v_stop > v_start)
+    first = v_start[visible] // band_height
+    last = (v_stop[visible] - 1) // band_height
+    counts = last - first + 1
+    pair_star = np.repeat(visible, counts)
+    pair_band = np.repeat(first, counts) + (
+        np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    )
+    order = np.argsort(pair_band, kind="stable")
+    offsets = np.zeros(num_bands + 1, dtype=np.int64)
+    np.cumsum(np.bincount(pair_band, minlength=num_bands), out=offsets[1:])
+    return offsets, pair_star[order].astype(np.int64)
+
+
+def render_stars_numba(
+    canvas: npt.NDArray[np.float64],
+    u_start: npt.NDArray[np.int64],
+    u_stop: npt.NDArray[np.int64],
+    v_start: npt.NDArray[np.int64],
+    v_stop: npt.NDArray[np.int64],
+    u: npt.NDArray[np.float64],
+    v: npt.NDArray[np.float64],
+    flux: npt.NDArray[np.float64],
+    star_sigma: float,
+    integrated: bool,
+) -> None:
+    """
+    Adds the PSFs of the stars over their windows of canvas with the
+    compiled kernel; stars with an empty window are skipped
+    """
+    u_start, u_stop, v_start, v_stop = (
+        np.ascontiguousarray(bounds, dtype=np.int64)
+        for bounds in (u_start, u_stop, v_start, v_stop)
+    )
+    # empty windows contribute nothing, give them no columns either
+    u_stop = np.maximum(u_stop, u_start)
+    v_stop = np.maximum(v_stop, v_start)
+    offsets, stars = bucket_stars_by_band(v_start, v_stop, canvas.shape[0])
+    arguments = (
+        canvas,
+        u_start,
+        u_stop,
+        v_start,
+        v_stop,
+        np.ascontiguousarray(u, dtype=np.float64),
+        np.ascontiguousarray(v, dtype=np.float64),
+        np.ascontiguousarray(flux, dtype=np.float64),
+        float(star_sigma),
+        bool(integrated),
+        BAND_HEIGHT,
+        offsets,
+        stars,
+    )
+    kernel = get_kernel()
+    if not _serializes_launches():
+        kernel(*arguments)
+    elif _launch_lock.acquire(blocking=False):
+        try:
+            kernel(*arguments)
+        finally:
+            _launch_lock.release()
+    else:
+        # another thread is launching on the workqueue layer
+        get_kernel(parallel=False)(*arguments)
@@ -0,0 +1,194 @@
+import functools
+import hashlib
+import numpy as np
+import numpy.typing as npt
+import os
+import pathlib
+import tempfile
+
+from .constants import (
+    SELECTION_CACHE_ATTITUDE_QUANTUM,
+    SELECTION_CACHE_MAX_BYTES,
+)
+from typing import Any, Optional, Union
+
+
+@functools.lru_cache(maxsize=None)
+def _catalog_digest(path: str, size: int, mtime_ns: int) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def catalog_version(path: Union[pathlib.Path, str]) -> str:
+    """
+    Returns the SHA-256 of the catalog file, hashed once per process and
+    again only when the file changes
+    """
+    stat = os.stat(path)
+    return _catalog_digest(str(path), stat.st_size, stat.st_mtime_ns)
+
+
+class StarSelectionCache:
+    """
+    StarSelectionCache class used to keep projected star selections on disk
+
+    Each entry holds the in-canvas stars of one attitude, field of view,
+    resolution and magnitude limit as a STAR_DTYPE structured array, i.e.
+    the output of create_stars_list before any perturbation. Entries are
+    content-addressed by the SHA-256 of those parameters, of the catalog
+    version and of the epoch the catalog is propagated to, if any, with
+    the attitude quantized to attitude_quantum degrees so that float noise
+    in swept attitudes still hits.
+
+    Entries are written to a temporary file and renamed into place, so any
+    number of processes can share a directory: readers see either a whole
+    entry or none. Hits refresh the modification time of the entry, and
+    once the directory grows past max_bytes the least recently used
+    entries are removed.
+
+    Attributes
+    ----------
+    directory : pathlib.Path
+        Directory holding the entries
+    max_bytes : int
+        Size the entries are evicted down to
+    attitude_quantum : float
+        Resolution of the attitude in the keys
+        Represented in degrees
+    hits : int
+        Lookups answered by the cache in this process
+    misses : int
+        Lookups that were not
+    evictions : int
+        Entries removed by this process
+
+    Methods
+    -------
+    key(alpha0, delta0, phi0, fovX, fovY, resX, resY, magnitude, path,
+        epoch)
+        Returns the key of a star selection
+    get(key)
+        Returns the stars stored under key, None on a miss
+    put(key, stars)
+        Stores stars under key and evicts old entries if needed
+    hit_rate()
+        Returns the fraction of lookups that hit
+    """
+
+    def __init__(
+        self,
+        directory: Union[pathlib.Path, str],
+        max_bytes: int = SELECTION_CACHE_MAX_BYTES,
+        attitude_quantum: float = SELECTION_CACHE_ATTITUDE_QUANTUM,
+    ) -> None:
+        self.directory = pathlib.Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.attitude_quantum = attitude_quantum
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def key(
+        self,
+        alpha0: float,
+        delta0: float,
+        phi0: float,
+        fovX: float,
+        fovY: float,
+        resX: int,
+        resY: int,
+        magnitude: float,
+        path: Union[pathlib.Path, str],
+        epoch: Optional[float] = None,
+    ) -> str:
+        alpha0, delta0, phi0 = (
+            round(angle / self.attitude_quantum)
+            for angle in (alpha0 % 360, delta0, phi0)
+        )
+        fields: tuple[Any, ...] = (
+            catalog_version(path),
+            alpha0,
+            delta0,
+            phi0,
+            float(fovX),
+            float(fovY),
+            int(resX),
+            int(resY),
+            float(magnitude),
+            self.attitude_quantum,
+        )
+        if epoch is not None:
+            # selections at the catalog positions keep their keys
+            fields += (float(epoch),)
+        return hashlib.sha256(repr(fields).encode()).hexdigest()
+
+    def _entry_path(self, key: str) -> pathlib.Path:
+        return self.directory / f"{key}.npy"
+
+    def get(self, key: str) -> Optional[npt.NDArray[np.void]]:
+        path = self._entry_path(key)
+        try:
+            stars = np.load(path)
+            # mark the entry as recently used
+            os.utime(path)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except (OSError, ValueError):
+            # unreadable entry, it is rewritten by the next put
+            self.misses += 1
+            return None
+        self.hits += 1
+        return stars  # type: ignore
+
+    def put(self, key: str, stars: npt.NDArray[np.void]) -> None:
+        descriptor, temporary_path = tempfile.mkstemp(
+            dir=self.directory, suffix=".tmp"
+        )
+        try:
+            with os.fdopen(descriptor, "wb") as file:
+                np.save(file, stars)
+            os.replace(temporary_path, self._entry_path(key))
+        except BaseException:
+            pathlib.Path(temporary_path).unlink(missing_ok=True)
+            raise
+        self.evict()
+
+    def evict(self) -> None:
+        """Removes the least recently used entries beyond max_bytes"""
+        entries = []
+        total = 0
+        for entry in os.scandir(self.directory):
+            if not entry.name.endswith(".npy"):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+            total += stat.st_size
+        if total <= self.max_bytes:
+            return
+
+        for _, size, path in sorted(entries):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                # evicted by another process
+                pass
+            except OSError:
+                # still open by a reader (Windows), try again next time
+                continue
+            else:
+                self.evictions += 1
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
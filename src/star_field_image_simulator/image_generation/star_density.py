@@ -0,0 +1,265 @@
+import functools
+import hashlib
+import math
+import numpy as np
+import numpy.typing as npt
+import os
+import pathlib
+import tempfile
+
+from .constants import (
+    DENSITY_MAP_NUM_DEC,
+    DENSITY_MAP_NUM_RA,
+    NUMBER_OF_STARS_MIN,
+    get_cache_directory,
+    get_database_path,
+)
+from .catalog_thinning import sky_cells
+from .data_manipulation import Celestial2Image, get_catalog_connection
+from .selection_cache import catalog_version
+from numpy.random import default_rng
+from typing import Optional, Union
+
+
+class StarDensityMap:
+    """
+    StarDensityMap class used to estimate the number of stars in a FOV
+
+    The sky is split into num_dec bands of equal width in sin(declination)
+    and num_ra columns of equal width in right ascension, so that every
+    cell covers the same solid angle, and the catalog stars up to the
+    magnitude limit are counted per cell. A field of view is estimated
+    by summing the cells whose center falls into it, which is exact up
+    to the stars of the cells cut by the FOV border.
+
+    Counting scans the whole catalog. With a cache_directory the counts
+    are saved there under a name holding the catalog version, magnitude
+    and grid, and later maps, in any process, load them instead.
+
+    Attributes
+    ----------
+    magnitude : float
+        Magnitude limit of the counted stars
+    num_ra : int
+        Number of cells along the right ascension
+    num_dec : int
+        Number of cells along the declination
+    counts : numpy.ndarray[shape=(num_dec, num_ra), dtype[numpy.int32]]
+        Number of stars per cell
+    centers : numpy.ndarray[shape=(num_dec, num_ra, 3), dtype[numpy.float64]]
+        Unit vectors of the cell centers
+
+    Methods
+    -------
+    count_stars_in_fov(alpha0, delta0, phi0, fovX, fovY)
+        Returns the estimated number of stars in the field of view
+    """
+
+    def __init__(
+        self,
+        magnitude: float,
+        path: Optional[Union[pathlib.Path, str]] = None,
+        num_ra: int = DENSITY_MAP_NUM_RA,
+        num_dec: int = DENSITY_MAP_NUM_DEC,
+        cache_directory: Optional[Union[pathlib.Path, str]] = None,
+    ) -> None:
+        self.magnitude = magnitude
+        self.num_ra = num_ra
+        self.num_dec = num_dec
+
+        if path is None:
+            path = get_database_path()
+        if cache_directory is None:
+            self.counts = self._count_stars(path)
+        else:
+            self.counts = self._cached_counts(path, cache_directory)
+
+        right_ascension = np.radians((np.arange(num_ra) + 0.5) * 360 / num_ra)
+        sin_declination = (np.arange(num_dec) + 0.5) * 2 / num_dec - 1
+        cos_declination = np.sqrt(1 - sin_declination ** 2)
+        self.centers = np.stack(
+            np.broadcast_arrays(
+                cos_declination[:, np.newaxis]
+                * np.cos(right_ascension)[np.newaxis, :],
+                cos_declination[:, np.newaxis]
+                * np.sin(right_ascension)[np.newaxis, :],
+                sin_declination[:, np.newaxis],
+            ),
+            axis=-1,
+        )
+
+    def _count_stars(
+        self, path: Union[pathlib.Path, str]
+    ) -> npt.NDArray[np.int32]:
+        stars = np.array(
+            get_catalog_connection(path)
+            .execute(
+                """SELECT right_ascension, declination FROM star_catalog
+                WHERE magnitude <= :magnitude;""",
+                {"magnitude": self.magnitude},
+            )
+            .fetchall(),
+            dtype=np.float64,
+        ).reshape(-1, 2)
+        return (  # type: ignore
+            np.bincount(
+                sky_cells(stars[:, 0], stars[:, 1], self.num_ra, self.num_dec),
+                minlength=self.num_dec * self.num_ra,
+            )
+            .reshape(self.num_dec, self.num_ra)
+            .astype(np.int32)
+        )
+
+    def _cached_counts(
+        self,
+        path: Union[pathlib.Path, str],
+        cache_directory: Union[pathlib.Path, str],
+    ) -> npt.NDArray[np.int32]:
+        key = hashlib.sha256(
+            repr(
+                (
+                    catalog_version(path),
+                    float(self.magnitude),
+                    self.num_ra,
+                    self.num_dec,
+                )
+            ).encode()
+        ).hexdigest()
+        cache_path = pathlib.Path(cache_directory) / f"density_{key}.npy"
+        try:
+            return np.load(cache_path)  # type: ignore
+        except (OSError, ValueError):
+            # missing, or cut short by a crash before the rename
+            pass
+        counts = self._count_stars(path)
+        try:
+            cache_path.parent.mkdir(parents=True, exist_ok=True)
+            descriptor, temporary_path = tempfile.mkstemp(
+                dir=cache_path.parent, suffix=".tmp"
+            )
+        except OSError:
+            # a read-only cache only costs the scan
+            return counts
+        try:
+            with os.fdopen(descriptor, "wb") as file:
+                np.save(file, counts)
+            os.replace(temporary_path, cache_path)
+        except OSError:
+            pathlib.Path(temporary_path).unlink(missing_ok=True)
+        return counts
+
+    def _band(self, delta0: float, radius: float) -> slice:
+        """Returns the rows of the cells within radius of delta0"""
+        # pad by the tallest cell, found at the poles
+        padding = math.degrees(math.acos(1 - 2 / self.num_dec))
+        low = max(delta0 - radius - padding, -90)
+        high = min(delta0 + radius + padding, 90)
+        return slice(
+            int((math.sin(math.radians(low)) + 1) / 2 * self.num_dec),
+            math.ceil((math.sin(math.radians(high)) + 1) / 2 * self.num_dec),
+        )
+
+    def count_stars_in_fov(
+        self,
+        alpha0: float,
+        delta0: float,
+        phi0: float,
+        fovX: float,
+        fovY: float,
+    ) -> int:
+        radius = math.sqrt(fovX ** 2 + fovY ** 2) / 2
+        band = self._band(delta0, radius)
+        rotation = np.asarray(
+            Celestial2Image(alpha0, delta0, phi0, fovX, fovY, 1, 1)
+            .rotation_matrix
+        )
+        # sensor frame coordinates, stars in front of the camera have z < 0
+        x, y, z = np.moveaxis(self.centers[band] @ rotation.T, -1, 0)
+        inside = (
+            (z < 0)
+            & (np.abs(x) <= -z * math.tan(math.radians(fovX / 2)))
+            & (np.abs(y) <= -z * math.tan(math.radians(fovY / 2)))
+        )
+        return int(self.counts[band][inside].sum())
+
+
+@functools.lru_cache(maxsize=8)
+def get_density_map(
+    magnitude: float,
+    path: Optional[str] = None,
+    num_ra: int = DENSITY_MAP_NUM_RA,
+    num_dec: int = DENSITY_MAP_NUM_DEC,
+) -> StarDensityMap:
+    """
+    Returns the StarDensityMap of magnitude, kept in memory and cached in
+    get_cache_directory(), so the catalog is only scanned once
+    """
+    return StarDensityMap(
+        magnitude, path, num_ra, num_dec, get_cache_directory()
+    )
+
+
+def count_stars_in_fov(
+    alpha0: float,
+    delta0: float,
+    phi0: float,
+    fovX: float,
+    fovY: float,
+    magnitude: float,
+    path: Optional[Union[pathlib.Path, str]] = None,
+) -> int:
+    """
+    Estimates the number of catalog stars up to magnitude in the field of
+    view without querying the catalog for it
+    """
+    density_map = get_density_map(
+        magnitude, None if path is None else str(path)
+    )
+    return density_map.count_stars_in_fov(alpha0, delta0, phi0, fovX, fovY)
+
+
+def sample_attitudes(
+    num_attitudes: int,
+    fovX: float,
+    fovY: float,
+    magnitude: float,
+    min_stars: int = NUMBER_OF_STARS_MIN,
+    max_stars: Optional[int] = None,
+    roll: tuple[float, float] = (-90, 90),
+    generator: Optional[np.random.Generator] = None,
+    max_tries: int = 10_000,
+    path: Optional[Union[pathlib.Path, str]] = None,
+) -> npt.NDArray[np.float64]:
+    """
+    Returns num_attitudes (alpha0, delta0, phi0) rows drawn uniformly over
+    the sphere among the attitudes whose estimated star count lies within
+    [min_stars, max_stars]
+
+    Raises RuntimeError when max_tries candidates are not enough, e.g.
+    when the constraint cannot be met by the catalog.
+    """
+    generator = default_rng() if generator is None else generator
+    density_map = get_density_map(
+        magnitude, None if path is None else str(path)
+    )
+    attitudes = np.empty((num_attitudes, 3))
+    found = 0
+    for _ in range(max_tries):
+        if found == num_attitudes:
+            break
+        alpha0 = float(generator.uniform(0, 360))
+        delta0 = math.degrees(math.asin(generator.uniform(-1, 1)))
+        phi0 = float(generator.uniform(*roll))
+        count = density_map.count_stars_in_fov(
+            alpha0, delta0, phi0, fovX, fovY
+        )
+        if count >= min_stars and (max_stars is None or count <= max_stars):
+            attitudes[found] = alpha0, delta0, phi0
+            found += 1
+    else:
+        if found < num_attitudes:
+            raise RuntimeError(
+                f"only {found} of {num_attitudes} attitudes with "
+                f"{min_stars} to {max_stars} stars in {max_tries} tries"
+            )
+    return attitudes
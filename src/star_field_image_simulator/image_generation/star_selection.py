@@ -0,0 +1,226 @@
+"""
+Star selection reused across rolls, intrinsics and small boresight moves
+
+The catalog query of a frame only depends on its boresight, FOV radius
+and magnitude limit, yet create_stars_list queries and projects again for
+every roll, resolution or FOV. StarSelection queries a cone
+SELECTION_MARGIN degrees wider than the FOV and keeps the unit vectors of
+its stars, and their coordinates in the sensor frame of the cone center
+at roll 0:
+
+    x0, y0 = sensor axes at roll 0,  w = -boresight . direction
+
+Frames at the cone center only rotate (x0, y0) by the roll and scale
+them by the projection matrix. Frames whose boresight moved rotate the
+cached vectors instead, and the catalog is only queried again once the
+FOV leaves the cone or the magnitude limit grows.
+"""
+import math
+import numpy as np
+import numpy.typing as npt
+import pathlib
+
+from .constants import get_database_path
+from .data_manipulation import (
+    STAR_DTYPE,
+    Celestial2Image,
+    cone_condition,
+    get_catalog_connection,
+)
+from .instrumentation import PipelineStats, time_stage
+from typing import Optional, Union
+
+
+"degrees the cached cone extends beyond the FOV radius"
+SELECTION_MARGIN = 2.0
+
+
+def unit_vectors(
+    right_ascension: npt.NDArray[np.float64],
+    declination: npt.NDArray[np.float64],
+) -> npt.NDArray[np.float64]:
+    """Returns the (N, 3) unit vectors of directions in degrees"""
+    ra, dec = np.radians(right_ascension), np.radians(declination)
+    return np.stack(  # type: ignore
+        [np.cos(dec) * np.cos(ra), np.cos(dec) * np.sin(ra), np.sin(dec)],
+        axis=-1,
+    )
+
+
+class StarSelection:
+    """
+    StarSelection class used to select the stars of frames from a cached
+    catalog cone
+
+    Attributes
+    ----------
+    margin : float
+        Degrees the cone extends beyond the FOV radius
+    path : pathlib.Path
+        Path of the catalog
+    fetches : int
+        Number of catalog queries so far
+    alpha0 : Optional[float]
+        Right ascension of the cone center
+    delta0 : Optional[float]
+        Declination of the cone center
+    radius : float
+        Angular radius of the cone
+    magnitude : float
+        Magnitude limit of the cone
+    index : numpy.ndarray[shape=(N,), dtype[numpy.int64]]
+        Star indices, sorted by magnitude
+    magnitudes : numpy.ndarray[shape=(N,), dtype[numpy.float64]]
+        Star magnitudes, in increasing order
+    directions : numpy.ndarray[shape=(N, 3), dtype[numpy.float64]]
+        Unit vectors of the stars
+    boresight_frame : numpy.ndarray[shape=(3, N), dtype[numpy.float64]]
+        (x0, y0, w) of the stars in the sensor frame of the cone center
+        at roll 0
+
+    Methods
+    -------
+    covers(alpha0, delta0, radius, magnitude)
+        Returns whether the cone holds every star of a FOV
+    fetch(alpha0, delta0, radius, magnitude)
+        Queries the catalog cone
+    select(c2i, magnitude, u_coordinate_origin, resX, v_coordinate_origin,
+           resY)
+        Returns the stars in the canvas of c2i as a STAR_DTYPE array
+    """
+
+    def __init__(
+        self,
+        margin: float = SELECTION_MARGIN,
+        path: Optional[Union[pathlib.Path, str]] = None,
+    ) -> None:
+        if margin < 0:
+            raise ValueError("margin can't be negative")
+        self.margin = margin
+        self.path = pathlib.Path(get_database_path() if path is None else path)
+        self.fetches = 0
+        self.alpha0: Optional[float] = None
+        self.delta0: Optional[float] = None
+        self.radius = 0.0
+        self.magnitude = -math.inf
+        self.index = np.zeros(0, dtype=np.int64)
+        self.magnitudes = np.zeros(0)
+        self.directions = np.zeros((0, 3))
+        self.boresight_frame = np.zeros((3, 0))
+
+    def covers(
+        self, alpha0: float, delta0: float, radius: float, magnitude: float
+    ) -> bool:
+        """
+        Returns whether the cone holds every star up to magnitude within
+        radius of (alpha0, delta0)
+        """
+        if self.alpha0 is None or self.delta0 is None:
+            return False
+        center, boresight = unit_vectors(
+            np.array([self.alpha0, alpha0]), np.array([self.delta0, delta0])
+        )
+        distance = math.degrees(
+            math.acos(max(-1.0, min(1.0, float(center @ boresight))))
+        )
+        return magnitude <= self.magnitude and distance + radius <= (
+            self.radius
+        )
+
+    def fetch(
+        self, alpha0: float, delta0: float, radius: float, magnitude: float
+    ) -> None:
+        """Queries the stars up to magnitude within radius of the center"""
+        condition, params = cone_condition(alpha0, delta0, radius, "")
+        rows = np.array(
+            get_catalog_connection(self.path)
+            .execute(
+                f"""SELECT * FROM star_catalog
+                WHERE magnitude <= :magnitude AND {condition};""",
+                {**params, "magnitude": magnitude},
+            )
+            .fetchall(),
+            dtype=np.float64,
+        ).reshape(-1, 4)
+        # the stars up to a lower magnitude are a prefix
+        rows = rows[np.argsort(rows[:, 3], kind="stable")]
+        self.fetches += 1
+        self.alpha0, self.delta0 = alpha0, delta0
+        self.radius, self.magnitude = radius, magnitude
+        self.index = rows[:, 0].astype(np.int64)
+        self.magnitudes = rows[:, 3]
+        self.directions = unit_vectors(rows[:, 1], rows[:, 2])
+        rotation = np.asarray(
+            Celestial2Image(alpha0, delta0, 0, 1, 1, 1, 1).rotation_matrix
+        )
+        self.boresight_frame = rotation @ self.directions.T
+
+    def select(
+        self,
+        c2i: Celestial2Image,
+        magnitude: float,
+        u_coordinate_origin: int,
+        resX: int,
+        v_coordinate_origin: int,
+        resY: int,
+        stats: Optional[PipelineStats] = None,
+    ) -> npt.NDArray[np.void]:
+        with time_stage(stats, "fetch"):
+            radius = math.sqrt(c2i.fovX ** 2 + c2i.fovY ** 2) / 2
+            if not self.covers(c2i.alpha0, c2i.delta0, radius, magnitude):
+                self.fetch(
+                    c2i.alpha0,
+                    c2i.delta0,
+                    min(radius + self.margin, 90.0),
+                    magnitude,
+                )
+            count = int(np.searchsorted(self.magnitudes, magnitude, "right"))
+
+        with time_stage(stats, "projection"):
+            if (c2i.alpha0, c2i.delta0) == (self.alpha0, self.delta0):
+                # only the roll changed: rotate the sensor axes in 2D
+                x0, y0, w = self.boresight_frame[:, :count]
+                cos_phi = math.cos(math.radians(c2i.phi0))
+                sin_phi = math.sin(math.radians(c2i.phi0))
+                sensor = np.stack(
+                    [
+                        cos_phi * x0 + sin_phi * y0,
+                        cos_phi * y0 - sin_phi * x0,
+                        w,
+                    ]
+                )
+            else:
+                sensor = (
+                    np.asarray(c2i.rotation_matrix)
+                    @ self.directions[:count].T
+                )
+            u, v, w = np.asarray(c2i.projection_matrix) @ sensor
+            with np.errstate(divide="ignore", invalid="ignore"):
+                u, v = u / w, v / w
+
+        with time_stage(stats, "canvas_selection"):
+            # the cone can reach behind wide FOVs, whose mirror images
+            # would project into the canvas
+            in_canvas = np.flatnonzero(
+                (w < 0)
+                & (u_coordinate_origin <= u)
+                & (u <= resX)
+                & (v_coordinate_origin <= v)
+                & (v <= resY)
+            )
+            # in catalog order, like create_stars_list
+            in_canvas = in_canvas[
+                np.argsort(self.index[in_canvas], kind="stable")
+            ]
+            stars = np.zeros(len(in_canvas), dtype=STAR_DTYPE)
+            stars["index"] = self.index[in_canvas]
+            stars["u"] = stars["true_u"] = u[in_canvas]
+            stars["v"] = stars["true_v"] = v[in_canvas]
+            stars["magnitude"] = self.magnitudes[in_canvas]
+        if stats is not None:
+            stats.stars_fetched += count
+            stats.stars_in_canvas += len(stars)
+        return stars
+
+    def __repr__(self) -> str:
+        return f"StarSelection({self.margin}, {self.path})"
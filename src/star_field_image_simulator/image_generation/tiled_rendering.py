@@ -0,0 +1,209 @@
+import collections
+import concurrent.futures
+import numpy as np
+import numpy.typing as npt
+import os
+import pathlib
+
+from .canvas_computation import (
+    adaptive_half_sizes,
+    add_star_contribution,
+    star_windows,
+)
+from .data_manipulation import Stars, create_centroids_list
+from typing import Callable, Iterator, Optional, Union
+
+
+DEFAULT_TILE_SIZE = 1024
+
+"called as writer(v_origin, u_origin, tile) for every tile, in order"
+TileWriter = Callable[[int, int, npt.NDArray[np.float64]], None]
+
+
+def bucket_stars_by_tile(
+    u_start: npt.NDArray[np.int64],
+    u_stop: npt.NDArray[np.int64],
+    v_start: npt.NDArray[np.int64],
+    v_stop: npt.NDArray[np.int64],
+    tile_width: int,
+    tile_height: int,
+    num_tiles_u: int,
+) -> dict[tuple[int, int], npt.NDArray[np.int64]]:
+    """
+    Assigns every star to each tile its window overlaps
+
+    Returns the indices of the stars keyed by the (row, column) of the
+    tile. Stars whose window spans a tile border are listed in every tile
+    it touches; stars with an empty window are dropped.
+    """
+    visible = np.flatnonzero((u_stop > u_start) & (v_stop > v_start))
+    first_u = u_start[visible] // tile_width
+    last_u = (u_stop[visible] - 1) // tile_width
+    first_v = v_start[visible] // tile_height
+    last_v = (v_stop[visible] - 1) // tile_height
+
+    span_u = last_u - first_u + 1
+    counts = span_u * (last_v - first_v + 1)
+    # one (star, tile) pair per overlapped tile
+    pair_star = np.repeat(np.arange(len(visible)), counts)
+    pair_offset = np.arange(counts.sum()) - np.repeat(
+        np.cumsum(counts) - counts, counts
+    )
+    tile_u = first_u[pair_star] + pair_offset % span_u[pair_star]
+    tile_v = first_v[pair_star] + pair_offset // span_u[pair_star]
+    tile_ids = tile_v * num_tiles_u + tile_u
+
+    order = np.argsort(tile_ids, kind="stable")
+    tile_ids = tile_ids[order]
+    stars_per_tile = visible[pair_star[order]]
+    unique_ids, first = np.unique(tile_ids, return_index=True)
+    return {
+        (int(tile_id) // num_tiles_u, int(tile_id) % num_tiles_u): bucket
+        for tile_id, bucket in zip(
+            unique_ids, np.split(stars_per_tile, first[1:])
+        )
+    }
+
+
+def _bounded_ordered_map(
+    executor: concurrent.futures.Executor,
+    function: Callable[[tuple[int, int]], npt.NDArray[np.float64]],
+    tiles: list[tuple[int, int]],
+    max_pending: int,
+) -> Iterator[tuple[tuple[int, int], npt.NDArray[np.float64]]]:
+    """Like executor.map, but keeps at most max_pending tiles in flight"""
+    pending: collections.deque[
+        tuple[
+            tuple[int, int],
+            concurrent.futures.Future[npt.NDArray[np.float64]],
+        ]
+    ] = collections.deque()
+    for tile in tiles:
+        pending.append((tile, executor.submit(function, tile)))
+        if len(pending) >= max_pending:
+            done_tile, future = pending.popleft()
+            yield done_tile, future.result()
+    for done_tile, future in pending:
+        yield done_tile, future.result()
+
+
+def render_tiled_star_field_image(
+    stars: Stars,
+    resX: int,
+    resY: int,
+    star_intensity: float,
+    star_sigma: float,
+    integrated: bool = True,
+    tile_size: int = DEFAULT_TILE_SIZE,
+    output: Optional[
+        Union[pathlib.Path, str, npt.NDArray[np.float64]]
+    ] = None,
+    writer: Optional[TileWriter] = None,
+    max_workers: Optional[int] = None,
+    residual_threshold: Optional[float] = None,
+):
+    """
+    Draws a star field image tile by tile
+
+    Produces the same image as draw_star_field_image in lazy mode, but
+    only ever holds a few tile_size x tile_size tiles in memory, so the
+    peak memory depends on the tile size rather than the resolution.
+    Tiles are rendered concurrently by max_workers threads, and
+    residual_threshold selects flux-adaptive sub-image sizes as in
+    draw_star_field_image.
+
+    Every rendered tile is written to output, which can be the path of a
+    .npy file created as a memory-map, or any (resY, resX) array such as
+    an existing numpy.memmap. When output is None and no writer is given
+    the image is allocated in memory. writer is called with the pixel
+    origin (v, u) and the data of each tile in row-major order, which
+    allows streaming tiles to disk or over the network.
+
+    Returns the output image (None when only a writer is used) and the
+    centroids, see create_centroids_list.
+    """
+    if tile_size <= 0:
+        raise ValueError("tile_size must be greater than 0")
+
+    # freshly created outputs are zero-filled, so empty tiles are skipped
+    zero_filled = True
+    image: Optional[npt.NDArray[np.float64]]
+    if isinstance(output, (str, pathlib.Path)):
+        image = np.lib.format.open_memmap(
+            output, mode="w+", dtype=np.float64, shape=(resY, resX)
+        )
+    elif output is None and writer is None:
+        image = np.zeros([resY, resX])
+    else:
+        image = output
+        zero_filled = False
+
+    centroids = create_centroids_list(stars, star_intensity)
+
+    u, v = centroids["u"], centroids["v"]
+    flux = centroids["flux"]
+    half_sizes = None
+    if residual_threshold is not None:
+        half_sizes = adaptive_half_sizes(flux, star_sigma, residual_threshold)
+    u_start, u_stop, v_start, v_stop = star_windows(
+        u, v, resX, resY, half_sizes=half_sizes
+    )
+
+    num_tiles_u = -(-resX // tile_size)
+    num_tiles_v = -(-resY // tile_size)
+    buckets = bucket_stars_by_tile(
+        u_start, u_stop, v_start, v_stop, tile_size, tile_size, num_tiles_u
+    )
+
+    def render_tile(tile: tuple[int, int]) -> npt.NDArray[np.float64]:
+        v_origin = tile[0] * tile_size
+        u_origin = tile[1] * tile_size
+        v_end = min(v_origin + tile_size, resY)
+        u_end = min(u_origin + tile_size, resX)
+        canvas = np.zeros([v_end - v_origin, u_end - u_origin])
+        for i in buckets.get(tile, ()):
+            add_star_contribution(
+                canvas,
+                u_origin,
+                v_origin,
+                max(u_start[i], u_origin),
+                min(u_stop[i], u_end),
+                max(v_start[i], v_origin),
+                min(v_stop[i], v_end),
+                u[i],
+                v[i],
+                flux[i],
+                star_sigma,
+                integrated,
+            )
+        return canvas
+
+    if zero_filled and writer is None:
+        tiles = sorted(buckets)
+    else:
+        tiles = [
+            (tile_v, tile_u)
+            for tile_v in range(num_tiles_v)
+            for tile_u in range(num_tiles_u)
+        ]
+
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    with concurrent.futures.ThreadPoolExecutor(max_workers) as executor:
+        for tile, canvas in _bounded_ordered_map(
+            executor, render_tile, tiles, 2 * max_workers
+        ):
+            v_origin = tile[0] * tile_size
+            u_origin = tile[1] * tile_size
+            if image is not None:
+                image[
+                    v_origin : v_origin + canvas.shape[0],
+                    u_origin : u_origin + canvas.shape[1],
+                ] = canvas
+            if writer is not None:
+                writer(v_origin, u_origin, canvas)
+
+    if isinstance(image, np.memmap):
+        image.flush()
+
+    return image, centroids
@@ -1,30 +1,143 @@
+import concurrent.futures
+import functools
 import numpy as np
 import numpy.typing as npt
+import os
 
-from numpy.random import default_rng
-from typing import Union
+from numpy.random import SeedSequence, default_rng
+from typing import Callable, Optional, Union
 
+
+"rows of the image filled by one child generator"
+NOISE_BAND_HEIGHT = 64
+"pixels from which the noise functions use every core by default"
+PARALLEL_NOISE_PIXELS = 1 << 20
+
+"called as fill(rows, generator) for every band of rows"
+BandFill = Callable[[slice, np.random.Generator], None]
+
+Seed = Optional[Union[int, SeedSequence]]
+
+# deprecated, pass a seed instead: the noise drawn without a seed is
+# spawned from this generator, so assigning a seeded one still makes it
+# reproducible
 rng = default_rng()
 
 
+@functools.lru_cache(maxsize=None)
+def _executor(threads: int) -> concurrent.futures.ThreadPoolExecutor:
+    return concurrent.futures.ThreadPoolExecutor(
+        threads, thread_name_prefix="noise"
+    )
+
+
+if hasattr(os, "register_at_fork"):
+    # the threads of the pools do not survive a fork
+    os.register_at_fork(after_in_child=_executor.cache_clear)
+
+
+def default_threads(num_pixels: int) -> int:
+    """
+    Returns the threads the noise of num_pixels pixels is drawn on by
+    default: every core from PARALLEL_NOISE_PIXELS on, one below, where
+    the threads cost more than they save
+    """
+    if num_pixels < PARALLEL_NOISE_PIXELS:
+        return 1
+    return os.cpu_count() or 1
+
+
+def fill_bands(
+    num_rows: int,
+    fill: BandFill,
+    seed: Seed = None,
+    threads: Optional[int] = None,
+) -> None:
+    """
+    Calls fill for every band of NOISE_BAND_HEIGHT rows on threads threads
+
+    Band i always gets the generator of the i-th child of seed, spawned
+    with SeedSequence, so the noise only depends on the seed and not on
+    the number of threads. NumPy releases the GIL while it draws and
+    computes, so the bands are filled in parallel on a thread pool kept
+    for the next calls. Without a seed the children are spawned from
+    entropy drawn from rng.
+    """
+    if seed is None:
+        seed = SeedSequence(rng.integers(1 << 63))
+    elif not isinstance(seed, SeedSequence):
+        seed = SeedSequence(seed)
+    bands = [
+        slice(start, min(start + NOISE_BAND_HEIGHT, num_rows))
+        for start in range(0, num_rows, NOISE_BAND_HEIGHT)
+    ]
+    generators = [default_rng(child) for child in seed.spawn(len(bands))]
+    if threads is None:
+        threads = os.cpu_count() or 1
+    threads = min(threads, len(bands))
+
+    if threads <= 1:
+        for band, generator in zip(bands, generators):
+            fill(band, generator)
+        return
+    executor = _executor(threads)
+    futures = [
+        executor.submit(fill, band, generator)
+        for band, generator in zip(bands, generators)
+    ]
+    concurrent.futures.wait(futures)
+    # result() re-raises the exceptions of fill
+    for future in futures:
+        future.result()
+
+
 def add_dark_current_noise(
-    image: npt.NDArray[Union[np.uint8, np.float64]], nDC: float, tauDC: float
+    image: npt.NDArray[Union[np.uint8, np.float64]],
+    nDC: float,
+    tauDC: float,
+    seed: Seed = None,
+    threads: Optional[int] = None,
 ):
     if nDC == 0 or tauDC == 0:
         return image
 
-    shape = image.shape
-    return image + nDC * tauDC + np.sqrt(nDC * tauDC) * rng.normal(0, 1, shape)
+    noisy = np.empty(image.shape)
+    mean = nDC * tauDC
+    scale = np.sqrt(nDC * tauDC)
+
+    def fill(rows: slice, generator: np.random.Generator) -> None:
+        generator.standard_normal(out=noisy[rows])
+        noisy[rows] *= scale
+        noisy[rows] += image[rows]
+        noisy[rows] += mean
+
+    if threads is None:
+        threads = default_threads(image.size)
+    fill_bands(image.shape[0], fill, seed, threads)
+    return noisy
 
 
 def add_shot_noise(
-    image: npt.NDArray[Union[np.uint8, np.float64]], varNoise: float
+    image: npt.NDArray[Union[np.uint8, np.float64]],
+    varNoise: float,
+    seed: Seed = None,
+    threads: Optional[int] = None,
 ):
     if varNoise == 0:
         return image
 
-    shape = image.shape
-    return image + np.sqrt(image) * rng.normal(0, varNoise, shape)
+    noisy = np.empty(image.shape)
+
+    def fill(rows: slice, generator: np.random.Generator) -> None:
+        generator.standard_normal(out=noisy[rows])
+        noisy[rows] *= varNoise
+        noisy[rows] *= np.sqrt(image[rows])
+        noisy[rows] += image[rows]
+
+    if threads is None:
+        threads = default_threads(image.size)
+    fill_bands(image.shape[0], fill, seed, threads)
+    return noisy
 
 
 def add_read_noise(
@@ -0,0 +1,234 @@
+import functools
+import hashlib
+import numpy as np
+import numpy.typing as npt
+import os
+import pathlib
+import tempfile
+
+from numpy.random import default_rng
+from typing import Any, Optional, Union
+
+
+"keyword arguments of SensorModel that describe the sensor"
+SENSOR_PARAMETERS = (
+    "seed",
+    "prnu",
+    "fixed_pattern_noise",
+    "hot_pixel_fraction",
+    "hot_pixel_intensity",
+    "dead_pixel_fraction",
+)
+
+
+@functools.lru_cache(maxsize=8)
+def _generate_maps(
+    seed: int,
+    prnu: float,
+    fixed_pattern_noise: float,
+    hot_pixel_fraction: float,
+    hot_pixel_intensity: float,
+    dead_pixel_fraction: float,
+    resX: int,
+    resY: int,
+) -> npt.NDArray[np.float64]:
+    generator = default_rng([seed, resX, resY])
+    maps = np.empty((2, resY, resX))
+    gain, offset = maps
+    generator.standard_normal(out=gain)
+    gain *= prnu
+    gain += 1
+    generator.standard_normal(out=offset)
+    offset *= fixed_pattern_noise
+
+    num_pixels = resX * resY
+    hot, dead = np.split(
+        generator.choice(
+            num_pixels,
+            round(num_pixels * hot_pixel_fraction)
+            + round(num_pixels * dead_pixel_fraction),
+            replace=False,
+        ),
+        [round(num_pixels * hot_pixel_fraction)],
+    )
+    offset.flat[hot] += hot_pixel_intensity
+    gain.flat[dead] = 0
+    offset.flat[dead] = 0
+    maps.setflags(write=False)
+    return maps
+
+
+@functools.lru_cache(maxsize=8)
+def _load_maps(
+    path: str, size: int, modified: int
+) -> npt.NDArray[np.float64]:
+    # size and modified only key the cache, a rewritten file is reloaded
+    maps = np.load(path)
+    maps.setflags(write=False)
+    return maps  # type: ignore
+
+
+class SensorModel:
+    """
+    SensorModel class used to apply the fixed defects of a sensor
+
+    The defects do not change from frame to frame: a pixel response
+    non-uniformity (PRNU) gain, a fixed-pattern offset, hot pixels that
+    read hot_pixel_intensity more and dead pixels that read 0. They are
+    drawn once per seed and resolution into a gain map and an offset map,
+    kept in memory, and written to cache_directory as .npy files when
+    one is given, so that other processes and runs load them, once,
+    instead. Every frame then only costs a multiply-add with the maps.
+
+    Attributes
+    ----------
+    seed : int
+        Seed the maps are drawn from, i.e. the identity of the sensor
+    prnu : float
+        Standard deviation of the pixel gains around 1
+    fixed_pattern_noise : float
+        Standard deviation of the pixel offsets
+    hot_pixel_fraction : float
+        Fraction of the pixels that are hot
+    hot_pixel_intensity : float
+        Offset of the hot pixels
+    dead_pixel_fraction : float
+        Fraction of the pixels that are dead
+    cache_directory : Optional[pathlib.Path]
+        Directory the maps are stored in
+
+    Methods
+    -------
+    maps(resX, resY)
+        Returns the (gain, offset) maps of a resY x resX sensor
+    apply(image, out)
+        Returns image * gain + offset
+    apply_window(window, v_origin, u_origin, resX, resY, out)
+        Returns window * gain + offset over the pixels of window
+    """
+
+    def __init__(
+        self,
+        seed: int = 0,
+        prnu: float = 0.01,
+        fixed_pattern_noise: float = 0.5,
+        hot_pixel_fraction: float = 1e-4,
+        hot_pixel_intensity: float = 100.0,
+        dead_pixel_fraction: float = 1e-4,
+        cache_directory: Optional[Union[pathlib.Path, str]] = None,
+    ) -> None:
+        if prnu < 0 or fixed_pattern_noise < 0:
+            raise ValueError("prnu and fixed_pattern_noise can't be negative")
+        if not (
+            0 <= hot_pixel_fraction
+            and 0 <= dead_pixel_fraction
+            and hot_pixel_fraction + dead_pixel_fraction <= 1
+        ):
+            raise ValueError(
+                "the hot and dead pixel fractions must be positive and sum "
+                "to at most 1"
+            )
+        self.seed = seed
+        self.prnu = prnu
+        self.fixed_pattern_noise = fixed_pattern_noise
+        self.hot_pixel_fraction = hot_pixel_fraction
+        self.hot_pixel_intensity = hot_pixel_intensity
+        self.dead_pixel_fraction = dead_pixel_fraction
+        self.cache_directory = (
+            None if cache_directory is None else pathlib.Path(cache_directory)
+        )
+
+    def _parameters(self) -> tuple[float, ...]:
+        return tuple(getattr(self, name) for name in SENSOR_PARAMETERS)
+
+    def _cache_path(self, resX: int, resY: int) -> pathlib.Path:
+        assert self.cache_directory is not None
+        key = hashlib.sha256(
+            repr((self._parameters(), resX, resY)).encode()
+        ).hexdigest()
+        return self.cache_directory / f"sensor_{key}.npy"
+
+    def maps(self, resX: int, resY: int) -> npt.NDArray[np.float64]:
+        """
+        Returns the read-only (2, resY, resX) array of the gain and the
+        offset maps
+        """
+        if self.cache_directory is None:
+            return _generate_maps(*self._parameters(), resX, resY)
+
+        path = self._cache_path(resX, resY)
+        try:
+            status = path.stat()
+            return _load_maps(str(path), status.st_size, status.st_mtime_ns)
+        except (OSError, ValueError):
+            pass
+        maps = _generate_maps(*self._parameters(), resX, resY)
+        self.cache_directory.mkdir(parents=True, exist_ok=True)
+        descriptor, temporary_path = tempfile.mkstemp(
+            dir=self.cache_directory, suffix=".tmp"
+        )
+        try:
+            with os.fdopen(descriptor, "wb") as file:
+                np.save(file, maps)
+            os.replace(temporary_path, path)
+        except BaseException:
+            pathlib.Path(temporary_path).unlink(missing_ok=True)
+            raise
+        return maps
+
+    def apply(
+        self,
+        image: npt.NDArray[Union[np.uint8, np.float64]],
+        out: Optional[npt.NDArray[np.float64]] = None,
+    ) -> npt.NDArray[np.float64]:
+        """
+        Returns image * gain + offset, computed in place in out (which may
+        be image itself) when it is given
+        """
+        gain, offset = self.maps(image.shape[1], image.shape[0])
+        out = np.multiply(image, gain, out=out)
+        np.add(out, offset, out=out)
+        return out
+
+    def apply_window(
+        self,
+        window: npt.NDArray[Union[np.uint8, np.float64]],
+        v_origin: int,
+        u_origin: int,
+        resX: int,
+        resY: int,
+        out: Optional[npt.NDArray[np.float64]] = None,
+    ) -> npt.NDArray[np.float64]:
+        """
+        Returns window * gain + offset for a window of a resY x resX
+        sensor whose top-left pixel is (u_origin, v_origin)
+        """
+        scope = (
+            slice(v_origin, v_origin + window.shape[0]),
+            slice(u_origin, u_origin + window.shape[1]),
+        )
+        gain, offset = self.maps(resX, resY)
+        out = np.multiply(window, gain[scope], out=out)
+        np.add(out, offset[scope], out=out)
+        return out
+
+    def __repr__(self) -> str:
+        parameters = ", ".join(
+            f"{name}={getattr(self, name)}" for name in SENSOR_PARAMETERS
+        )
+        return f"SensorModel({parameters})"
+
+
+@functools.lru_cache(maxsize=8)
+def _shared_sensor_model(
+    parameters: tuple[tuple[str, Any], ...]
+) -> SensorModel:
+    return SensorModel(**dict(parameters))
+
+
+def shared_sensor_model(parameters: dict[str, Any]) -> SensorModel:
+    """
+    Returns the SensorModel of the keyword arguments parameters, the same
+    one for equal parameters, so that the frames of a job share its maps
+    """
+    return _shared_sensor_model(tuple(sorted(parameters.items())))
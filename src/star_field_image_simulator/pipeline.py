@@ -0,0 +1,286 @@
+"""
+Memoized frame pipeline for parameter sweeps
+
+render_frame runs every step of a frame for every call. FramePipeline
+splits it into explicit stages
+
+    selection -> perturbation -> render -> noise
+
+and memoizes the output of each stage on its inputs, i.e. on its own
+parameters (STAGE_PARAMETERS) and on those of every stage before it. A
+sweep over 50 shot noise levels then renders the clean image once and
+only adds noise 50 times, and a sweep over star_sigma reuses the
+selected and perturbed stars.
+
+The perturbation and the noise are random. For their memoization to be
+meaningful they are drawn from the streams of the pipeline seed (see
+frames.frame_streams), so every frame of a pipeline uses the same random
+numbers, those of render_frame with the same seed, and a sweep only
+varies the swept parameter.
+"""
+import collections
+import inspect
+import numpy as np
+import numpy.typing as npt
+import pathlib
+
+from .frames import (
+    DRAW_PARAMETERS,
+    NOISE_PARAMETERS,
+    RENDER_PARAMETERS,
+    Centroids,
+    add_frame_noise,
+    frame_streams,
+)
+from .image_generation.canvas_computation import (
+    draw_star_field_image,
+    generate_star_field_image,
+    select_stars,
+)
+from .image_generation.constants import get_database_path
+from .image_generation.data_manipulation import (
+    perturb_stars,
+    resolve_catalog_path,
+)
+from .image_generation.selection_cache import StarSelectionCache
+from .image_generation.star_selection import StarSelection
+from numpy.random import default_rng
+from typing import Any, Callable, Hashable, Optional
+
+
+"parameters each stage depends on, besides those of the stages before"
+STAGE_PARAMETERS = {
+    "selection": (
+        "alpha0",
+        "delta0",
+        "phi0",
+        "resX",
+        "resY",
+        "fovX",
+        "fovY",
+        "magnitude_limit",
+        "epoch",
+        "stars_per_cell",
+    ),
+    "perturbation": (
+        "num_missing_stars",
+        "num_false_stars",
+        "min_false_star_magnitude",
+        "position_noise",
+    ),
+    "render": ("star_intensity", "star_sigma", *DRAW_PARAMETERS),
+    "noise": NOISE_PARAMETERS,
+}
+STAGES = tuple(STAGE_PARAMETERS)
+
+_DEFAULTS: dict[str, Any] = {
+    **{
+        name: parameter.default
+        for name, parameter in inspect.signature(
+            generate_star_field_image
+        ).parameters.items()
+        if parameter.default is not inspect.Parameter.empty
+    },
+    **{name: None for name in NOISE_PARAMETERS},
+}
+
+
+def _hashable(value: Any) -> Hashable:
+    if isinstance(value, dict):
+        return tuple(sorted((name, _hashable(v)) for name, v in value.items()))
+    if isinstance(value, list):
+        return tuple(_hashable(v) for v in value)
+    return value  # type: ignore
+
+
+def _read_only(array: npt.NDArray[Any]) -> npt.NDArray[Any]:
+    array.setflags(write=False)
+    return array
+
+
+class FramePipeline:
+    """
+    FramePipeline class used to render frames with memoized stages
+
+    Attributes
+    ----------
+    seed : int
+        Seed of the perturbation and noise streams
+    cache_size : int
+        Number of outputs memoized per stage, the least recently used
+        are dropped first
+    selection_cache : Optional[StarSelectionCache]
+        Cache the selection stage looks stars up in, see select_stars
+    star_selections : dict[pathlib.Path, StarSelection]
+        Cached catalog cone the selection stage selects stars from per
+        catalog path, so that roll and intrinsics sweeps do not query the
+        catalog, thinned or not
+    computations : collections.Counter[str]
+        Number of times each stage was computed rather than reused
+
+    Methods
+    -------
+    select(params)
+        Returns the in-canvas stars
+    perturb(params)
+        Returns the stars of the frame
+    draw(params)
+        Returns the clean image and its centroids
+    render(params)
+        Returns the noisy image and its centroids
+    clear()
+        Drops every memoized output
+    """
+
+    def __init__(
+        self,
+        seed: int = 0,
+        cache_size: int = 8,
+        selection_cache: Optional[StarSelectionCache] = None,
+    ) -> None:
+        if cache_size < 1:
+            raise ValueError("cache_size must be at least 1")
+        self.seed = seed
+        self.cache_size = cache_size
+        self.selection_cache = selection_cache
+        self.star_selections: dict[pathlib.Path, StarSelection] = {}
+        self.computations: collections.Counter[str] = collections.Counter()
+        self._outputs: dict[str, collections.OrderedDict[Hashable, Any]] = {
+            stage: collections.OrderedDict() for stage in STAGES
+        }
+
+    def _key(self, stage: str, params: dict[str, Any]) -> Hashable:
+        names = [
+            name
+            for earlier in STAGES[: STAGES.index(stage) + 1]
+            for name in STAGE_PARAMETERS[earlier]
+        ]
+        missing = [
+            name
+            for name in names
+            if name not in params and name not in _DEFAULTS
+        ]
+        if missing:
+            raise ValueError(f"missing parameters {missing}")
+        return tuple(
+            _hashable(params.get(name, _DEFAULTS.get(name))) for name in names
+        )
+
+    def _star_selection(self, params: dict[str, Any]) -> StarSelection:
+        path = pathlib.Path(
+            resolve_catalog_path(
+                get_database_path(), params.get("stars_per_cell")
+            )
+        )
+        if path not in self.star_selections:
+            self.star_selections[path] = StarSelection(path=path)
+        return self.star_selections[path]
+
+    def _memoized(
+        self, stage: str, params: dict[str, Any], compute: Callable[[], Any]
+    ) -> Any:
+        key = self._key(stage, params)
+        outputs = self._outputs[stage]
+        if key in outputs:
+            outputs.move_to_end(key)
+            return outputs[key]
+        output = compute()
+        self.computations[stage] += 1
+        outputs[key] = output
+        if len(outputs) > self.cache_size:
+            outputs.popitem(last=False)
+        return output
+
+    def select(self, params: dict[str, Any]) -> npt.NDArray[np.void]:
+        """Returns the read-only STAR_DTYPE array of the in-canvas stars"""
+        unknown = set(params) - set(RENDER_PARAMETERS) - set(NOISE_PARAMETERS)
+        if unknown:
+            raise ValueError(f"unknown parameters {sorted(unknown)}")
+        return self._memoized(  # type: ignore
+            "selection",
+            params,
+            lambda: _read_only(
+                select_stars(
+                    params["alpha0"],
+                    params["delta0"],
+                    params["phi0"],
+                    params["resX"],
+                    params["resY"],
+                    params["fovX"],
+                    params["fovY"],
+                    params["magnitude_limit"],
+                    self.selection_cache,
+                    params.get("epoch"),
+                    star_selection=self._star_selection(params),
+                    stars_per_cell=params.get("stars_per_cell"),
+                )
+            ),
+        )
+
+    def perturb(self, params: dict[str, Any]) -> npt.NDArray[np.void]:
+        """
+        Returns the read-only STAR_DTYPE array of the stars of the frame,
+        see perturb_stars
+        """
+        stars = self.select(params)
+        return self._memoized(  # type: ignore
+            "perturbation",
+            params,
+            lambda: _read_only(
+                perturb_stars(
+                    stars,
+                    params["num_missing_stars"],
+                    params["num_false_stars"],
+                    params["resX"],
+                    params["resY"],
+                    params["min_false_star_magnitude"],
+                    params["position_noise"],
+                    default_rng(frame_streams(self.seed)["perturbation"]),
+                )
+            ),
+        )
+
+    def draw(
+        self, params: dict[str, Any]
+    ) -> tuple[npt.NDArray[np.float64], Centroids]:
+        """Returns the read-only clean image and its centroids"""
+        stars = self.perturb(params)
+
+        def compute() -> tuple[npt.NDArray[np.float64], Centroids]:
+            image, centroids = draw_star_field_image(
+                stars,
+                params["resX"],
+                params["resY"],
+                params["star_intensity"],
+                params["star_sigma"],
+                **{
+                    name: params[name]
+                    for name in DRAW_PARAMETERS
+                    if name in params
+                },
+            )
+            return _read_only(image), _read_only(centroids)
+
+        return self._memoized("render", params, compute)  # type: ignore
+
+    def render(
+        self, params: dict[str, Any]
+    ) -> tuple[npt.NDArray[np.float64], Centroids]:
+        """
+        Returns the read-only image and centroids render_frame returns
+        for params and the pipeline seed
+        """
+        image, centroids = self.draw(params)
+
+        def compute() -> npt.NDArray[np.float64]:
+            noisy = add_frame_noise(image, params, self.seed)
+            return noisy if noisy is image else _read_only(noisy)
+
+        return self._memoized("noise", params, compute), centroids
+
+    def clear(self) -> None:
+        for outputs in self._outputs.values():
+            outputs.clear()
+
+    def __repr__(self) -> str:
+        return f"FramePipeline({self.seed}, {self.cache_size})"
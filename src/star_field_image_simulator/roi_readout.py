@@ -0,0 +1,259 @@
+"""
+Region of interest readout
+
+In tracking mode a star tracker only reads out small windows around the
+stars it predicts. generate_roi_readout selects and perturbs the stars of
+a frame like generate_star_field_image, but only renders and adds noise
+to the pixels of the regions of interest (ROIs), so the cost of a frame
+scales with the ROI area instead of resX * resY.
+
+ROIs are (N, 4) integer arrays of (u_start, u_stop, v_start, v_stop)
+pixel bounds, the layout of star_windows, either given or derived from
+predicted star positions with roi_windows. Every ROI is read out on its
+own: overlapping ROIs share their signal but not their noise.
+"""
+import numpy as np
+import numpy.typing as npt
+
+from .frames import Centroids
+from .image_generation.canvas_computation import (
+    adaptive_half_sizes,
+    add_star_contribution,
+    select_stars,
+    star_windows,
+)
+from .image_generation.data_manipulation import (
+    Stars,
+    create_centroids_list,
+    perturb_stars,
+)
+from .image_generation.selection_cache import StarSelectionCache
+from .noise_addition.noise_addition import (
+    Seed,
+    add_dark_current_noise,
+    add_read_noise,
+    add_shot_noise,
+)
+from .noise_addition.sensor_model import shared_sensor_model
+from numpy.random import SeedSequence
+from typing import Any, Optional
+
+
+"half size of the ROIs derived from predicted positions, in pixels"
+ROI_HALF_SIZE = 8
+
+
+def roi_windows(
+    u: npt.ArrayLike,
+    v: npt.ArrayLike,
+    resX: int,
+    resY: int,
+    half_size: int = ROI_HALF_SIZE,
+) -> npt.NDArray[np.int64]:
+    """
+    Returns the (N, 4) (u_start, u_stop, v_start, v_stop) bounds of the
+    2 * half_size + 1 pixel ROIs centered on the pixels of the predicted
+    positions (u, v), clipped to the canvas; predictions off the canvas
+    are dropped
+    """
+    u_center = np.floor(np.asarray(u, dtype=np.float64)).astype(np.int64)
+    v_center = np.floor(np.asarray(v, dtype=np.float64)).astype(np.int64)
+    rois = np.stack(
+        [
+            np.maximum(u_center - half_size, 0),
+            np.minimum(u_center + half_size + 1, resX),
+            np.maximum(v_center - half_size, 0),
+            np.minimum(v_center + half_size + 1, resY),
+        ],
+        axis=-1,
+    ).reshape(-1, 4)
+    return rois[(rois[:, 0] < rois[:, 1]) & (rois[:, 2] < rois[:, 3])]
+
+
+def render_windows(
+    stars: Stars,
+    rois: npt.ArrayLike,
+    resX: int,
+    resY: int,
+    star_intensity: float,
+    star_sigma: float,
+    integrated: bool = True,
+    residual_threshold: Optional[float] = None,
+) -> tuple[list[npt.NDArray[np.float64]], Centroids]:
+    """
+    Draws the stars on the ROIs of a resY x resX canvas
+
+    Every window holds the pixels draw_star_field_image would draw in lazy
+    mode over its ROI, only the stars whose sub-image overlaps the ROI are
+    evaluated, and only over the overlap.
+
+    Returns the windows, ordered like rois, and the centroids of all the
+    stars, see create_centroids_list.
+    """
+    rois = np.asarray(rois, dtype=np.int64).reshape(-1, 4)
+    centroids = create_centroids_list(stars, star_intensity)
+    u, v = centroids["u"], centroids["v"]
+    flux = centroids["flux"]
+    half_sizes = None
+    if residual_threshold is not None:
+        half_sizes = adaptive_half_sizes(flux, star_sigma, residual_threshold)
+    u_start, u_stop, v_start, v_stop = star_windows(
+        u, v, resX, resY, half_sizes=half_sizes
+    )
+
+    windows = []
+    for roi_u_start, roi_u_stop, roi_v_start, roi_v_stop in rois:
+        window = np.zeros([roi_v_stop - roi_v_start, roi_u_stop - roi_u_start])
+        overlapping = np.flatnonzero(
+            (u_start < roi_u_stop)
+            & (u_stop > roi_u_start)
+            & (v_start < roi_v_stop)
+            & (v_stop > roi_v_start)
+        )
+        for i in overlapping:
+            add_star_contribution(
+                window,
+                roi_u_start,
+                roi_v_start,
+                max(u_start[i], roi_u_start),
+                min(u_stop[i], roi_u_stop),
+                max(v_start[i], roi_v_start),
+                min(v_stop[i], roi_v_stop),
+                u[i],
+                v[i],
+                flux[i],
+                star_sigma,
+                integrated,
+            )
+        windows.append(window)
+    return windows, centroids
+
+
+def add_window_noise(
+    windows: list[npt.NDArray[np.float64]],
+    rois: npt.NDArray[np.int64],
+    resX: int,
+    resY: int,
+    shot_noise: float = 0,
+    sensor: Optional[dict[str, Any]] = None,
+    nDC: float = 0,
+    tauDC: float = 0,
+    nRN: float = 0,
+    seed: Seed = None,
+) -> list[npt.NDArray[np.float64]]:
+    """
+    Returns the windows with the noise of render_frame: shot noise,
+    the defects of the sensor (SensorModel keyword arguments) over the
+    pixels of each ROI, dark current and read noise
+
+    Every window draws its noise from its own child of seed.
+    """
+    if not isinstance(seed, SeedSequence):
+        seed = SeedSequence(seed)
+    sensor_model = shared_sensor_model(sensor) if sensor else None
+    noisy_windows = []
+    for window, roi, child in zip(windows, rois, seed.spawn(len(windows))):
+        shot_seed, dark_current_seed = child.spawn(2)
+        if shot_noise:
+            window = add_shot_noise(window, shot_noise, shot_seed, threads=1)
+        if sensor_model is not None:
+            window = sensor_model.apply_window(
+                window, int(roi[2]), int(roi[0]), resX, resY
+            )
+        if nDC and tauDC:
+            window = add_dark_current_noise(
+                window, nDC, tauDC, dark_current_seed, threads=1
+            )
+        if nRN:
+            window = add_read_noise(window, nRN)
+        noisy_windows.append(window)
+    return noisy_windows
+
+
+def generate_roi_readout(
+    alpha0: float,
+    delta0: float,
+    phi0: float,
+    resX: int,
+    resY: int,
+    fovX: float,
+    fovY: float,
+    magnitude_limit: float,
+    num_missing_stars: int,
+    num_false_stars: int,
+    min_false_star_magnitude: float,
+    star_intensity: float,
+    star_sigma: float,
+    position_noise: float,
+    rois: Optional[npt.ArrayLike] = None,
+    predicted: Optional[npt.ArrayLike] = None,
+    half_size: int = ROI_HALF_SIZE,
+    integrated: bool = True,
+    residual_threshold: Optional[float] = None,
+    shot_noise: float = 0,
+    sensor: Optional[dict[str, Any]] = None,
+    nDC: float = 0,
+    tauDC: float = 0,
+    nRN: float = 0,
+    seed: Seed = None,
+    selection_cache: Optional[StarSelectionCache] = None,
+    epoch: Optional[float] = None,
+    generator: Optional[np.random.Generator] = None,
+) -> tuple[list[npt.NDArray[np.float64]], npt.NDArray[np.int64], Centroids]:
+    """
+    Generates the ROI windows of a star field image and its centroids
+
+    The stars are selected and perturbed as in generate_star_field_image
+    (selection_cache, epoch), the perturbation drawn from generator. The
+    ROIs are rois when given, otherwise the roi_windows of half_size
+    around the predicted (N, 2) (u, v) positions, by default the true
+    positions of the catalog stars of the frame. Only the windows are
+    rendered and get the noise of render_frame, drawn from seed.
+
+    Returns the windows, the (N, 4) ROIs they were read from and the
+    centroids of every star of the frame.
+    """
+    stars = select_stars(
+        alpha0,
+        delta0,
+        phi0,
+        resX,
+        resY,
+        fovX,
+        fovY,
+        magnitude_limit,
+        selection_cache,
+        epoch,
+    )
+    frame_stars = perturb_stars(
+        stars,
+        num_missing_stars,
+        num_false_stars,
+        resX,
+        resY,
+        min_false_star_magnitude,
+        position_noise,
+        generator,
+    )
+    if rois is None:
+        if predicted is None:
+            u, v = stars["true_u"], stars["true_v"]
+        else:
+            u, v = np.asarray(predicted, dtype=np.float64).reshape(-1, 2).T
+        rois = roi_windows(u, v, resX, resY, half_size)
+    rois = np.asarray(rois, dtype=np.int64).reshape(-1, 4)
+
+    windows, centroids = render_windows(
+        frame_stars,
+        rois,
+        resX,
+        resY,
+        star_intensity,
+        star_sigma,
+        integrated,
+        residual_threshold,
+    )
+    windows = add_window_noise(
+        windows, rois, resX, resY, shot_noise, sensor, nDC, tauDC, nRN, seed
+    )
+    return windows, rois, centroids
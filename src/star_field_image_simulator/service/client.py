@@ -0,0 +1,113 @@
+import asyncio
+import itertools
+import numpy as np
+import numpy.typing as npt
+
+from .protocol import encode_message, read_frame, read_message
+from typing import Any, Optional
+
+
+class RenderError(RuntimeError):
+    """Raised when the render service failed to render a frame"""
+
+
+class RenderClient:
+    """
+    RenderClient class used to request frames from a RenderServer
+
+    Requests sent over one connection are pipelined: render may be awaited
+    concurrently and every call gets its own frame back.
+
+    Attributes
+    ----------
+    reader : asyncio.StreamReader
+        Stream the responses are read from
+    writer : asyncio.StreamWriter
+        Stream the requests are written to
+
+    Methods
+    -------
+    connect(host, port, path)
+        Opens a connection to path (Unix socket) or to host:port
+    render(**params)
+        Returns the image and centroids array of one frame
+    close()
+        Closes the connection
+    """
+
+    def __init__(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        self.reader = reader
+        self.writer = writer
+        self._ids = itertools.count()
+        self._pending: dict[int, asyncio.Future[Any]] = {}
+        self._receiver = asyncio.create_task(self._receive())
+
+    @classmethod
+    async def connect(
+        cls,
+        host: str = "127.0.0.1",
+        port: int = 8765,
+        path: Optional[str] = None,
+    ) -> "RenderClient":
+        if path is not None:
+            reader, writer = await asyncio.open_unix_connection(path)
+        else:
+            reader, writer = await asyncio.open_connection(host, port)
+        return cls(reader, writer)
+
+    async def render(
+        self, **params: Any
+    ) -> tuple[npt.NDArray[np.float64], npt.NDArray[np.void]]:
+        """
+        Renders one frame, params are the keyword arguments of
+        generate_star_field_image plus the optional noise parameters
+        nDC, tauDC, nRN and shot_noise
+        """
+        request_id = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        self.writer.write(encode_message({"id": request_id, "params": params}))
+        await self.writer.drain()
+        return await future  # type: ignore
+
+    async def close(self) -> None:
+        self.writer.close()
+        await self.writer.wait_closed()
+        self._receiver.cancel()
+
+    async def _receive(self) -> None:
+        try:
+            while True:
+                header = await read_message(self.reader)
+                if header is None:
+                    break
+                if header["status"] == "ok":
+                    data = await read_frame(self.reader)
+                    image = np.frombuffer(
+                        data, dtype=header["dtype"]  # type: ignore
+                    ).reshape(header["shape"])
+                    records = await read_frame(self.reader)
+                    # JSON turns the (name, type) pairs into lists
+                    centroids_dtype = np.lib.format.descr_to_dtype(
+                        [tuple(field) for field in header["centroids_dtype"]]
+                    )
+                    centroids = np.frombuffer(
+                        records, dtype=centroids_dtype  # type: ignore
+                    )
+                    result: Any = (image, centroids)
+                else:
+                    result = RenderError(header["error"])
+                future = self._pending.pop(header["id"])
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+            error: Exception = ConnectionError("the service closed")
+        except Exception as exception:
+            error = exception
+        for future in self._pending.values():
+            if not future.done():
+                future.set_exception(error)
+        self._pending.clear()
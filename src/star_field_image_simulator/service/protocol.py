@@ -0,0 +1,63 @@
+"""
+Wire format of the render service
+
+Every message is a frame: a 4-byte big-endian length followed by that many
+bytes. Requests are single JSON frames
+
+    {"id": 1, "params": {"alpha0": 20, "delta0": 20, ...}}
+
+and every response starts with a JSON header frame
+
+    {"id": 1, "status": "ok", "shape": [resY, resX], "dtype": "<f8",
+     "centroids_dtype": [["id", "<i8"], ["u", "<f8"], ...]}
+
+followed, when the status is "ok", by one frame holding the raw image
+bytes in C order and one frame holding the raw centroid records, whose
+structured dtype is described by centroids_dtype in numpy's descr
+format. Failed requests get {"id": 1, "status": "error",
+"error": "<message>"} and no image frame, as do malformed requests (not
+JSON, without a params object, or with a sensor cache_directory, which
+only the server sets), with the id of the request when it could be read
+and null otherwise. Responses carry the id of their request
+and may arrive out of order.
+"""
+import asyncio
+import json
+import struct
+
+from typing import Any, Optional
+
+
+FRAME_HEADER = struct.Struct("!I")
+MAX_FRAME_SIZE = 1 << 31
+
+
+def encode_frame(payload: bytes) -> bytes:
+    if len(payload) >= MAX_FRAME_SIZE:
+        raise ValueError(f"frame of {len(payload)} bytes is too large")
+    return FRAME_HEADER.pack(len(payload)) + payload
+
+
+def encode_message(message: dict[str, Any]) -> bytes:
+    return encode_frame(json.dumps(message).encode())
+
+
+async def read_frame(reader: asyncio.StreamReader) -> Optional[bytes]:
+    """Reads one frame, returns None if the stream ended before it"""
+    try:
+        header = await reader.readexactly(FRAME_HEADER.size)
+    except asyncio.IncompleteReadError as error:
+        if error.partial:
+            raise
+        return None
+    (size,) = FRAME_HEADER.unpack(header)
+    return await reader.readexactly(size)
+
+
+async def read_message(
+    reader: asyncio.StreamReader,
+) -> Optional[dict[str, Any]]:
+    frame = await read_frame(reader)
+    if frame is None:
+        return None
+    return json.loads(frame)  # type: ignore
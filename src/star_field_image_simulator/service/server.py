@@ -0,0 +1,431 @@
+"""
+Local render service
+
+Keeps rendering workers warm (scipy imported, catalog connection open,
+PSF caches filled) and serves generate_star_field_image over a Unix
+socket or a localhost TCP port, see protocol for the wire format.
+Requests arriving within batch_window of each other are coalesced into a
+single task for the worker pool.
+
+Usage
+-----
+    python -m star_field_image_simulator.service.server --port 8765
+    python -m star_field_image_simulator.service.server --path /tmp/sfis
+"""
+import argparse
+import asyncio
+import concurrent.futures
+import functools
+import logging
+import numpy as np
+import numpy.typing as npt
+
+from ..frames import Centroids, render_frame
+from ..image_generation.constants import get_database_path
+from ..image_generation.data_manipulation import get_catalog_connection
+from ..image_generation.kernels import (
+    default_backend,
+    get_kernel,
+    use_safe_threading_layer,
+    worker_context,
+)
+from ..image_generation.selection_cache import StarSelectionCache
+from .protocol import encode_frame, encode_message, read_message
+from typing import Any, Coroutine, Optional, Union
+
+
+logger = logging.getLogger(__name__)
+
+FrameResult = Union[
+    tuple[str, npt.NDArray[np.float64], Centroids], tuple[str, str]
+]
+
+
+def warm_worker() -> None:
+    """Loads everything a frame needs so the first request is not slower"""
+    from scipy.special import erf  # noqa: F401
+
+    get_catalog_connection(get_database_path())
+    if default_backend() == "numba":
+        get_kernel()
+
+
+@functools.lru_cache(maxsize=None)
+def open_selection_cache(directory: str) -> StarSelectionCache:
+    """Returns the worker's StarSelectionCache on directory"""
+    return StarSelectionCache(directory)
+
+
+def render_batch(
+    batch: list[dict[str, Any]],
+    selection_cache: Optional[str] = None,
+    sensor_cache: Optional[str] = None,
+) -> list[FrameResult]:
+    """
+    Renders a batch of frames, failures are reported per frame
+
+    selection_cache is the directory of a StarSelectionCache shared by the
+    workers and sensor_cache the cache_directory of their sensor models,
+    if any.
+    """
+    cache = None
+    if selection_cache is not None:
+        cache = open_selection_cache(selection_cache)
+    results: list[FrameResult] = []
+    for params in batch:
+        if sensor_cache is not None and params.get("sensor"):
+            sensor = {**params["sensor"], "cache_directory": sensor_cache}
+            params = {**params, "sensor": sensor}
+        try:
+            image, centroids = render_frame(params, cache)
+        except Exception as error:
+            results.append(("error", f"{type(error).__name__}: {error}"))
+        else:
+            results.append(("ok", image, centroids))
+    return results
+
+
+class RenderServer:
+    """
+    RenderServer class used to serve star field images to local clients
+
+    Attributes
+    ----------
+    max_batch_size : int
+        Maximum number of requests rendered by one worker task
+    batch_window : float
+        Time to wait for more requests once one arrived
+        Represented in seconds
+    max_workers : Optional[int]
+        Size of the worker pool, defaults to the number of CPUs
+    use_processes : bool
+        Render on a process pool, or on a thread pool when False
+    selection_cache : Optional[str]
+        Directory of a StarSelectionCache shared by the workers
+    sensor_cache : Optional[str]
+        Directory the workers cache the maps of sensor models in, clients
+        can't pick one
+    requests : int
+        Number of requests served so far
+    batches : int
+        Number of batches sent to the workers so far
+
+    Methods
+    -------
+    start(host, port, path)
+        Starts listening on path (Unix socket) or on host:port
+    serve_forever()
+        Serves until cancelled
+    close()
+        Answers the requests in flight, stops listening and shuts the
+        worker pool down
+    """
+
+    def __init__(
+        self,
+        max_batch_size: int = 8,
+        batch_window: float = 0.002,
+        max_workers: Optional[int] = None,
+        use_processes: bool = True,
+        selection_cache: Optional[str] = None,
+        sensor_cache: Optional[str] = None,
+    ) -> None:
+        self.max_batch_size = max_batch_size
+        self.batch_window = batch_window
+        self.max_workers = max_workers
+        self.use_processes = use_processes
+        self.selection_cache = selection_cache
+        self.sensor_cache = sensor_cache
+        self.requests = 0
+        self.batches = 0
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._executor: Optional[concurrent.futures.Executor] = None
+        self._batcher: Optional[asyncio.Task[None]] = None
+        self._connections: dict[asyncio.Task[Any], asyncio.StreamWriter] = {}
+        # the event loop only keeps weak references to tasks
+        self._responses: set[asyncio.Task[None]] = set()
+        self._renders: set[asyncio.Task[None]] = set()
+        self._queue: asyncio.Queue[
+            tuple[dict[str, Any], asyncio.Future[FrameResult]]
+        ]
+
+    @property
+    def address(self) -> Any:
+        """Returns the socket address the server listens on"""
+        if self._server is None:
+            raise RuntimeError("the server is not started")
+        return self._server.sockets[0].getsockname()  # type: ignore
+
+    async def start(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        path: Optional[str] = None,
+    ) -> None:
+        if self.use_processes:
+            self._executor = concurrent.futures.ProcessPoolExecutor(
+                self.max_workers,
+                mp_context=worker_context(),
+                initializer=warm_worker,
+            )
+        else:
+            self._executor = concurrent.futures.ThreadPoolExecutor(
+                self.max_workers, initializer=warm_worker
+            )
+        self._queue = asyncio.Queue()
+        self._batcher = asyncio.create_task(self._batch_requests())
+        if path is not None:
+            self._server = await asyncio.start_unix_server(
+                self._handle_connection, path
+            )
+        else:
+            self._server = await asyncio.start_server(
+                self._handle_connection, host, port
+            )
+
+    async def serve_forever(self) -> None:
+        if self._server is None:
+            raise RuntimeError("the server is not started")
+        await self._server.serve_forever()
+
+    async def close(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        # answer the requests received so far, the batcher still runs
+        if self._responses:
+            await asyncio.wait(set(self._responses))
+        # closing the streams ends the connection handlers cleanly
+        for writer in self._connections.values():
+            writer.close()
+        for response in self._responses:
+            response.cancel()
+        if self._connections:
+            await asyncio.wait(self._connections)
+        tasks = list(self._renders)
+        if self._batcher is not None:
+            tasks.append(self._batcher)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if self._executor is not None:
+            # waits for the frames being rendered off the event loop
+            await asyncio.get_running_loop().run_in_executor(
+                None,
+                functools.partial(
+                    self._executor.shutdown, cancel_futures=True
+                ),
+            )
+
+    def _spawn(
+        self, coroutine: Coroutine[Any, Any, None], *task_sets: set[Any]
+    ) -> None:
+        """
+        Runs coroutine as a task kept in task_sets until it is done, its
+        exception, if any, is logged
+        """
+        task = asyncio.create_task(coroutine)
+        for tasks in task_sets:
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        task.add_done_callback(_log_failure)
+
+    async def _handle_connection(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        write_lock = asyncio.Lock()
+        responses: set[asyncio.Task[None]] = set()
+        connection = asyncio.current_task()
+        self._connections[connection] = writer  # type: ignore
+        try:
+            while True:
+                request_id = None
+                try:
+                    message = await read_message(reader)
+                    if message is None:
+                        break
+                    if isinstance(message, dict):
+                        request_id = message.get("id")
+                    if not isinstance(message, dict) or not isinstance(
+                        message.get("params"), dict
+                    ):
+                        raise ValueError("a request needs a params object")
+                    sensor = message["params"].get("sensor")
+                    if isinstance(sensor, dict) and (
+                        "cache_directory" in sensor
+                    ):
+                        # a path to write to, only the server picks it
+                        raise ValueError(
+                            "the sensor cache_directory is a server setting"
+                        )
+                except ValueError as error:
+                    # malformed JSON included, the frame was read whole so
+                    # the stream is still in sync
+                    header = {
+                        "id": request_id,
+                        "status": "error",
+                        "error": f"{type(error).__name__}: {error}",
+                    }
+                    await _write(writer, write_lock, header, [])
+                    continue
+                self._spawn(
+                    self._respond(
+                        request_id, message["params"], writer, write_lock
+                    ),
+                    responses,
+                    self._responses,
+                )
+            if responses:
+                await asyncio.wait(responses)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            del self._connections[connection]  # type: ignore
+            writer.close()
+
+    async def _respond(
+        self,
+        request_id: Any,
+        params: dict[str, Any],
+        writer: asyncio.StreamWriter,
+        write_lock: asyncio.Lock,
+    ) -> None:
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((params, future))
+        result = await future
+        self.requests += 1
+
+        header: dict[str, Any] = {"id": request_id}
+        frames = []
+        if result[0] == "ok":
+            _, image, centroids = result  # type: ignore
+            header.update(
+                status="ok",
+                shape=list(image.shape),
+                dtype=image.dtype.str,
+                centroids_dtype=np.lib.format.dtype_to_descr(
+                    centroids.dtype
+                ),
+            )
+            frames.append(encode_frame(image.tobytes()))
+            frames.append(encode_frame(centroids.tobytes()))
+        else:
+            header.update(status="error", error=result[1])
+        await _write(writer, write_lock, header, frames)
+
+    async def _batch_requests(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.batch_window
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(
+                        await asyncio.wait_for(self._queue.get(), timeout)
+                    )
+                except asyncio.TimeoutError:
+                    break
+            # keep collecting the next batch while this one renders
+            self._spawn(self._render(batch), self._renders)
+
+    async def _render(
+        self,
+        batch: list[tuple[dict[str, Any], asyncio.Future[FrameResult]]],
+    ) -> None:
+        self.batches += 1
+        loop = asyncio.get_running_loop()
+        try:
+            results = await loop.run_in_executor(
+                self._executor,
+                render_batch,
+                [params for params, _ in batch],
+                self.selection_cache,
+                self.sensor_cache,
+            )
+        except Exception as error:
+            results = [("error", f"{type(error).__name__}: {error}")] * len(
+                batch
+            )
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+
+async def _write(
+    writer: asyncio.StreamWriter,
+    write_lock: asyncio.Lock,
+    header: dict[str, Any],
+    frames: list[bytes],
+) -> None:
+    """Writes a response, dropped when the client disconnected"""
+    async with write_lock:
+        try:
+            writer.write(encode_message(header))
+            for frame in frames:
+                writer.write(frame)
+            await writer.drain()
+        except ConnectionError:
+            pass
+
+
+def _log_failure(task: "asyncio.Task[None]") -> None:
+    if not task.cancelled() and task.exception() is not None:
+        logger.error("render service task failed", exc_info=task.exception())
+
+
+async def _serve(args: argparse.Namespace) -> None:
+    server = RenderServer(
+        args.max_batch_size,
+        args.batch_window,
+        args.workers,
+        not args.threads,
+        args.selection_cache,
+        args.sensor_cache,
+    )
+    await server.start(args.host, args.port, args.path)
+    print(f"serving on {server.address}", flush=True)
+    try:
+        await server.serve_forever()
+    finally:
+        await server.close()
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    use_safe_threading_layer()
+    parser = argparse.ArgumentParser(description="Star field render service")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--path", help="serve on this Unix socket instead")
+    parser.add_argument("--workers", type=int, help="worker pool size")
+    parser.add_argument(
+        "--threads",
+        action="store_true",
+        help="render on threads instead of processes",
+    )
+    parser.add_argument("--max-batch-size", type=int, default=8)
+    parser.add_argument(
+        "--batch-window",
+        type=float,
+        default=0.002,
+        help="seconds to wait for more requests to batch",
+    )
+    parser.add_argument(
+        "--selection-cache",
+        help="directory of an on-disk cache of projected star selections",
+    )
+    parser.add_argument(
+        "--sensor-cache",
+        help="directory the maps of the requested sensors are cached in",
+    )
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(_serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
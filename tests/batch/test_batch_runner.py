@@ -0,0 +1,254 @@
+import json
+import numpy as np
+import pytest
+
+from star_field_image_simulator.batch.job_spec import JobSpec
+from star_field_image_simulator.batch.runner import (
+    FRAME_STAGES,
+    completed_frames,
+    frame_path,
+    pipeline_metrics,
+    run_job,
+)
+from star_field_image_simulator.cli import main
+from star_field_image_simulator.frames import (
+    add_frame_noise,
+    draw_frame,
+    render_frame,
+    select_frame_stars,
+)
+from star_field_image_simulator.image_generation.data_manipulation import (
+    CENTROID_DTYPE,
+)
+from star_field_image_simulator.image_generation.star_density import (
+    count_stars_in_fov,
+)
+
+
+JOB = {
+    "num_frames": 5,
+    "seed": 3,
+    "attitude": {"distribution": "uniform", "roll": [-10, 10]},
+    "parameters": {
+        "resX": 256,
+        "resY": [256, 300],
+        "fovX": [10, 20],
+        "fovY": 10,
+        "magnitude_limit": 5,
+        "num_missing_stars": [0, 2],
+        "num_false_stars": [0, 2],
+        "min_false_star_magnitude": 5,
+        "star_intensity": 100,
+        "star_sigma": [0.8, 1.5],
+        "position_noise": 0,
+    },
+    "noise": {"nRN": 0.1},
+}
+"every random step of a frame"
+NOISY_JOB = dict(
+    JOB,
+    parameters=dict(JOB["parameters"], position_noise=0.2),
+    noise={"nDC": 0.5, "tauDC": 1, "nRN": 0.1, "shot_noise": 0.2},
+)
+
+
+def test_job_spec_frames_are_reproducible():
+    spec = JobSpec(JOB)
+    params = spec.frame_parameters(2)
+    assert params == JobSpec(JOB).frame_parameters(2)
+    assert params != spec.frame_parameters(3)
+    assert 256 <= params["resY"] <= 300
+    assert isinstance(params["resY"], int)
+    assert -10 <= params["phi0"] <= 10
+    assert params["nRN"] == 0.1
+
+
+def test_job_spec_sensor_is_shared():
+    sensor = {"seed": 5, "prnu": 0.02}
+    spec = JobSpec(dict(JOB, noise={"sensor": sensor}))
+    assert spec.frame_parameters(0)["sensor"] == sensor
+    assert spec.frame_parameters(1)["sensor"] == sensor
+
+
+def test_job_spec_attitude_star_count():
+    attitude = {"distribution": "uniform", "min_stars": 10, "max_stars": 20}
+    spec = JobSpec(dict(JOB, attitude=attitude))
+    for index in range(3):
+        params = spec.frame_parameters(index)
+        assert params == spec.frame_parameters(index)
+        count = count_stars_in_fov(
+            params["alpha0"],
+            params["delta0"],
+            params["phi0"],
+            params["fovX"],
+            params["fovY"],
+            params["magnitude_limit"],
+        )
+        assert 10 <= count <= 20
+
+
+def test_job_spec_attitude_list():
+    job = dict(JOB, attitude={"list": [[1, 2, 3]]})
+    del job["num_frames"]
+    spec = JobSpec(job)
+    assert spec.num_frames == 1
+    params = spec.frame_parameters(0)
+    assert (params["alpha0"], params["delta0"], params["phi0"]) == (1, 2, 3)
+
+
+@pytest.mark.parametrize(
+    "parameters, noise",
+    [
+        ({"fovX": [10, 30]}, {}),
+        ({"resX": 128}, {}),
+        ({"star_sigma": 0}, {}),
+        ({"min_false_star_magnitude": 7}, {}),
+        ({"fovY": [20, 10]}, {}),
+        ({"color": 1}, {}),
+        ({}, {"nDC": 2}),
+        ({}, {"sensor": 3}),
+        ({}, {"sensor": {"gain": 2}}),
+    ],
+)
+def test_job_spec_rejects_out_of_bounds(parameters, noise):
+    job = dict(
+        JOB,
+        parameters={**JOB["parameters"], **parameters},
+        noise={**JOB["noise"], **noise},
+    )
+    with pytest.raises(ValueError):
+        JobSpec(job)
+
+
+def test_job_spec_rejects_star_count_range():
+    attitude = {"distribution": "uniform", "min_stars": 20, "max_stars": 10}
+    with pytest.raises(ValueError, match="min_stars"):
+        JobSpec(dict(JOB, attitude=attitude))
+
+
+def test_job_spec_requires_every_parameter():
+    parameters = dict(JOB["parameters"])
+    del parameters["star_sigma"]
+    with pytest.raises(ValueError, match="star_sigma"):
+        JobSpec(dict(JOB, parameters=parameters))
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_run_job_resumes(workers, tmp_path):
+    spec = JobSpec(JOB)
+    assert run_job(spec, tmp_path, workers, 2, lambda count: None) == 5
+    assert completed_frames(tmp_path) == set(range(5))
+
+    with np.load(frame_path(tmp_path, 1)) as frame:
+        params = json.loads(str(frame["params"]))
+        assert params == spec.frame_parameters(1)
+        assert frame["image"].shape == (params["resY"], params["resX"])
+        assert frame["centroids"].dtype == CENTROID_DTYPE
+
+    # an interrupted frame is rendered again, finished ones are kept
+    frame_path(tmp_path, 3).unlink()
+    assert run_job(spec, tmp_path, workers, 2, lambda count: None) == 1
+    assert completed_frames(tmp_path) == set(range(5))
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_run_job_pipelined(workers, tmp_path):
+    spec = JobSpec(JOB)
+    assert run_job(spec, tmp_path, workers, 3, lambda count: None, True) == 5
+    assert completed_frames(tmp_path) == set(range(5))
+    with np.load(frame_path(tmp_path, 4)) as frame:
+        params = json.loads(str(frame["params"]))
+        assert params == spec.frame_parameters(4)
+        assert frame["image"].shape == (params["resY"], params["resX"])
+        assert frame["centroids"].dtype == CENTROID_DTYPE
+
+    metrics = pipeline_metrics(tmp_path)
+    assert metrics.stages == FRAME_STAGES
+    assert metrics.items == {stage: 5 for stage in FRAME_STAGES}
+    assert metrics.bottleneck() in FRAME_STAGES
+    assert pipeline_metrics(tmp_path / "other") is None
+
+
+def load_frame(output, index):
+    with np.load(frame_path(output, index)) as frame:
+        return frame["image"], frame["centroids"]
+
+
+def test_resumed_frames_are_identical(tmp_path):
+    spec = JobSpec(NOISY_JOB)
+    run_job(spec, tmp_path, 1, 2, lambda count: None)
+    image, centroids = load_frame(tmp_path, 3)
+    frame_path(tmp_path, 3).unlink()
+    run_job(spec, tmp_path, 1, 2, lambda count: None)
+    resumed_image, resumed_centroids = load_frame(tmp_path, 3)
+    np.testing.assert_array_equal(resumed_image, image)
+    np.testing.assert_array_equal(resumed_centroids, centroids)
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_pipelined_frames_match_sequential(workers, tmp_path):
+    spec = JobSpec(NOISY_JOB)
+    run_job(spec, tmp_path / "sequential", 1, 5, lambda count: None)
+    run_job(spec, tmp_path / "pipelined", workers, 2, lambda count: None, True)
+    for index in range(5):
+        image, centroids = load_frame(tmp_path / "sequential", index)
+        pipelined_image, pipelined_centroids = load_frame(
+            tmp_path / "pipelined", index
+        )
+        np.testing.assert_array_equal(pipelined_image, image)
+        np.testing.assert_array_equal(pipelined_centroids, centroids)
+
+
+def test_frame_stages_match_render_frame():
+    spec = JobSpec(NOISY_JOB)
+    params, seed = spec.frame_parameters(0), spec.frame_seed(0)
+    image, centroids = draw_frame(select_frame_stars(params), params, seed)
+    image = add_frame_noise(image, params, seed)
+    expected_image, expected_centroids = render_frame(params, seed=seed)
+    np.testing.assert_array_equal(image, expected_image)
+    np.testing.assert_array_equal(centroids, expected_centroids)
+    assert not np.array_equal(render_frame(params, seed=[3, 1])[0], image)
+
+
+def test_render_frame_checks_parameters():
+    params = JobSpec(JOB).frame_parameters(0)
+    with pytest.raises(ValueError, match="unknown"):
+        render_frame({**params, "star_radius": 1})
+    del params["star_sigma"]
+    with pytest.raises(ValueError, match="star_sigma"):
+        render_frame(params)
+
+
+def test_run_job_refuses_other_job(tmp_path):
+    run_job(JobSpec(JOB), tmp_path, 1, progress=lambda count: None)
+    with pytest.raises(ValueError):
+        run_job(JobSpec(dict(JOB, seed=4)), tmp_path, 1)
+
+
+def test_cli_run(tmp_path, capsys):
+    job_path = tmp_path / "job.json"
+    job_path.write_text(json.dumps(dict(JOB, output=str(tmp_path / "out"))))
+    main(["validate", str(job_path)])
+    assert "5 frames" in capsys.readouterr().out
+    main(["run", str(job_path), "--workers", "1"])
+    assert "rendered 5 frames" in capsys.readouterr().err
+    assert completed_frames(tmp_path / "out") == set(range(5))
+
+    job_path.write_text(json.dumps(dict(JOB, output=str(tmp_path / "pipe"))))
+    main(["run", str(job_path), "--workers", "1", "--pipelined"])
+    assert "bottleneck" in capsys.readouterr().err
+    assert completed_frames(tmp_path / "pipe") == set(range(5))
+
+
+def test_run_job_with_selection_cache(tmp_path):
+    job = dict(
+        JOB,
+        num_frames=4,
+        attitude={"list": [[20, 20, 0], [40, 10, 5]]},
+        selection_cache={"directory": str(tmp_path / "cache")},
+    )
+    spec = JobSpec(job)
+    assert spec.digest() == JobSpec(dict(job, selection_cache=None)).digest()
+    run_job(spec, tmp_path / "out", 1, progress=lambda count: None)
+    assert completed_frames(tmp_path / "out") == set(range(4))
+    assert list((tmp_path / "cache").glob("*.npy"))
@@ -0,0 +1,127 @@
+import pytest
+import threading
+import time
+
+from star_field_image_simulator.batch.pipelined_executor import (
+    PipelinedExecutor,
+    PipelineMetrics,
+)
+
+from numpy.random import default_rng
+
+
+rng = default_rng()
+
+
+def sleeping(seconds, function=lambda item: item):
+    def stage(item):
+        time.sleep(seconds)
+        return function(item)
+
+    return stage
+
+
+@pytest.mark.parametrize("queue_size", [1, 2, 8])
+def test_run_keeps_order(queue_size):
+    items = rng.integers(0, 100, 50).tolist()
+    executor = PipelinedExecutor(
+        [
+            ("double", sleeping(rng.uniform(0, 1e-3), lambda x: 2 * x)),
+            ("shift", lambda x: x + 1),
+            ("square", sleeping(rng.uniform(0, 1e-3), lambda x: x ** 2)),
+        ],
+        queue_size,
+    )
+    assert executor.run(items) == [(2 * x + 1) ** 2 for x in items]
+    assert executor.metrics.items == {"double": 50, "shift": 50, "square": 50}
+    assert executor.run([]) == []
+    assert executor.metrics.items["double"] == 0
+
+
+def test_run_overlaps_stages():
+    stages = [(name, sleeping(0.02)) for name in ("a", "b", "c")]
+    executor = PipelinedExecutor(stages)
+    executor.run(range(10))
+    # 12 steps of 20 ms instead of 30 in sequence
+    assert executor.metrics.wall_time < 0.5
+
+
+def test_run_bounds_queues():
+    in_flight = []
+    lock = threading.Lock()
+    produced = consumed = 0
+
+    def produce(item):
+        nonlocal produced
+        with lock:
+            produced += 1
+            in_flight.append(produced - consumed)
+        return item
+
+    def consume(item):
+        nonlocal consumed
+        time.sleep(0.005)
+        with lock:
+            consumed += 1
+        return item
+
+    executor = PipelinedExecutor(
+        [("produce", produce), ("consume", consume)], queue_size=2
+    )
+    assert executor.run(range(20)) == list(range(20))
+    # the queue, the item being consumed and the one being put
+    assert max(in_flight) <= 4
+
+
+def test_run_finds_bottleneck():
+    executor = PipelinedExecutor(
+        [
+            ("fast", sleeping(0.001)),
+            ("slow", sleeping(0.02)),
+            ("last", sleeping(0.001)),
+        ]
+    )
+    executor.run(range(10))
+    metrics = executor.metrics
+    assert metrics.bottleneck() == "slow"
+    assert metrics.utilization()["slow"] > 0.7
+    assert metrics.blocked["fast"] > metrics.blocked["slow"]
+    assert metrics.starved["last"] > metrics.starved["slow"]
+    assert "slow" in metrics.report().splitlines()[1]
+    assert "bottleneck" in metrics.report().splitlines()[1]
+
+
+def test_run_raises_stage_errors():
+    def fail(item):
+        if item == 3:
+            raise ZeroDivisionError(item)
+        return item
+
+    executor = PipelinedExecutor(
+        [("first", lambda item: item), ("fail", fail), ("last", sleeping(0))]
+    )
+    num_threads = threading.active_count()
+    with pytest.raises(ZeroDivisionError):
+        executor.run(range(100))
+    assert executor.metrics.items["fail"] == 3
+    # every stage thread was stopped
+    assert threading.active_count() == num_threads
+
+
+def test_executor_rejects_empty_pipelines():
+    with pytest.raises(ValueError):
+        PipelinedExecutor([])
+    with pytest.raises(ValueError):
+        PipelinedExecutor([("stage", len)], queue_size=0)
+
+
+def test_metrics_merge():
+    executor = PipelinedExecutor([("a", sleeping(0.001)), ("b", len)])
+    executor.run(["x", "yy"])
+    metrics = PipelineMetrics.from_dict(executor.metrics.as_dict())
+    metrics.merge(executor.metrics)
+    assert metrics.items == {"a": 4, "b": 4}
+    assert metrics.busy["a"] == 2 * executor.metrics.busy["a"]
+    assert metrics.wall_time == 2 * executor.metrics.wall_time
+    with pytest.raises(ValueError):
+        metrics.merge(PipelineMetrics(["a"]))
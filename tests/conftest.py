@@ -0,0 +1,18 @@
+import os
+import tempfile
+
+from star_field_image_simulator.image_generation.constants import (
+    CACHE_DIRECTORY_VARIABLE,
+)
+from star_field_image_simulator.image_generation.kernels import (
+    use_safe_threading_layer,
+)
+
+
+# the tests render on threads and fork process pools, like the
+# command-line tools
+use_safe_threading_layer()
+
+# keep the caches of the tests out of the user's cache directory
+_cache_directory = tempfile.TemporaryDirectory(prefix="sfis_cache_")
+os.environ[CACHE_DIRECTORY_VARIABLE] = _cache_directory.name
@@ -0,0 +1,132 @@
+import math
+import numpy as np
+import numpy.testing
+import pytest
+
+from star_field_image_simulator.image_generation.camera_rig import (
+    CameraHead,
+    CameraRig,
+    mounting_rotation,
+)
+from star_field_image_simulator.image_generation.constants import (
+    get_database_path,
+)
+from star_field_image_simulator.image_generation.data_manipulation import (
+    Celestial2Image,
+    create_stars_list,
+    get_catalog_connection,
+    stars_to_array,
+)
+
+from numpy.random import default_rng
+
+rng = default_rng()
+
+MAGNITUDE_LIMIT = 6
+
+"body attitudes near the poles and across the right ascension wrap"
+ATTITUDES = [(20, 20, 0), (0, 89, 30), (359, -60, -45), (180, -90, 0)]
+
+
+def all_catalog_stars_in_canvas(rotation, head):
+    """brute-force projection of the whole catalog into head"""
+    rows = np.array(
+        get_catalog_connection(get_database_path())
+        .execute(
+            "SELECT * FROM star_catalog WHERE magnitude <= ?",
+            (MAGNITUDE_LIMIT,),
+        )
+        .fetchall()
+    )
+    ra, dec = np.radians(rows[:, 1]), np.radians(rows[:, 2])
+    directions = np.stack(
+        [np.cos(dec) * np.cos(ra), np.cos(dec) * np.sin(ra), np.sin(dec)]
+    )
+    u, v, w = np.asarray(head.projection_matrix) @ rotation @ directions
+    u, v = u / w, v / w
+    in_canvas = (
+        (w < 0) & (0 <= u) & (u <= head.resX) & (0 <= v) & (v <= head.resY)
+    )
+    return rows[in_canvas, 0].astype(np.int64)
+
+
+@pytest.mark.parametrize("alpha0, delta0, phi0", ATTITUDES)
+def test_single_head_matches_create_stars_list(alpha0, delta0, phi0):
+    rig = CameraRig([CameraHead(np.eye(3), 15, 10, 512, 256)])
+    (stars,) = rig.project(alpha0, delta0, phi0, MAGNITUDE_LIMIT)
+    c2i = Celestial2Image(alpha0, delta0, phi0, 15, 10, 512, 256)
+    expected = stars_to_array(
+        create_stars_list(
+            alpha0,
+            delta0,
+            MAGNITUDE_LIMIT,
+            15,
+            10,
+            0,
+            512,
+            0,
+            256,
+            c2i,
+            get_database_path(),
+        )
+    )
+    stars = np.sort(stars, order="index")
+    expected = np.sort(expected, order="index")
+    numpy.testing.assert_array_equal(stars["index"], expected["index"])
+    numpy.testing.assert_allclose(stars["u"], expected["u"])
+    numpy.testing.assert_allclose(stars["v"], expected["v"])
+
+
+@pytest.mark.parametrize("pitch, yaw, roll", [(30, 0, 0), (0, -45, 10)])
+def test_mounting_rotation_tilts_the_boresight(pitch, yaw, roll):
+    mounting = mounting_rotation(pitch, yaw, roll)
+    numpy.testing.assert_allclose(mounting @ mounting.T, np.eye(3), atol=1e-12)
+    tilt = math.degrees(math.acos(mounting[2, 2]))
+    assert tilt == pytest.approx(
+        math.degrees(
+            math.acos(
+                math.cos(math.radians(pitch)) * math.cos(math.radians(yaw))
+            )
+        )
+    )
+
+
+@pytest.mark.parametrize("alpha0, delta0, phi0", ATTITUDES)
+def test_rig_heads_see_every_catalog_star(alpha0, delta0, phi0):
+    heads = [
+        CameraHead(mounting_rotation(0, 0, 0), 20, 20, 256, 256),
+        CameraHead(mounting_rotation(90, 0, 0), 10, 15, 300, 400),
+        CameraHead(mounting_rotation(0, 135, 45), 25, 25, 256, 256),
+        CameraHead(mounting_rotation(0, 180, 0), 5, 5, 256, 256),
+    ]
+    rig = CameraRig(heads)
+    rotations = rig.head_rotations(alpha0, delta0, phi0)
+    selections = rig.project(alpha0, delta0, phi0, MAGNITUDE_LIMIT)
+    for head, rotation, stars in zip(heads, rotations, selections):
+        numpy.testing.assert_array_equal(
+            np.sort(stars["index"]),
+            np.sort(all_catalog_stars_in_canvas(rotation, head)),
+        )
+        assert np.all((0 <= stars["u"]) & (stars["u"] <= head.resX))
+        assert np.all((0 <= stars["v"]) & (stars["v"] <= head.resY))
+
+
+@pytest.mark.parametrize("integrated", [True, False])
+def test_rig_render(integrated):
+    heads = [
+        CameraHead(mounting_rotation(0, 0, 0), 20, 20, 256, 256),
+        CameraHead(mounting_rotation(0, 90, 0), 20, 10, 512, 256),
+    ]
+    frames = CameraRig(heads).render(
+        20, 20, 0, 6, 1, 2, 5, 100, 1.0, 0.1, integrated, generator=rng
+    )
+    assert len(frames) == 2
+    for head, (image, centroids) in zip(heads, frames):
+        assert image.shape == (head.resY, head.resX)
+        assert np.sum(centroids["is_false"]) == 2
+        assert np.all(image >= 0)
+
+
+def test_rig_needs_a_head():
+    with pytest.raises(ValueError):
+        CameraRig([])
@@ -0,0 +1,193 @@
+import numpy as np
+import numpy.testing
+import pytest
+import shutil
+import sqlite3
+
+from star_field_image_simulator.image_generation import (
+    canvas_computation,
+    catalog_thinning,
+)
+from star_field_image_simulator.image_generation.canvas_computation import (
+    generate_star_field_image,
+)
+from star_field_image_simulator.image_generation.catalog_thinning import (
+    compile_thinned_catalog,
+    sky_cells,
+    thin_stars,
+    thinned_catalog_path,
+)
+from star_field_image_simulator.image_generation.constants import (
+    CACHE_DIRECTORY_VARIABLE,
+    get_database_path,
+)
+from star_field_image_simulator.image_generation.data_manipulation import (
+    fetch_stars,
+)
+from star_field_image_simulator.image_generation.star_selection import (
+    StarSelection,
+)
+
+from numpy.random import default_rng
+
+
+rng = default_rng()
+
+
+def random_catalog(num_stars):
+    right_ascension = rng.uniform(0, 360, num_stars)
+    declination = np.degrees(np.arcsin(rng.uniform(-1, 1, num_stars)))
+    magnitude = rng.uniform(-1, 12, num_stars)
+    return right_ascension, declination, magnitude
+
+
+@pytest.fixture
+def catalog_path(tmp_path):
+    path = tmp_path / "star_catalog.db"
+    shutil.copy(get_database_path(), path)
+    return path
+
+
+@pytest.mark.parametrize("stars_per_cell", [1, 3])
+def test_thin_stars_keeps_brightest_per_cell(stars_per_cell):
+    right_ascension, declination, magnitude = random_catalog(5000)
+    kept = thin_stars(
+        right_ascension, declination, magnitude, stars_per_cell, 12, 6
+    )
+    assert (np.diff(kept) > 0).all()
+    cells = sky_cells(right_ascension, declination, 12, 6)
+    is_kept = np.isin(np.arange(5000), kept)
+    for cell in np.unique(cells):
+        in_cell = cells == cell
+        assert is_kept[in_cell].sum() == min(stars_per_cell, in_cell.sum())
+        if not is_kept[in_cell].all():
+            assert (
+                magnitude[in_cell & is_kept].max()
+                <= magnitude[in_cell & ~is_kept].min()
+            )
+
+
+def test_thin_stars_rejects_no_stars_per_cell():
+    with pytest.raises(ValueError):
+        thin_stars([0], [0], [0], 0)
+
+
+def test_compile_thinned_catalog(catalog_path, tmp_path):
+    output_path = tmp_path / "thinned.db"
+    num_stars = compile_thinned_catalog(output_path, 2, catalog_path)
+
+    source = sqlite3.connect(catalog_path)
+    thinned = sqlite3.connect(output_path)
+    stars = np.array(source.execute("SELECT * FROM star_catalog;").fetchall())
+    kept = thin_stars(*stars[:, 1:].T, 2)
+    rows = np.array(thinned.execute("SELECT * FROM star_catalog;").fetchall())
+    assert len(rows) == num_stars == len(kept) < len(stars)
+    numpy.testing.assert_array_equal(rows, stars[kept])
+    schema = "SELECT type, name, sql FROM sqlite_master;"
+    assert thinned.execute(schema).fetchall() == (
+        source.execute(schema).fetchall()
+    )
+
+
+def test_compile_thinned_catalog_keeps_proper_motions(tmp_path):
+    right_ascension, declination, magnitude = random_catalog(500)
+    path = tmp_path / "catalog.db"
+    connection = sqlite3.connect(path)
+    with connection:
+        connection.execute(
+            """CREATE TABLE star_catalog (star_id INTEGER PRIMARY KEY,
+            right_ascension REAL, declination REAL, magnitude REAL);"""
+        )
+        connection.execute(
+            """CREATE TABLE proper_motion (star_id INTEGER PRIMARY KEY,
+            pm_ra_cosdec REAL, pm_dec REAL);"""
+        )
+        connection.executemany(
+            "INSERT INTO star_catalog VALUES (?, ?, ?, ?);",
+            zip(range(500), right_ascension, declination, magnitude),
+        )
+        connection.executemany(
+            "INSERT INTO proper_motion VALUES (?, ?, ?);",
+            zip(range(500), rng.normal(size=500), rng.normal(size=500)),
+        )
+    connection.close()
+
+    compile_thinned_catalog(tmp_path / "thinned.db", 1, path, 8, 4)
+    thinned = sqlite3.connect(tmp_path / "thinned.db")
+    star_ids = thinned.execute("SELECT star_id FROM star_catalog;").fetchall()
+    assert len(star_ids) == 32
+    assert (
+        star_ids
+        == thinned.execute("SELECT star_id FROM proper_motion;").fetchall()
+    )
+
+
+def test_thinned_catalog_path_compiles_once(catalog_path):
+    path = thinned_catalog_path(2, catalog_path)
+    assert path.parent == catalog_path.parent
+    modified = path.stat().st_mtime_ns
+    assert thinned_catalog_path(2, catalog_path) == path
+    assert path.stat().st_mtime_ns == modified
+    assert thinned_catalog_path(3, catalog_path) != path
+
+    connection = sqlite3.connect(catalog_path)
+    with connection:
+        connection.execute("DELETE FROM star_catalog WHERE magnitude > 8;")
+    connection.close()
+    assert thinned_catalog_path(2, catalog_path) != path
+
+
+@pytest.mark.parametrize("alpha0, delta0", [(266, -29), (20, 20), (0, 90)])
+def test_fetch_stars_from_thinned_catalog(catalog_path, alpha0, delta0):
+    stars = np.array(fetch_stars(alpha0, delta0, 25, 25, 12, catalog_path))
+    thinned = np.array(
+        fetch_stars(alpha0, delta0, 25, 25, 12, catalog_path, 2)
+    )
+    assert 0 < len(thinned) < len(stars)
+    assert set(thinned[:, 0]) <= set(stars[:, 0])
+
+
+def test_thinned_catalog_path_falls_back_to_the_cache(
+    catalog_path, tmp_path, monkeypatch
+):
+    cache = tmp_path / "cache"
+    monkeypatch.setenv(CACHE_DIRECTORY_VARIABLE, str(cache))
+    compile_catalog = catalog_thinning.compile_thinned_catalog
+
+    def read_only_source(output_path, *args):
+        if output_path.parent == catalog_path.parent:
+            raise PermissionError(output_path.parent)
+        return compile_catalog(output_path, *args)
+
+    monkeypatch.setattr(
+        catalog_thinning, "compile_thinned_catalog", read_only_source
+    )
+    path = thinned_catalog_path(2, catalog_path)
+    assert path.parent == cache
+    assert thinned_catalog_path(2, catalog_path) == path
+
+    # an extracted catalog is gone with its process
+    monkeypatch.setattr(catalog_thinning, "is_extracted", lambda path: True)
+    assert thinned_catalog_path(3, catalog_path).parent == cache
+
+    path = thinned_catalog_path(2, catalog_path, directory=tmp_path / "out")
+    assert path.parent == tmp_path / "out"
+    assert path.exists()
+
+
+def test_generate_star_field_image_from_thinned_catalog(
+    catalog_path, monkeypatch
+):
+    monkeypatch.setattr(
+        canvas_computation, "get_database_path", lambda: str(catalog_path)
+    )
+    params = (266, -29, 0, 512, 512, 25, 25, 12, 0, 0, 5, 100, 1.0, 0)
+    _, centroids = generate_star_field_image(*params)
+    _, thinned = generate_star_field_image(*params, stars_per_cell=2)
+    # the cone of the selection holds the full catalog, it is not used
+    _, selected = generate_star_field_image(
+        *params, stars_per_cell=2, star_selection=StarSelection()
+    )
+    assert len(thinned) < len(centroids) / 2
+    assert set(thinned["id"]) <= set(centroids["id"])
+    numpy.testing.assert_array_equal(selected, thinned)
@@ -0,0 +1,33 @@
+import os
+import subprocess
+import sys
+
+from star_field_image_simulator.image_generation import constants
+
+
+def test_database_path_is_resolved_lazily():
+    assert constants.DATABASE_PATH == constants.get_database_path()
+    assert os.path.isfile(constants.get_database_path())
+
+
+def test_import_does_not_load_scipy():
+    code = (
+        "import sys\n"
+        "import star_field_image_simulator.image_generation"
+        ".canvas_computation\n"
+        "assert 'scipy' not in sys.modules\n"
+    )
+    subprocess.run([sys.executable, "-c", code], check=True)
+
+
+def test_import_does_not_load_optional_stages():
+    code = (
+        "import sys\n"
+        "import star_field_image_simulator.image_generation"
+        ".canvas_computation\n"
+        "for module in ('concurrent.futures', 'tempfile',"
+        " 'star_field_image_simulator.image_generation.catalog_thinning',"
+        " 'star_field_image_simulator.image_generation.epoch_propagation'):\n"
+        "    assert module not in sys.modules, module\n"
+    )
+    subprocess.run([sys.executable, "-c", code], check=True)
@@ -0,0 +1,211 @@
+import numpy as np
+import numpy.testing
+import pytest
+
+from star_field_image_simulator.image_generation.canvas_computation import (
+    adaptive_half_sizes,
+    draw_star_field_image,
+    render_vectorized,
+    star_windows,
+)
+from star_field_image_simulator.image_generation.data_manipulation import (
+    Star,
+    stars_to_array,
+)
+
+from numpy.random import default_rng
+
+
+rng = default_rng(30)
+
+
+def centered_stars(num_stars, resX, resY, magnitude_max=6, margin=40):
+    stars = []
+    for index in range(num_stars):
+        star = Star(index, 0, 0, rng.uniform(-1, magnitude_max))
+        star.u = rng.uniform(margin, resX - margin)
+        star.v = rng.uniform(margin, resY - margin)
+        stars.append(star)
+    return stars
+
+
+def test_draw_star_field_image_lazy_window():
+    star = Star(7, 0, 0, 0)
+    star.u = 10.4
+    star.v = 20.6
+    image, centroids = draw_star_field_image([star], 64, 64, 100, 1.0)
+    assert centroids[["id", "u", "v"]].tolist() == [(7, 10.4, 20.6)]
+    rows, columns = np.nonzero(image)
+    assert (rows.min(), rows.max()) == (17, 24)
+    assert (columns.min(), columns.max()) == (6, 13)
+
+
+@pytest.mark.parametrize("integrated", [True, False])
+def test_draw_star_field_image_lazy_matches_full(integrated):
+    stars = centered_stars(20, 128, 96)
+    lazy, _ = draw_star_field_image(stars, 128, 96, 100, 0.8, integrated)
+    full, _ = draw_star_field_image(
+        stars, 128, 96, 100, 0.8, integrated, False
+    )
+    numpy.testing.assert_allclose(lazy, full, atol=1e-3 * full.max())
+
+
+def test_adaptive_half_sizes():
+    flux = np.array([0.5, 1.0, 2.0, 1000.0])
+    half_sizes = adaptive_half_sizes(flux, 2.0, 1.0)
+    assert half_sizes[0] == 0
+    assert half_sizes[1] == 0
+    radius = 2.0 * np.sqrt(2 * np.log(flux[2:]))
+    numpy.testing.assert_array_equal(half_sizes[2:], np.ceil(radius + 1.5))
+
+    with pytest.raises(ValueError):
+        adaptive_half_sizes(flux, 2.0, 0)
+
+
+@pytest.mark.parametrize("integrated", [True, False])
+@pytest.mark.parametrize("star_sigma", [0.6, 1.5, 4.0])
+def test_adaptive_window_residual(integrated, star_sigma):
+    stars = centered_stars(30, 160, 160)
+    residual_threshold = 1e-3
+    full, _ = draw_star_field_image(
+        stars, 160, 160, 100, star_sigma, integrated, False
+    )
+    adaptive, _ = draw_star_field_image(
+        stars,
+        160,
+        160,
+        100,
+        star_sigma,
+        integrated,
+        residual_threshold=residual_threshold,
+    )
+    # every star leaves out less than the threshold on each pixel
+    assert np.all(full - adaptive >= -1e-9)
+    assert np.max(full - adaptive) < len(stars) * residual_threshold
+
+
+def test_adaptive_window_conserves_flux_for_wide_psf():
+    stars = centered_stars(30, 256, 256)
+    star_sigma = 3.0
+    full, _ = draw_star_field_image(stars, 256, 256, 100, star_sigma)
+    adaptive, _ = draw_star_field_image(
+        stars, 256, 256, 100, star_sigma, residual_threshold=1e-3
+    )
+    total_flux = sum(
+        100 / 2.512 ** star.magnitude * 2 * np.pi * star_sigma ** 2
+        for star in stars
+    )
+    fixed_error = abs(full.sum() - total_flux) / total_flux
+    adaptive_error = abs(adaptive.sum() - total_flux) / total_flux
+    assert adaptive_error < 1e-4
+    assert adaptive_error < fixed_error
+
+
+def test_adaptive_window_skips_faint_stars():
+    star = Star(1, 0, 0, 10)
+    star.u = 32
+    star.v = 32
+    image, centroids = draw_star_field_image(
+        [star], 64, 64, 1, 1.0, residual_threshold=0.5
+    )
+    assert not image.any()
+    assert centroids[["id", "u", "v"]].tolist() == [(1, 32, 32)]
+
+
+def test_adaptive_window_requires_lazy():
+    with pytest.raises(ValueError):
+        draw_star_field_image([], 64, 64, 1, 1.0, True, False, None, 0.5)
+
+
+@pytest.mark.parametrize("integrated", [True, False])
+def test_draw_star_field_image_from_array(integrated):
+    stars = centered_stars(20, 128, 96)
+    expected, expected_centroids = draw_star_field_image(
+        stars, 128, 96, 100, 1.0, integrated
+    )
+    image, centroids = draw_star_field_image(
+        stars_to_array(stars), 128, 96, 100, 1.0, integrated
+    )
+    numpy.testing.assert_array_equal(image, expected)
+    numpy.testing.assert_array_equal(centroids, expected_centroids)
+
+
+@pytest.mark.parametrize("threads", [2, 5, None])
+@pytest.mark.parametrize("integrated, lazy", [(True, True), (False, False)])
+def test_threaded_bands_match_serial(threads, integrated, lazy):
+    # stars straddle the band borders and the canvas edges
+    stars = centered_stars(200, 300, 250, margin=0)
+    expected, expected_centroids = draw_star_field_image(
+        stars, 300, 250, 100, 1.5, integrated, lazy, backend="numpy"
+    )
+    image, centroids = draw_star_field_image(
+        stars,
+        300,
+        250,
+        100,
+        1.5,
+        integrated,
+        lazy,
+        backend="numpy",
+        threads=threads,
+    )
+    numpy.testing.assert_array_equal(image, expected)
+    numpy.testing.assert_array_equal(centroids, expected_centroids)
+
+
+@pytest.mark.parametrize("integrated", [True, False])
+@pytest.mark.parametrize(
+    "lazy, residual_threshold", [(True, None), (True, 0.01), (False, None)]
+)
+def test_vectorized_matches_direct(integrated, lazy, residual_threshold):
+    # dense enough for windows to overlap, and on the canvas edges
+    stars = centered_stars(400, 300, 250, margin=0)
+    kwargs = dict(residual_threshold=residual_threshold, backend="numpy")
+    expected, expected_centroids = draw_star_field_image(
+        stars, 300, 250, 100, 1.5, integrated, lazy, **kwargs
+    )
+    image, centroids = draw_star_field_image(
+        stars,
+        300,
+        250,
+        100,
+        1.5,
+        integrated,
+        lazy,
+        method="vectorized",
+        **kwargs,
+    )
+    numpy.testing.assert_allclose(image, expected, rtol=1e-10, atol=1e-12)
+    numpy.testing.assert_array_equal(centroids, expected_centroids)
+
+
+@pytest.mark.parametrize("batch_pixels", [1, 500, 1 << 20])
+def test_vectorized_batches(batch_pixels):
+    # flux-adaptive windows of several size classes, split in batches
+    stars = centered_stars(200, 300, 250, margin=0)
+    expected, centroids = draw_star_field_image(
+        stars, 300, 250, 100, 1.5, residual_threshold=0.01, backend="numpy"
+    )
+    half_sizes = adaptive_half_sizes(centroids["flux"], 1.5, 0.01)
+    image = np.zeros([250, 300])
+    render_vectorized(
+        image,
+        *star_windows(
+            centroids["u"], centroids["v"], 300, 250, half_sizes=half_sizes
+        ),
+        centroids["u"],
+        centroids["v"],
+        centroids["flux"],
+        1.5,
+        True,
+        batch_pixels,
+    )
+    numpy.testing.assert_allclose(image, expected, rtol=1e-10, atol=1e-12)
+
+
+def test_vectorized_without_stars():
+    image, centroids = draw_star_field_image(
+        [], 64, 32, 100, 1.0, method="vectorized"
+    )
+    assert image.shape == (32, 64) and not image.any()
+    assert len(centroids) == 0
@@ -0,0 +1,115 @@
+import numpy as np
+import numpy.testing
+import pytest
+import scipy.io
+import sqlite3
+
+from star_field_image_simulator.image_generation.canvas_computation import (
+    generate_star_field_image,
+)
+from star_field_image_simulator.image_generation.constants import (
+    CATALOG_EPOCH,
+    get_database_path,
+)
+from star_field_image_simulator.image_generation.epoch_propagation import (
+    build_catalog,
+    propagate_catalog,
+    propagate_directions,
+    read_catalog,
+)
+
+from numpy.random import default_rng
+
+
+rng = default_rng()
+
+FRAME = (20, 20, 0, 256, 256, 20, 20, 6, 0, 0, 5, 100, 1.0, 0)
+
+
+def to_degrees(directions):
+    x, y, z = directions.T
+    return np.degrees(np.arctan2(y, x)) % 360, np.degrees(np.arcsin(z))
+
+
+@pytest.mark.parametrize(
+    "pm_ra_cosdec, pm_dec, expected",
+    [(0, 3.6e6, (0, 10)), (3.6e6, 0, (10, 0)), (0, -3.6e6, (0, -10))],
+)
+def test_propagate_directions_great_circle(pm_ra_cosdec, pm_dec, expected):
+    directions = propagate_directions(
+        np.array([0.0]),
+        np.array([0.0]),
+        np.array([pm_ra_cosdec]),
+        np.array([pm_dec]),
+        10,
+    )
+    numpy.testing.assert_allclose(np.linalg.norm(directions, axis=-1), 1)
+    ra, dec = to_degrees(directions)
+    assert (ra[0], dec[0]) == pytest.approx(expected, abs=1e-9)
+
+
+def test_propagate_directions_without_motion():
+    ra = rng.uniform(0, 360, 100)
+    dec = rng.uniform(-90, 90, 100)
+    zeros = np.zeros(100)
+    directions = propagate_directions(ra, dec, zeros, zeros, 25)
+    propagated_ra, propagated_dec = to_degrees(directions)
+    numpy.testing.assert_allclose(propagated_ra, ra, atol=1e-9)
+    numpy.testing.assert_allclose(propagated_dec, dec, atol=1e-9)
+
+
+def test_build_catalog_with_proper_motion(tmp_path):
+    source = tmp_path / "catalog.mat"
+    catalog = np.array(
+        [[1, 20, 20, 3, 0, 3.6e6], [2, 21, 20, 4, 0, 0], [3, 22, 20, 7, 0, 0]]
+    )
+    scipy.io.savemat(source, {"catalog": catalog})
+    database = tmp_path / "catalog.db"
+    build_catalog(database, source)
+
+    stars, proper_motions = read_catalog(database)
+    numpy.testing.assert_array_equal(stars, catalog[:, :4])
+    numpy.testing.assert_array_equal(proper_motions, catalog[:, 4:])
+
+    epoch_catalog = propagate_catalog(CATALOG_EPOCH + 2, database)
+    assert propagate_catalog(CATALOG_EPOCH + 2, database) is epoch_catalog
+    numpy.testing.assert_array_equal(epoch_catalog.magnitude, [3, 4, 7])
+    ra, dec = to_degrees(epoch_catalog.directions)
+    assert dec[0] == pytest.approx(22)
+    assert dec[1] == pytest.approx(20)
+
+
+def test_build_catalog_matches_packaged_catalog(tmp_path):
+    database = tmp_path / "catalog.db"
+    build_catalog(database)
+    packaged = sqlite3.connect(get_database_path())
+    built = sqlite3.connect(database)
+    query = "SELECT * FROM star_catalog ORDER BY star_id"
+    assert built.execute(query).fetchall() == (
+        packaged.execute(query).fetchall()
+    )
+    assert built.execute(
+        "SELECT COUNT(*) FROM proper_motion WHERE pm_dec != 0"
+    ).fetchone() == (0,)
+
+
+def test_catalog_without_proper_motion_does_not_move():
+    stars, proper_motions = read_catalog(get_database_path())
+    assert not np.any(proper_motions)
+    assert len(stars) == len(proper_motions)
+
+
+@pytest.mark.parametrize("integrated", [True, False])
+@pytest.mark.parametrize("epoch", [CATALOG_EPOCH, 2030.0])
+def test_generate_at_epoch_matches_catalog(integrated, epoch):
+    # the packaged catalog has no proper motions, every epoch is the same
+    expected, expected_centroids = generate_star_field_image(
+        *FRAME, integrated
+    )
+    image, centroids = generate_star_field_image(
+        *FRAME, integrated, epoch=epoch
+    )
+    numpy.testing.assert_allclose(image, expected, rtol=1e-9, atol=1e-12)
+    numpy.testing.assert_array_equal(centroids["id"], expected_centroids["id"])
+    numpy.testing.assert_allclose(centroids["u"], expected_centroids["u"])
+    numpy.testing.assert_allclose(centroids["v"], expected_centroids["v"])
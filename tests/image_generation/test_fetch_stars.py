@@ -1,9 +1,13 @@
 import numpy as np
 import pytest
 import numpy.testing
+import sqlite3
+import threading
 
 from star_field_image_simulator.image_generation.data_manipulation import (
+    close_catalog_connections,
     fetch_stars,
+    get_catalog_connection,
 )
 
 from numpy.random import default_rng
@@ -220,3 +224,27 @@ def test_fetch_stars_no_loop(alpha0, delta0, expected_catalog):
         alpha0, delta0, 12, 12, 5.5, DATA_PATH / "sc_no_loop.db"
     )
     numpy.testing.assert_allclose(actual_catalog, expected_catalog, atol=REL)
+
+
+def test_catalog_connections_close_with_their_thread(monkeypatch):
+    closed = []
+
+    class Connection:
+        def close(self):
+            closed.append(self)
+
+    monkeypatch.setattr(sqlite3, "connect", lambda path: Connection())
+    connections = []
+
+    def query():
+        connections.append(get_catalog_connection("first.db"))
+        close_catalog_connections()
+        connections.append(get_catalog_connection("first.db"))
+        connections.append(get_catalog_connection("second.db"))
+        assert get_catalog_connection("second.db") is connections[-1]
+
+    thread = threading.Thread(target=query)
+    thread.start()
+    thread.join()
+    assert connections[0] is not connections[1]
+    assert closed == connections
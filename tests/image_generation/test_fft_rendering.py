@@ -0,0 +1,101 @@
+import numpy as np
+import numpy.testing
+import pytest
+
+from star_field_image_simulator.image_generation.canvas_computation import (
+    draw_star_field_image,
+)
+from star_field_image_simulator.image_generation.data_manipulation import Star
+from star_field_image_simulator.image_generation.fft_rendering import (
+    deposit_stars,
+    psf_kernel_spectrum,
+    split_sigma,
+)
+from star_field_image_simulator.image_generation.instrumentation import (
+    PipelineStats,
+)
+
+from numpy.random import default_rng
+
+
+rng = default_rng()
+
+
+def random_stars(num_stars, resX, resY):
+    stars = []
+    for index in range(num_stars):
+        star = Star(index, 0, 0, rng.uniform(-1, 6))
+        star.u = rng.uniform(0, resX)
+        star.v = rng.uniform(0, resY)
+        stars.append(star)
+    return stars
+
+
+@pytest.mark.parametrize("star_sigma", [1.5, 3.0, 8.0])
+def test_split_sigma(star_sigma):
+    deposit_sigma, kernel_sigma = split_sigma(star_sigma)
+    assert deposit_sigma ** 2 + kernel_sigma ** 2 == pytest.approx(
+        star_sigma ** 2
+    )
+    assert deposit_sigma <= 1.5
+
+
+def test_deposit_stars_conserves_flux_and_centroid():
+    u = np.array([20.3, 40.5])
+    v = np.array([30.7, 10.0])
+    flux = np.array([2.0, 5.0])
+    grid = deposit_stars(u, v, flux, (64, 64), 1.0)
+    assert grid.sum() == pytest.approx(flux.sum())
+    rows, columns = np.indices(grid.shape)
+    first = grid * (rows > 20)
+    assert (first * columns).sum() / first.sum() == pytest.approx(20.3)
+    assert (first * rows).sum() / first.sum() == pytest.approx(30.7)
+
+
+@pytest.mark.parametrize("integrated", [True, False])
+@pytest.mark.parametrize(
+    "star_sigma, tolerance", [(1.0, 5e-2), (1.5, 1e-3), (4.0, 1e-6)]
+)
+def test_fft_matches_exact(integrated, star_sigma, tolerance):
+    stars = random_stars(40, 200, 150)
+    exact, exact_centroids = draw_star_field_image(
+        stars, 200, 150, 100, star_sigma, integrated, False
+    )
+    fft, centroids = draw_star_field_image(
+        stars, 200, 150, 100, star_sigma, integrated, False, method="fft"
+    )
+    numpy.testing.assert_array_equal(centroids, exact_centroids)
+    numpy.testing.assert_allclose(fft, exact, atol=tolerance * exact.max())
+
+
+def test_kernel_spectrum_is_cached():
+    first = psf_kernel_spectrum(2.0, True, (64, 64))
+    assert psf_kernel_spectrum(2.0, True, (64, 64)) is first
+    assert not first.flags.writeable
+
+
+def test_auto_method_selection():
+    stars = random_stars(40, 128, 128)
+    stats = PipelineStats()
+    draw_star_field_image(
+        stars, 128, 128, 100, 2.0, True, False, stats, method="auto"
+    )
+    # 40 stars over the whole canvas use the FFT renderer
+    assert stats.pixels_touched == 128 * 128
+
+    stats = PipelineStats()
+    draw_star_field_image(
+        stars, 128, 128, 100, 2.0, True, True, stats, method="auto"
+    )
+    assert stats.pixels_touched <= 40 * 8 * 8
+
+    stats = PipelineStats()
+    draw_star_field_image(
+        stars, 128, 128, 100, 0.5, True, False, stats, method="auto"
+    )
+    assert stats.pixels_touched == 40 * 128 * 128
+
+
+def test_invalid_method():
+    with pytest.raises(ValueError):
+        draw_star_field_image([], 64, 64, 1, 1.0, method="spline")
@@ -0,0 +1,102 @@
+import numpy as np
+import numpy.testing
+import pytest
+
+from star_field_image_simulator.image_generation.canvas_computation import (
+    draw_star_field_image,
+)
+from star_field_image_simulator.image_generation.data_manipulation import (
+    STAR_DTYPE,
+)
+from star_field_image_simulator.image_generation.incremental_canvas import (
+    IncrementalCanvas,
+)
+
+from numpy.random import default_rng
+
+rng = default_rng()
+
+
+def random_stars(num_stars, resX, resY):
+    stars = np.zeros(num_stars, dtype=STAR_DTYPE)
+    stars["index"] = np.arange(num_stars)
+    stars["u"] = stars["true_u"] = rng.uniform(0, resX, num_stars)
+    stars["v"] = stars["true_v"] = rng.uniform(0, resY, num_stars)
+    stars["magnitude"] = rng.uniform(0, 6, num_stars)
+    return stars
+
+
+def draw(stars, integrated=True, residual_threshold=None):
+    return draw_star_field_image(
+        stars,
+        200,
+        150,
+        100,
+        1.3,
+        integrated,
+        residual_threshold=residual_threshold,
+        backend="numpy",
+    )
+
+
+@pytest.mark.parametrize("integrated", [True, False])
+@pytest.mark.parametrize("residual_threshold", [None, 0.01])
+def test_add_stars_matches_draw(integrated, residual_threshold):
+    stars = random_stars(100, 200, 150)
+    canvas = IncrementalCanvas(
+        200, 150, 100, 1.3, integrated, residual_threshold
+    )
+    handles = canvas.add_stars(stars)
+    numpy.testing.assert_array_equal(handles, np.arange(100))
+    image, centroids = draw(stars, integrated, residual_threshold)
+    numpy.testing.assert_allclose(canvas.image, image, atol=1e-12)
+    numpy.testing.assert_array_equal(canvas.centroids(), centroids)
+
+
+def test_remove_and_move_stars():
+    stars = random_stars(50, 200, 150)
+    canvas = IncrementalCanvas(200, 150, 100, 1.3)
+    handles = canvas.add_stars(stars)
+
+    removed = canvas.remove_stars(handles[[3, 7]])
+    numpy.testing.assert_array_equal(removed, stars[[3, 7]])
+    remaining = np.delete(stars, [3, 7])
+    numpy.testing.assert_allclose(canvas.image, draw(remaining)[0], atol=1e-12)
+
+    moved = handles[[0, 10, 20]]
+    u, v = rng.uniform(0, 200, 3), rng.uniform(0, 150, 3)
+    canvas.move_stars(moved, u, v)
+    expected = remaining.copy()
+    for handle, new_u, new_v in zip(moved, u, v):
+        index = np.flatnonzero(expected["index"] == handle)[0]
+        expected["u"][index], expected["v"][index] = new_u, new_v
+    numpy.testing.assert_allclose(canvas.image, draw(expected)[0], atol=1e-12)
+    numpy.testing.assert_array_equal(canvas.stars(), expected)
+    assert (canvas.stars()["true_u"] == remaining["true_u"]).all()
+
+    canvas.add_stars(removed)
+    assert len(canvas) == 50
+    canvas.refresh()
+    numpy.testing.assert_allclose(
+        canvas.image,
+        draw(np.concatenate([expected, removed]))[0],
+        atol=1e-12,
+    )
+
+
+def test_unknown_handles():
+    canvas = IncrementalCanvas(64, 64, 100, 1)
+    handles = canvas.add_stars(random_stars(3, 64, 64))
+    canvas.remove_stars(handles[:1])
+    numpy.testing.assert_array_equal(canvas.handles(), handles[1:])
+    with pytest.raises(KeyError):
+        canvas.remove_stars(handles[:1])
+    with pytest.raises(KeyError):
+        canvas.move_stars([5], [1], [1])
+
+
+def test_removing_every_star_leaves_a_blank_image():
+    canvas = IncrementalCanvas(64, 64, 100, 1)
+    canvas.remove_stars(canvas.add_stars(random_stars(20, 64, 64)))
+    assert np.abs(canvas.image).max() < 1e-12
+    assert len(canvas.stars()) == len(canvas.centroids()) == 0
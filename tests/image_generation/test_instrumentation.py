@@ -0,0 +1,125 @@
+import json
+
+from star_field_image_simulator.image_generation.canvas_computation import (
+    draw_star_field_image,
+    generate_star_field_image,
+)
+from star_field_image_simulator.image_generation.constants import (
+    U_COORDINATE_ORIGIN,
+    V_COORDINATE_ORIGIN,
+)
+from star_field_image_simulator.image_generation.data_manipulation import (
+    Celestial2Image,
+    Star,
+    create_stars_list,
+)
+from star_field_image_simulator.image_generation.instrumentation import (
+    PipelineStats,
+    time_stage,
+)
+
+from .constants import DATA_PATH
+
+
+def test_time_stage_accumulates():
+    stats = PipelineStats()
+    with stats.time_stage("render"):
+        pass
+    first = stats.stage_times["render"]
+    with time_stage(stats, "render"):
+        pass
+    assert stats.stage_times["render"] >= first
+    assert stats.total_time == stats.stage_times["render"]
+
+
+def test_time_stage_disabled():
+    with time_stage(None, "render"):
+        pass
+
+
+def test_create_stars_list_counters():
+    stats = PipelineStats()
+    c2i = Celestial2Image(0, 87.29, 0, 12, 12, 1024, 1024)
+    stars = create_stars_list(
+        0,
+        87.29,
+        5.5,
+        12,
+        12,
+        U_COORDINATE_ORIGIN,
+        1024,
+        V_COORDINATE_ORIGIN,
+        1024,
+        c2i,
+        DATA_PATH / "sc_no_loop.db",
+        stats,
+    )
+    assert stats.stars_fetched == 8
+    assert stats.stars_in_canvas == len(stars) == 8
+    assert set(stats.stage_times) == {
+        "fetch",
+        "construction",
+        "projection",
+        "canvas_selection",
+    }
+
+
+def test_draw_star_field_image_pixels_touched():
+    stats = PipelineStats()
+    star = Star(1, 0, 0, 1)
+    star.u = 100.3
+    star.v = 200.7
+    draw_star_field_image([star], 256, 256, 100, 1, True, True, stats)
+    assert stats.stars_rendered == 1
+    assert stats.pixels_touched == 8 * 8
+
+    stats = PipelineStats()
+    draw_star_field_image([star], 256, 128, 100, 1, False, False, stats)
+    assert stats.pixels_touched == 256 * 128
+
+    stats = PipelineStats()
+    draw_star_field_image(
+        [star], 256, 256, 100, 1, True, True, stats, method="vectorized"
+    )
+    assert stats.pixels_touched == 8 * 8
+
+
+def test_generate_star_field_image_stats(tmp_path):
+    stats_path = tmp_path / "stats.jsonl"
+    image, centroids, stats = generate_star_field_image(
+        20,
+        20,
+        0,
+        512,
+        512,
+        12,
+        12,
+        6,
+        2,
+        5,
+        5.5,
+        100,
+        1.2,
+        0.5,
+        return_stats=True,
+        stats_path=stats_path,
+    )
+    assert image.shape == (512, 512)
+    assert stats.false_stars_added == 5
+    assert stats.stars_rendered == len(centroids)
+    assert stats.stars_rendered == (
+        stats.stars_in_canvas - stats.stars_removed + 5
+    )
+    assert {"fetch", "perturbation", "render"} <= set(stats.stage_times)
+
+    (line,) = stats_path.read_text().splitlines()
+    exported = json.loads(line)
+    assert exported["stars_rendered"] == stats.stars_rendered
+    assert exported["parameters"]["alpha0"] == 20
+
+
+def test_generate_star_field_image_without_stats():
+    result = generate_star_field_image(
+        20, 20, 0, 256, 256, 12, 12, 6, 0, 0, 5.5, 100, 1.2, 0
+    )
+    assert len(result) == 2
@@ -0,0 +1,136 @@
+import concurrent.futures
+import numpy as np
+import numpy.testing
+import pytest
+
+from star_field_image_simulator.image_generation.canvas_computation import (
+    draw_star_field_image,
+)
+from star_field_image_simulator.image_generation.data_manipulation import (
+    STAR_DTYPE,
+)
+from star_field_image_simulator.image_generation.kernels import (
+    HAS_NUMBA,
+    bucket_stars_by_band,
+    resolve_backend,
+)
+
+from numpy.random import default_rng
+
+
+rng = default_rng()
+
+requires_numba = pytest.mark.skipif(not HAS_NUMBA, reason="needs numba")
+
+
+def random_stars(num_stars, resX, resY):
+    """stars all over the canvas, including its borders"""
+    stars = np.zeros(num_stars, dtype=STAR_DTYPE)
+    stars["index"] = np.arange(num_stars)
+    stars["u"] = stars["true_u"] = rng.uniform(0, resX, num_stars)
+    stars["v"] = stars["true_v"] = rng.uniform(0, resY, num_stars)
+    stars["magnitude"] = rng.uniform(-1, 6, num_stars)
+    return stars
+
+
+def test_bucket_stars_by_band():
+    v_start = np.array([0, 14, 40, 5, 50])
+    v_stop = np.array([8, 20, 48, 5, 64])
+    offsets, stars = bucket_stars_by_band(v_start, v_stop, 64, 16)
+    bands = [stars[offsets[b] : offsets[b + 1]].tolist() for b in range(4)]
+    # the empty window of star 3 is dropped
+    assert bands == [[0, 1], [1], [2], [4]]
+
+
+def test_resolve_backend():
+    assert resolve_backend(None) == ("numba" if HAS_NUMBA else "numpy")
+    assert resolve_backend("numpy") == "numpy"
+    with pytest.raises(ValueError):
+        resolve_backend("cuda")
+
+
+@requires_numba
+@pytest.mark.parametrize("integrated", [True, False])
+@pytest.mark.parametrize("lazy", [True, False])
+@pytest.mark.parametrize("num_stars", [0, 1, 50, 2000])
+def test_numba_backend_matches_numpy(integrated, lazy, num_stars):
+    if not lazy and num_stars > 50:
+        pytest.skip("the full canvas mode is too slow with many stars")
+    stars = random_stars(num_stars, 300, 200)
+    expected, expected_centroids = draw_star_field_image(
+        stars, 300, 200, 100, 1.2, integrated, lazy, backend="numpy"
+    )
+    image, centroids = draw_star_field_image(
+        stars, 300, 200, 100, 1.2, integrated, lazy, backend="numba"
+    )
+    numpy.testing.assert_allclose(image, expected, rtol=1e-12, atol=1e-12)
+    numpy.testing.assert_array_equal(centroids, expected_centroids)
+
+
+@requires_numba
+@pytest.mark.parametrize("integrated", [True, False])
+def test_numba_backend_adaptive_windows(integrated):
+    stars = random_stars(500, 256, 256)
+    expected, _ = draw_star_field_image(
+        stars,
+        256,
+        256,
+        100,
+        2.0,
+        integrated,
+        residual_threshold=1e-3,
+        backend="numpy",
+    )
+    image, _ = draw_star_field_image(
+        stars,
+        256,
+        256,
+        100,
+        2.0,
+        integrated,
+        residual_threshold=1e-3,
+        backend="numba",
+    )
+    numpy.testing.assert_allclose(image, expected, rtol=1e-12, atol=1e-12)
+
+
+@requires_numba
+def test_numba_backend_leaves_threading_layer_alone():
+    import numba
+
+    layer = numba.config.THREADING_LAYER
+    draw_star_field_image(
+        random_stars(10, 64, 64), 64, 64, 100, 1.2, backend="numba"
+    )
+    assert numba.config.THREADING_LAYER == layer
+
+
+@requires_numba
+def test_numba_backend_renders_concurrently():
+    stars = random_stars(300, 200, 100)
+    expected, _ = draw_star_field_image(
+        stars, 200, 100, 100, 1.2, backend="numpy"
+    )
+    with concurrent.futures.ThreadPoolExecutor(4) as executor:
+        images = executor.map(
+            lambda _: draw_star_field_image(
+                stars, 200, 100, 100, 1.2, backend="numba"
+            )[0],
+            range(16),
+        )
+        for image in images:
+            numpy.testing.assert_allclose(image, expected, atol=1e-12)
+
+
+@requires_numba
+@pytest.mark.parametrize("threads", [2, None])
+def test_numba_backend_warns_about_threads(threads):
+    stars = random_stars(10, 64, 64)
+    with pytest.warns(UserWarning, match="numpy backend"):
+        image, _ = draw_star_field_image(
+            stars, 64, 64, 100, 1.2, backend="numba", threads=threads
+        )
+    expected, _ = draw_star_field_image(
+        stars, 64, 64, 100, 1.2, backend="numba"
+    )
+    numpy.testing.assert_array_equal(image, expected)
@@ -0,0 +1,130 @@
+import concurrent.futures
+import numpy as np
+import numpy.testing
+import os
+import pytest
+
+from star_field_image_simulator.image_generation.canvas_computation import (
+    generate_star_field_image,
+)
+from star_field_image_simulator.image_generation.constants import (
+    get_database_path,
+)
+from star_field_image_simulator.image_generation.data_manipulation import (
+    STAR_DTYPE,
+)
+from star_field_image_simulator.image_generation.selection_cache import (
+    StarSelectionCache,
+    catalog_version,
+)
+
+from numpy.random import default_rng
+
+
+rng = default_rng()
+
+FRAME = (20, 20, 0, 256, 256, 20, 20, 5, 0, 0, 5, 100, 1.0, 0)
+
+
+def random_selection(num_stars):
+    stars = np.zeros(num_stars, dtype=STAR_DTYPE)
+    stars["index"] = rng.integers(0, 120_000, num_stars)
+    stars["u"] = stars["true_u"] = rng.uniform(0, 256, num_stars)
+    stars["v"] = stars["true_v"] = rng.uniform(0, 256, num_stars)
+    stars["magnitude"] = rng.uniform(-1, 6, num_stars)
+    return stars
+
+
+def selection_key(cache, alpha0, delta0=20.0, phi0=0.0):
+    return cache.key(
+        alpha0, delta0, phi0, 20, 20, 256, 256, 5, get_database_path()
+    )
+
+
+def test_catalog_version_is_stable():
+    assert catalog_version(get_database_path()) == catalog_version(
+        get_database_path()
+    )
+
+
+def test_selection_cache_round_trip(tmp_path):
+    cache = StarSelectionCache(tmp_path)
+    stars = random_selection(50)
+    key = selection_key(cache, 20)
+    assert cache.get(key) is None
+    cache.put(key, stars)
+    numpy.testing.assert_array_equal(cache.get(key), stars)
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert cache.hit_rate() == 0.5
+    assert not list(tmp_path.glob("*.tmp"))
+
+
+def test_selection_cache_key_quantizes_attitude(tmp_path):
+    cache = StarSelectionCache(tmp_path, attitude_quantum=1e-6)
+    assert selection_key(cache, 20) == selection_key(cache, 20 + 1e-9)
+    assert selection_key(cache, 20) == selection_key(cache, 380)
+    assert selection_key(cache, 20) != selection_key(cache, 20 + 1e-5)
+    assert selection_key(cache, 20) != selection_key(cache, 20, phi0=1)
+
+
+def test_selection_cache_key_epoch(tmp_path):
+    cache = StarSelectionCache(tmp_path)
+    key = selection_key(cache, 20)
+    at_epoch = cache.key(
+        20, 20, 0, 20, 20, 256, 256, 5, get_database_path(), 2030.0
+    )
+    assert at_epoch != key
+    assert at_epoch != cache.key(
+        20, 20, 0, 20, 20, 256, 256, 5, get_database_path(), 2031.0
+    )
+
+
+def test_selection_cache_evicts_least_recently_used(tmp_path):
+    stars = random_selection(100)
+    entry_size = stars.nbytes + 128
+    cache = StarSelectionCache(tmp_path, max_bytes=int(3.5 * entry_size))
+    keys = [selection_key(cache, alpha0) for alpha0 in range(4)]
+    for age, key in enumerate(keys[:3]):
+        cache.put(key, stars)
+        os.utime(tmp_path / f"{key}.npy", ns=(age, age))
+    # the oldest entry is used again, so the second one goes
+    assert cache.get(keys[0]) is not None
+    cache.put(keys[3], stars)
+    assert cache.evictions == 1
+    assert cache.get(keys[1]) is None
+    assert all(cache.get(key) is not None for key in (keys[0], keys[2]))
+
+
+def write_entry(directory, seed):
+    cache = StarSelectionCache(directory)
+    stars = random_selection(1000)
+    key = selection_key(cache, 42)
+    for _ in range(20):
+        cache.put(key, stars)
+        read = cache.get(key)
+        assert read is not None and len(read) == 1000
+    return cache.hits
+
+
+def test_selection_cache_concurrent_processes(tmp_path):
+    with concurrent.futures.ProcessPoolExecutor(4) as executor:
+        hits = list(executor.map(write_entry, [tmp_path] * 4, range(4)))
+    assert hits == [20] * 4
+    assert len(list(tmp_path.iterdir())) == 1
+
+
+@pytest.mark.parametrize("integrated", [True, False])
+def test_generate_with_selection_cache(integrated, tmp_path):
+    cache = StarSelectionCache(tmp_path)
+    expected, expected_centroids = generate_star_field_image(
+        *FRAME, integrated
+    )
+    for _ in range(2):
+        image, centroids, stats = generate_star_field_image(
+            *FRAME, integrated, return_stats=True, selection_cache=cache
+        )
+        numpy.testing.assert_array_equal(image, expected)
+        numpy.testing.assert_array_equal(centroids, expected_centroids)
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert stats.selection_cache_hits == 1
+    assert "fetch" not in stats.stage_times
@@ -1,8 +1,17 @@
+import numpy as np
+import numpy.testing
 import pytest
 
 from star_field_image_simulator.image_generation.data_manipulation import (
+    CENTROID_DTYPE,
+    STAR_DTYPE,
+    create_centroids_list,
     create_false_stars,
+    create_false_stars_array,
+    perturb_stars,
     remove_random_stars,
+    select_remaining_stars,
+    stars_to_array,
     Star,
 )
 
@@ -47,3 +56,97 @@ def test_add_false_star():
     false_mag = 5.5
     false_stars = create_false_stars(num_false_stars, resX, resY, false_mag)
     assert len(false_stars) == num_false_stars
+
+
+@pytest.mark.parametrize(
+    "num_stars, num_missing_stars, num_remaining_stars",
+    [(8, 0, 8), (8, 3, 5), (8, 7, 3), (2, 1, 2), (0, 5, 0)],
+)
+def test_select_remaining_stars(
+    num_stars, num_missing_stars, num_remaining_stars
+):
+    keep = select_remaining_stars(num_stars, num_missing_stars, rng)
+    assert keep.sum() == num_remaining_stars
+
+
+def test_select_remaining_stars_negative():
+    with pytest.raises(ValueError):
+        select_remaining_stars(8, -1)
+
+
+def test_create_false_stars_array():
+    false_stars = create_false_stars_array(1000, 1024, 512, 5.5, rng)
+    assert len(false_stars) == 1000
+    assert false_stars["is_false"].all()
+    numpy.testing.assert_array_equal(
+        false_stars["index"], -np.arange(1, 1001)
+    )
+    assert (0 <= false_stars["u"]).all() and (false_stars["u"] < 1024).all()
+    assert (0 <= false_stars["v"]).all() and (false_stars["v"] < 512).all()
+    assert (0 <= false_stars["magnitude"]).all()
+    assert (false_stars["magnitude"] < 5.5).all()
+
+
+@pytest.mark.parametrize("position_noise", [0, 0.5, 50])
+def test_perturb_stars(position_noise):
+    stars = np.zeros(10, dtype=STAR_DTYPE)
+    stars["index"] = np.arange(1, 11)
+    stars["u"] = rng.uniform(0, 256, 10)
+    stars["v"] = rng.uniform(0, 128, 10)
+    perturbed = perturb_stars(
+        stars, 4, 100, 256, 128, 5.5, position_noise, rng
+    )
+    assert len(perturbed) == 106
+    assert perturbed["is_false"].sum() == 100
+    real = perturbed[~perturbed["is_false"]]
+    assert set(real["index"]) <= set(stars["index"])
+    assert (0 <= perturbed["u"]).all() and (perturbed["u"] <= 256).all()
+    assert (0 <= perturbed["v"]).all() and (perturbed["v"] <= 128).all()
+    if not position_noise:
+        original = dict(zip(stars["index"], stars["u"]))
+        assert all(original[index] == u for index, u in real[["index", "u"]])
+
+
+def test_stars_to_array():
+    star = Star(18, 22.5, 90.0, 0.5)
+    star.u = 3.0
+    star.v = 4.0
+    array = stars_to_array([star])
+    assert array[["index", "u", "v", "true_u", "magnitude"]].tolist() == [
+        (18, 3.0, 4.0, 3.0, 0.5)
+    ]
+    assert not array["is_false"].any()
+
+
+def test_create_centroids_list():
+    stars = np.zeros(10, dtype=STAR_DTYPE)
+    stars["index"] = np.arange(1, 11)
+    stars["u"] = stars["true_u"] = rng.uniform(0, 256, 10)
+    stars["v"] = stars["true_v"] = rng.uniform(0, 128, 10)
+    stars["magnitude"] = rng.uniform(-1, 6, 10)
+    perturbed = perturb_stars(stars, 0, 5, 256, 128, 5.5, 0.5, rng)
+    centroids = create_centroids_list(perturbed, 100)
+
+    assert centroids.dtype == CENTROID_DTYPE
+    numpy.testing.assert_array_equal(centroids["id"], perturbed["index"])
+    numpy.testing.assert_array_equal(centroids["u"], perturbed["u"])
+    numpy.testing.assert_allclose(
+        centroids["flux"], 100 / 2.512 ** perturbed["magnitude"]
+    )
+    # the ground truth keeps the positions before the position noise
+    real = ~centroids["is_false"]
+    numpy.testing.assert_array_equal(centroids["true_u"][real], stars["u"])
+    numpy.testing.assert_array_equal(centroids["true_v"][real], stars["v"])
+    assert (centroids["u"][real] != stars["u"]).all()
+    assert centroids["is_false"].sum() == 5
+
+
+def test_create_centroids_list_from_stars():
+    star = Star(18, 22.5, 90.0, 0.5)
+    star.u = 3.0
+    star.v = 4.0
+    centroids = create_centroids_list([star])
+    assert centroids[["id", "u", "v", "true_u", "true_v"]].tolist() == [
+        (18, 3.0, 4.0, 3.0, 4.0)
+    ]
+    assert np.isnan(centroids["flux"]).all()
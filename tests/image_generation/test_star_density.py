@@ -0,0 +1,125 @@
+import math
+import numpy as np
+import pytest
+
+from star_field_image_simulator.image_generation.constants import (
+    get_database_path,
+)
+from star_field_image_simulator.image_generation.data_manipulation import (
+    Celestial2Image,
+    create_stars_list,
+    get_catalog_connection,
+)
+from star_field_image_simulator.image_generation import star_density
+from star_field_image_simulator.image_generation.star_density import (
+    StarDensityMap,
+    count_stars_in_fov,
+    get_density_map,
+    sample_attitudes,
+)
+
+from numpy.random import default_rng
+
+
+rng = default_rng(37)
+
+
+def exact_star_count(alpha0, delta0, phi0, fovX, fovY, magnitude):
+    resX = resY = 1024
+    camera = Celestial2Image(alpha0, delta0, phi0, fovX, fovY, resX, resY)
+    return len(
+        create_stars_list(
+            alpha0,
+            delta0,
+            magnitude,
+            fovX,
+            fovY,
+            0,
+            resX,
+            0,
+            resY,
+            camera,
+            get_database_path(),
+        )
+    )
+
+
+def test_density_map_counts_every_star():
+    density_map = StarDensityMap(6, num_ra=360, num_dec=180)
+    assert density_map.counts.shape == (180, 360)
+    (num_stars,) = (
+        get_catalog_connection(get_database_path())
+        .execute("SELECT COUNT(*) FROM star_catalog WHERE magnitude <= 6")
+        .fetchone()
+    )
+    assert density_map.counts.sum() == num_stars
+
+
+def test_density_map_counts_are_cached(tmp_path, monkeypatch):
+    density_map = StarDensityMap(5, cache_directory=tmp_path)
+    assert len(list(tmp_path.glob("density_*.npy"))) == 1
+
+    def no_catalog(path):
+        raise AssertionError("the catalog was scanned again")
+
+    monkeypatch.setattr(star_density, "get_catalog_connection", no_catalog)
+    cached = StarDensityMap(5, cache_directory=tmp_path)
+    np.testing.assert_array_equal(cached.counts, density_map.counts)
+    with pytest.raises(AssertionError):
+        StarDensityMap(5.5, cache_directory=tmp_path)
+
+
+def test_density_map_cells_have_equal_area():
+    density_map = get_density_map(6)
+    z = density_map.centers[..., 2]
+    assert np.allclose(np.linalg.norm(density_map.centers, axis=-1), 1)
+    assert np.allclose(np.diff(z[:, 0]), 2 / density_map.num_dec)
+
+
+@pytest.mark.parametrize("magnitude", [4, 6])
+def test_count_stars_in_fov_matches_catalog(magnitude):
+    errors = []
+    for _ in range(50):
+        alpha0 = rng.uniform(0, 360)
+        delta0 = math.degrees(math.asin(rng.uniform(-1, 1)))
+        phi0 = rng.uniform(-90, 90)
+        fovX, fovY = rng.uniform(5, 25, 2)
+        estimate = count_stars_in_fov(
+            alpha0, delta0, phi0, fovX, fovY, magnitude
+        )
+        exact = exact_star_count(alpha0, delta0, phi0, fovX, fovY, magnitude)
+        errors.append(abs(estimate - exact) / max(exact, 10))
+    # only the stars of the cells cut by the FOV border are misplaced
+    assert np.median(errors) < 0.1
+    assert max(errors) < 0.5
+
+
+@pytest.mark.parametrize("delta0", [-90, 90])
+def test_count_stars_in_fov_at_the_poles(delta0):
+    estimate = count_stars_in_fov(0, delta0, 0, 20, 20, 6)
+    exact = exact_star_count(0, delta0, 0, 20, 20, 6)
+    assert abs(estimate - exact) <= max(0.2 * exact, 3)
+
+
+@pytest.mark.parametrize("min_stars, max_stars", [(3, None), (10, 20)])
+def test_sample_attitudes_meets_constraint(min_stars, max_stars):
+    attitudes = sample_attitudes(
+        20, 10, 10, 5, min_stars, max_stars, roll=(-10, 10), generator=rng
+    )
+    assert attitudes.shape == (20, 3)
+    assert np.all((-10 <= attitudes[:, 2]) & (attitudes[:, 2] <= 10))
+    for alpha0, delta0, phi0 in attitudes:
+        count = count_stars_in_fov(alpha0, delta0, phi0, 10, 10, 5)
+        assert count >= min_stars
+        assert max_stars is None or count <= max_stars
+
+
+def test_sample_attitudes_is_reproducible():
+    first = sample_attitudes(5, 10, 10, 5, generator=default_rng(1))
+    second = sample_attitudes(5, 10, 10, 5, generator=default_rng(1))
+    np.testing.assert_array_equal(first, second)
+
+
+def test_sample_attitudes_gives_up():
+    with pytest.raises(RuntimeError):
+        sample_attitudes(1, 5, 5, 2, min_stars=1000, max_tries=100)
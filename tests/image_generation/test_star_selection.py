@@ -0,0 +1,132 @@
+import numpy.testing
+import pytest
+
+from star_field_image_simulator.image_generation.constants import (
+    U_COORDINATE_ORIGIN,
+    V_COORDINATE_ORIGIN,
+    get_database_path,
+)
+from star_field_image_simulator.image_generation.data_manipulation import (
+    Celestial2Image,
+    create_stars_list,
+    stars_to_array,
+)
+from star_field_image_simulator.image_generation.canvas_computation import (
+    generate_star_field_image,
+)
+from star_field_image_simulator.image_generation.star_selection import (
+    StarSelection,
+)
+
+
+def expected_stars(alpha0, delta0, phi0, fov, res, magnitude):
+    c2i = Celestial2Image(alpha0, delta0, phi0, fov, fov, res, res)
+    return stars_to_array(
+        create_stars_list(
+            alpha0,
+            delta0,
+            magnitude,
+            fov,
+            fov,
+            U_COORDINATE_ORIGIN,
+            res,
+            V_COORDINATE_ORIGIN,
+            res,
+            c2i,
+            get_database_path(),
+        )
+    )
+
+
+def select(selection, alpha0, delta0, phi0, fov, res, magnitude):
+    return selection.select(
+        Celestial2Image(alpha0, delta0, phi0, fov, fov, res, res),
+        magnitude,
+        U_COORDINATE_ORIGIN,
+        res,
+        V_COORDINATE_ORIGIN,
+        res,
+    )
+
+
+def assert_same_stars(stars, expected):
+    numpy.testing.assert_array_equal(stars["index"], expected["index"])
+    numpy.testing.assert_array_equal(stars["magnitude"], expected["magnitude"])
+    for name in ("u", "v", "true_u", "true_v"):
+        numpy.testing.assert_allclose(stars[name], expected[name], atol=1e-8)
+
+
+@pytest.mark.parametrize(
+    "alpha0, delta0", [(20, 20), (0, 0), (359, -30), (120, 88), (0, 90)]
+)
+def test_roll_and_intrinsics_reuse_the_query(alpha0, delta0):
+    selection = StarSelection()
+    for phi0, fov, res, magnitude in [
+        (0, 15, 512, 6),
+        (45, 15, 512, 6),
+        (-80, 10, 256, 6),
+        (30, 12, 1024, 5),
+    ]:
+        assert_same_stars(
+            select(selection, alpha0, delta0, phi0, fov, res, magnitude),
+            expected_stars(alpha0, delta0, phi0, fov, res, magnitude),
+        )
+    assert selection.fetches == 1
+
+
+def test_refetch_beyond_the_cone():
+    selection = StarSelection(margin=2)
+    select(selection, 20, 20, 0, 15, 512, 6)
+    # moves within the margin rotate the cached stars
+    assert_same_stars(
+        select(selection, 21, 20.5, 10, 15, 512, 6),
+        expected_stars(21, 20.5, 10, 15, 512, 6),
+    )
+    assert selection.fetches == 1
+    for alpha0, delta0, fov, magnitude in [
+        (30, 20, 15, 6),
+        (30, 20, 18, 6),
+        (30, 20, 15, 6.5),
+    ]:
+        assert_same_stars(
+            select(selection, alpha0, delta0, 0, fov, 512, magnitude),
+            expected_stars(alpha0, delta0, 0, fov, 512, magnitude),
+        )
+    assert selection.fetches == 4
+
+
+def test_generate_star_field_image_with_star_selection():
+    selection = StarSelection()
+    params = dict(
+        alpha0=20,
+        delta0=20,
+        resX=256,
+        resY=256,
+        fovX=15,
+        fovY=15,
+        magnitude_limit=5,
+        num_missing_stars=0,
+        num_false_stars=0,
+        min_false_star_magnitude=5,
+        star_intensity=100,
+        star_sigma=1,
+        position_noise=0,
+        backend="numpy",
+    )
+    for phi0 in (0, 30, 60):
+        image, centroids = generate_star_field_image(
+            **params, phi0=phi0, star_selection=selection
+        )
+        expected_image, expected_centroids = generate_star_field_image(
+            **params, phi0=phi0
+        )
+        numpy.testing.assert_allclose(image, expected_image, atol=1e-9)
+        numpy.testing.assert_array_equal(
+            centroids["id"], expected_centroids["id"]
+        )
+    assert selection.fetches == 1
+
+
+def test_rejects_negative_margin():
+    with pytest.raises(ValueError):
+        StarSelection(margin=-1)
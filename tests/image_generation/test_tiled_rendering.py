@@ -0,0 +1,106 @@
+import numpy as np
+import numpy.testing
+import pytest
+
+from star_field_image_simulator.image_generation.canvas_computation import (
+    draw_star_field_image,
+)
+from star_field_image_simulator.image_generation.data_manipulation import Star
+from star_field_image_simulator.image_generation.tiled_rendering import (
+    bucket_stars_by_tile,
+    render_tiled_star_field_image,
+)
+
+from numpy.random import default_rng
+
+
+rng = default_rng()
+
+
+def random_stars(num_stars, resX, resY):
+    stars = []
+    for index in range(num_stars):
+        star = Star(index, 0, 0, rng.uniform(-1, 6))
+        star.u = rng.uniform(0, resX)
+        star.v = rng.uniform(0, resY)
+        stars.append(star)
+    # stars straddling tile borders and image edges
+    for index, (u, v) in enumerate([(64, 64), (63.6, 128.2), (0, resY)]):
+        star = Star(num_stars + index, 0, 0, 1)
+        star.u = u
+        star.v = v
+        stars.append(star)
+    return stars
+
+
+def test_bucket_stars_by_tile():
+    u_start = np.array([0, 60, 10, 5])
+    u_stop = np.array([8, 68, 18, 5])
+    v_start = np.array([0, 60, 70, 0])
+    v_stop = np.array([8, 68, 78, 8])
+    buckets = bucket_stars_by_tile(u_start, u_stop, v_start, v_stop, 64, 64, 2)
+    assert sorted(buckets) == [(0, 0), (0, 1), (1, 0), (1, 1)]
+    numpy.testing.assert_array_equal(buckets[(0, 0)], [0, 1])
+    numpy.testing.assert_array_equal(buckets[(0, 1)], [1])
+    numpy.testing.assert_array_equal(buckets[(1, 0)], [1, 2])
+    numpy.testing.assert_array_equal(buckets[(1, 1)], [1])
+
+
+@pytest.mark.parametrize("integrated", [True, False])
+@pytest.mark.parametrize("tile_size", [64, 100, 1000])
+@pytest.mark.parametrize("max_workers", [1, 4])
+def test_tiled_matches_draw(integrated, tile_size, max_workers):
+    stars = random_stars(200, 300, 200)
+    expected, expected_centroids = draw_star_field_image(
+        stars, 300, 200, 100, 1.5, integrated, True
+    )
+    actual, centroids = render_tiled_star_field_image(
+        stars,
+        300,
+        200,
+        100,
+        1.5,
+        integrated,
+        tile_size=tile_size,
+        max_workers=max_workers,
+    )
+    numpy.testing.assert_allclose(actual, expected, rtol=1e-12, atol=1e-12)
+    numpy.testing.assert_array_equal(centroids, expected_centroids)
+
+
+def test_tiled_memmap_output(tmp_path):
+    stars = random_stars(50, 256, 192)
+    expected, _ = draw_star_field_image(stars, 256, 192, 100, 1.0)
+    path = tmp_path / "mosaic.npy"
+    render_tiled_star_field_image(
+        stars, 256, 192, 100, 1.0, tile_size=64, output=path
+    )
+    numpy.testing.assert_allclose(np.load(path), expected, atol=1e-12)
+
+
+def test_tiled_writer_streams_every_tile():
+    stars = random_stars(50, 256, 192)
+    expected, _ = draw_star_field_image(stars, 256, 192, 100, 1.0)
+    streamed = np.full((192, 256), np.nan)
+    origins = []
+
+    def writer(v_origin, u_origin, tile):
+        origins.append((v_origin, u_origin))
+        streamed[
+            v_origin : v_origin + tile.shape[0],
+            u_origin : u_origin + tile.shape[1],
+        ] = tile
+
+    image, _ = render_tiled_star_field_image(
+        stars, 256, 192, 100, 1.0, tile_size=100, writer=writer
+    )
+    assert image is None
+    assert origins == [
+        (v, u) for v in (0, 100) for u in (0, 100, 200)  # row-major order
+    ]
+    numpy.testing.assert_allclose(streamed, expected, atol=1e-12)
+
+
+def test_tiled_invalid_tile_size():
+    with pytest.raises(ValueError):
+        render_tiled_star_field_image([], 256, 256, 100, 1.0, tile_size=0)
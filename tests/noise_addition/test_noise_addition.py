@@ -0,0 +1,107 @@
+import numpy as np
+import numpy.testing
+import os
+import pytest
+import threading
+
+from star_field_image_simulator.noise_addition import noise_addition
+from star_field_image_simulator.noise_addition.noise_addition import (
+    NOISE_BAND_HEIGHT,
+    PARALLEL_NOISE_PIXELS,
+    add_dark_current_noise,
+    add_shot_noise,
+    default_threads,
+    fill_bands,
+)
+
+from numpy.random import default_rng
+
+rng = default_rng()
+
+
+def clean_image(resY=300, resX=200):
+    return rng.uniform(0, 255, (resY, resX))
+
+
+@pytest.mark.parametrize("threads", [2, 3, 8])
+@pytest.mark.parametrize(
+    "add_noise",
+    [
+        lambda image, **kwargs: add_dark_current_noise(
+            image, 0.5, 10, **kwargs
+        ),
+        lambda image, **kwargs: add_shot_noise(image, 1.5, **kwargs),
+    ],
+)
+def test_noise_does_not_depend_on_threads(add_noise, threads):
+    image = clean_image()
+    expected = add_noise(image, seed=42, threads=1)
+    numpy.testing.assert_array_equal(
+        add_noise(image, seed=42, threads=threads), expected
+    )
+    assert not np.array_equal(add_noise(image, seed=43), expected)
+
+
+def test_noise_without_seed_differs():
+    image = clean_image()
+    assert not np.array_equal(
+        add_shot_noise(image, 1.0), add_shot_noise(image, 1.0)
+    )
+
+
+def test_fill_bands_covers_every_row():
+    filled = np.zeros(3 * NOISE_BAND_HEIGHT + 5, dtype=np.int64)
+
+    def fill(rows, generator):
+        filled[rows] += 1
+
+    fill_bands(len(filled), fill, seed=0, threads=4)
+    assert np.all(filled == 1)
+
+
+def test_fill_bands_raises():
+    def fill(rows, generator):
+        raise RuntimeError("band failed")
+
+    with pytest.raises(RuntimeError):
+        fill_bands(1000, fill, seed=0, threads=2)
+
+
+@pytest.mark.parametrize("seed", [0, 1])
+def test_noise_statistics(seed):
+    image = np.full((1024, 256), 100.0)
+    dark = add_dark_current_noise(image, 0.5, 10, seed=seed) - image
+    assert dark.mean() == pytest.approx(5, abs=0.05)
+    assert dark.std() == pytest.approx(np.sqrt(5), rel=0.02)
+    shot = add_shot_noise(image, 2.0, seed=seed) - image
+    assert shot.mean() == pytest.approx(0, abs=0.1)
+    assert shot.std() == pytest.approx(20, rel=0.02)
+
+
+def test_zero_noise_returns_image():
+    image = clean_image()
+    assert add_dark_current_noise(image, 0, 10) is image
+    assert add_shot_noise(image, 0) is image
+
+
+def test_noise_without_seed_follows_module_generator(monkeypatch):
+    image = clean_image()
+    monkeypatch.setattr(noise_addition, "rng", default_rng(7))
+    expected = add_shot_noise(image, 1.0)
+    monkeypatch.setattr(noise_addition, "rng", default_rng(7))
+    numpy.testing.assert_array_equal(add_shot_noise(image, 1.0), expected)
+
+
+def test_default_threads_only_split_large_images():
+    assert default_threads(PARALLEL_NOISE_PIXELS - 1) == 1
+    assert default_threads(PARALLEL_NOISE_PIXELS) == (os.cpu_count() or 1)
+
+
+def test_fill_bands_reuses_thread_pool():
+    def fill(rows, generator):
+        pass
+
+    fill_bands(1000, fill, seed=0, threads=2)
+    num_threads = threading.active_count()
+    fill_bands(1000, fill, seed=0, threads=2)
+    assert threading.active_count() == num_threads
@@ -0,0 +1,125 @@
+import numpy as np
+import numpy.testing
+import pytest
+
+from star_field_image_simulator.frames import render_frame
+from star_field_image_simulator.noise_addition.sensor_model import (
+    SensorModel,
+    shared_sensor_model,
+)
+
+from numpy.random import default_rng
+
+rng = default_rng()
+
+
+def test_maps_depend_on_seed_and_resolution():
+    gain, offset = SensorModel(seed=1).maps(200, 100)
+    assert gain.shape == offset.shape == (100, 200)
+    numpy.testing.assert_array_equal(
+        SensorModel(seed=1).maps(200, 100), np.stack([gain, offset])
+    )
+    assert not np.array_equal(SensorModel(seed=2).maps(200, 100)[0], gain)
+    assert not np.array_equal(SensorModel(seed=1).maps(100, 200)[0], gain.T)
+
+
+def test_maps_are_cached_and_read_only():
+    sensor = SensorModel(seed=rng.integers(1 << 30))
+    maps = sensor.maps(64, 32)
+    assert sensor.maps(64, 32) is maps
+    with pytest.raises(ValueError):
+        maps[0, 0, 0] = 1
+
+
+@pytest.mark.parametrize(
+    "hot_pixel_fraction, dead_pixel_fraction", [(0, 0), (0.01, 0.02)]
+)
+def test_defective_pixels(hot_pixel_fraction, dead_pixel_fraction):
+    sensor = SensorModel(
+        seed=7,
+        prnu=0,
+        fixed_pattern_noise=0,
+        hot_pixel_fraction=hot_pixel_fraction,
+        hot_pixel_intensity=50,
+        dead_pixel_fraction=dead_pixel_fraction,
+    )
+    gain, offset = sensor.maps(100, 100)
+    assert np.count_nonzero(offset == 50) == round(1e4 * hot_pixel_fraction)
+    assert np.count_nonzero(gain == 0) == round(1e4 * dead_pixel_fraction)
+    assert not np.any((gain == 0) & (offset != 0))
+
+
+def test_apply():
+    sensor = SensorModel(seed=3, prnu=0.05, fixed_pattern_noise=2)
+    image = rng.uniform(0, 255, (60, 80))
+    gain, offset = sensor.maps(80, 60)
+    expected = image * gain + offset
+    numpy.testing.assert_allclose(sensor.apply(image), expected)
+    out = image.copy()
+    assert sensor.apply(out, out=out) is out
+    numpy.testing.assert_allclose(out, expected)
+
+
+def test_maps_on_disk(tmp_path):
+    sensor = SensorModel(seed=11, cache_directory=tmp_path)
+    maps = sensor.maps(50, 40)
+    (path,) = tmp_path.glob("sensor_*.npy")
+    numpy.testing.assert_array_equal(np.load(path), maps)
+    # a later run loads the file instead of drawing the maps
+    np.save(path, np.zeros_like(maps))
+    assert (
+        not SensorModel(seed=11, cache_directory=tmp_path).maps(50, 40).any()
+    )
+
+
+@pytest.mark.parametrize(
+    "kwargs",
+    [{"prnu": -1}, {"hot_pixel_fraction": -0.1}, {"dead_pixel_fraction": 2}],
+)
+def test_rejects_invalid_sensor(kwargs):
+    with pytest.raises(ValueError):
+        SensorModel(**kwargs)
+
+
+def test_render_frame_with_sensor():
+    params = {
+        "alpha0": 20,
+        "delta0": 20,
+        "phi0": 0,
+        "fovX": 15,
+        "fovY": 15,
+        "resX": 256,
+        "resY": 256,
+        "magnitude_limit": 5,
+        "num_missing_stars": 0,
+        "num_false_stars": 0,
+        "min_false_star_magnitude": 5,
+        "star_intensity": 100,
+        "star_sigma": 1,
+        "position_noise": 0,
+    }
+    clean, _ = render_frame(params)
+    sensor = {"seed": 4, "prnu": 0.1}
+    image, _ = render_frame({**params, "sensor": sensor})
+    numpy.testing.assert_allclose(image, SensorModel(**sensor).apply(clean))
+
+
+def test_maps_on_disk_are_loaded_once(tmp_path, monkeypatch):
+    SensorModel(seed=12, cache_directory=tmp_path).maps(50, 40)
+    loads = []
+    load = np.load
+    monkeypatch.setattr(
+        np, "load", lambda *args: loads.append(args) or load(*args)
+    )
+    sensor = SensorModel(seed=12, cache_directory=tmp_path)
+    maps = sensor.maps(50, 40)
+    assert sensor.maps(50, 40) is maps
+    assert SensorModel(seed=12, cache_directory=tmp_path).maps(50, 40) is maps
+    assert len(loads) == 1
+
+
+def test_shared_sensor_model():
+    sensor = shared_sensor_model({"seed": 5, "prnu": 0.1})
+    assert shared_sensor_model({"prnu": 0.1, "seed": 5}) is sensor
+    assert shared_sensor_model({"seed": 6, "prnu": 0.1}) is not sensor
+    assert sensor.seed == 5 and sensor.prnu == 0.1
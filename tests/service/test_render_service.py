@@ -0,0 +1,178 @@
+import asyncio
+import json
+import numpy.testing
+import pytest
+import sys
+
+from star_field_image_simulator.image_generation.canvas_computation import (
+    generate_star_field_image,
+)
+from star_field_image_simulator.service.client import (
+    RenderClient,
+    RenderError,
+)
+from star_field_image_simulator.service.protocol import (
+    encode_frame,
+    read_frame,
+)
+from star_field_image_simulator.service.server import (
+    RenderServer,
+    render_batch,
+)
+
+
+FRAME_PARAMS = dict(
+    alpha0=20,
+    delta0=20,
+    phi0=0,
+    resX=160,
+    resY=120,
+    fovX=20,
+    fovY=15,
+    magnitude_limit=5,
+    num_missing_stars=0,
+    num_false_stars=0,
+    min_false_star_magnitude=5,
+    star_intensity=100,
+    star_sigma=1.0,
+    position_noise=0,
+)
+
+
+async def render_frames(params_list, path=None, max_batch_size=8):
+    server = RenderServer(
+        max_batch_size, batch_window=0.01, max_workers=2, use_processes=False
+    )
+    await server.start(path=path)
+    if path is None:
+        client = await RenderClient.connect(port=server.address[1])
+    else:
+        client = await RenderClient.connect(path=path)
+    try:
+        frames = await asyncio.gather(
+            *(client.render(**params) for params in params_list),
+            return_exceptions=True,
+        )
+        return frames, server.batches
+    finally:
+        await client.close()
+        await server.close()
+
+
+def test_frame_round_trip():
+    async def round_trip():
+        reader = asyncio.StreamReader()
+        reader.feed_data(encode_frame(b"frame") + encode_frame(b""))
+        reader.feed_eof()
+        return [await read_frame(reader) for _ in range(3)]
+
+    assert asyncio.run(round_trip()) == [b"frame", b"", None]
+
+
+def test_render_batch_reports_errors_per_frame():
+    results = render_batch([FRAME_PARAMS, dict(FRAME_PARAMS, color=1)])
+    assert results[0][0] == "ok"
+    assert results[1][0] == "error"
+    assert "color" in results[1][1]
+
+
+def test_render_batch_caches_sensor_maps(tmp_path):
+    params = dict(FRAME_PARAMS, sensor={"seed": 11})
+    (expected,) = render_batch([params])
+    (result,) = render_batch([params], sensor_cache=str(tmp_path))
+    numpy.testing.assert_array_equal(result[1], expected[1])
+    assert list(tmp_path.rglob("*.npy"))
+
+
+@pytest.mark.parametrize(
+    "unix_socket",
+    [
+        False,
+        pytest.param(
+            True,
+            marks=pytest.mark.skipif(
+                sys.platform == "win32", reason="no Unix sockets"
+            ),
+        ),
+    ],
+)
+def test_service_matches_generate(unix_socket, tmp_path):
+    path = str(tmp_path / "render.sock") if unix_socket else None
+    params_list = [
+        dict(FRAME_PARAMS, alpha0=alpha0) for alpha0 in (20, 90, 200)
+    ]
+    frames, batches = asyncio.run(render_frames(params_list, path))
+    # concurrent requests are coalesced
+    assert batches < len(params_list)
+    for params, (image, centroids) in zip(params_list, frames):
+        expected, expected_centroids = generate_star_field_image(**params)
+        numpy.testing.assert_array_equal(image, expected)
+        numpy.testing.assert_array_equal(centroids, expected_centroids)
+
+
+def test_service_reports_errors():
+    frames, _ = asyncio.run(
+        render_frames([FRAME_PARAMS, dict(FRAME_PARAMS, method="magic")])
+    )
+    assert frames[0][0].shape == (120, 160)
+    assert isinstance(frames[1], RenderError)
+
+
+def test_service_applies_noise():
+    frames, _ = asyncio.run(
+        render_frames([FRAME_PARAMS, dict(FRAME_PARAMS, nRN=5)])
+    )
+    numpy.testing.assert_array_equal(frames[1][0], frames[0][0] + 5)
+
+
+def test_service_answers_malformed_requests():
+    async def send_raw(payloads):
+        server = RenderServer(max_workers=1, use_processes=False)
+        await server.start()
+        reader, writer = await asyncio.open_connection(
+            port=server.address[1]
+        )
+        try:
+            headers = []
+            for payload in payloads:
+                writer.write(encode_frame(payload))
+                await writer.drain()
+                headers.append(json.loads(await read_frame(reader)))
+            return headers
+        finally:
+            writer.close()
+            await server.close()
+
+    sensor = b'{"id": 5, "params": {"sensor": {"cache_directory": "/"}}}'
+    headers = asyncio.run(
+        send_raw(
+            [b"{not json", b'{"id": 3}', b"[1, 2]", b'{"id": 4, "p', sensor]
+        )
+    )
+    assert [header["status"] for header in headers] == ["error"] * 5
+    assert [header["id"] for header in headers] == [None, 3, None, None, 5]
+    assert "JSONDecodeError" in headers[0]["error"]
+    assert "params" in headers[1]["error"]
+    assert "cache_directory" in headers[4]["error"]
+
+
+def test_close_answers_requests_in_flight():
+    async def close_while_rendering():
+        server = RenderServer(max_workers=1, use_processes=False)
+        await server.start()
+        client = await RenderClient.connect(port=server.address[1])
+        try:
+            frames = asyncio.gather(
+                *(client.render(**FRAME_PARAMS) for _ in range(3))
+            )
+            # let the requests reach the server
+            while server._queue.empty() and not server._renders:
+                await asyncio.sleep(0.001)
+            await server.close()
+            return await frames, server.requests
+        finally:
+            await client.close()
+
+    frames, requests = asyncio.run(close_while_rendering())
+    assert [image.shape for image, _ in frames] == [(120, 160)] * 3
+    assert requests == 3
@@ -0,0 +1,165 @@
+import numpy as np
+import numpy.testing
+import pytest
+
+from star_field_image_simulator.image_generation.canvas_computation import (
+    draw_star_field_image,
+    select_stars,
+)
+from star_field_image_simulator.frames import add_frame_noise, render_frame
+from star_field_image_simulator.pipeline import FramePipeline
+
+from numpy.random import default_rng
+
+rng = default_rng()
+
+PARAMS = {
+    "alpha0": 20,
+    "delta0": 20,
+    "phi0": 0,
+    "fovX": 15,
+    "fovY": 15,
+    "resX": 256,
+    "resY": 256,
+    "magnitude_limit": 5,
+    "num_missing_stars": 1,
+    "num_false_stars": 2,
+    "min_false_star_magnitude": 5,
+    "star_intensity": 100,
+    "star_sigma": 1,
+    "position_noise": 0.1,
+    "backend": "numpy",
+}
+
+
+def test_noise_sweep_renders_once():
+    pipeline = FramePipeline(seed=1)
+    images = [
+        pipeline.render({**PARAMS, "shot_noise": level})[0]
+        for level in np.linspace(0.1, 1, 5)
+    ]
+    assert pipeline.computations == {
+        "selection": 1,
+        "perturbation": 1,
+        "render": 1,
+        "noise": 5,
+    }
+    assert not np.array_equal(images[0], images[1])
+    # the same noise stream scaled by the level
+    clean, _ = pipeline.draw(PARAMS)
+    numpy.testing.assert_allclose(
+        images[1] - clean, (images[0] - clean) * 3.25, atol=1e-9
+    )
+
+
+def test_sigma_sweep_reuses_stars():
+    pipeline = FramePipeline()
+    for sigma in (0.8, 1, 1.2):
+        pipeline.render({**PARAMS, "star_sigma": sigma})
+    assert pipeline.computations["perturbation"] == 1
+    assert pipeline.computations["render"] == 3
+
+
+def test_stages_match_functions():
+    pipeline = FramePipeline(seed=rng.integers(1 << 30))
+    stars = pipeline.select(PARAMS)
+    expected = select_stars(20, 20, 0, 256, 256, 15, 15, 5)
+    numpy.testing.assert_array_equal(stars["index"], expected["index"])
+    for name in ("u", "v", "true_u", "true_v"):
+        numpy.testing.assert_allclose(stars[name], expected[name], atol=1e-8)
+    image, centroids = pipeline.render(PARAMS)
+    expected_image, expected_centroids = draw_star_field_image(
+        pipeline.perturb(PARAMS), 256, 256, 100, 1, backend="numpy"
+    )
+    numpy.testing.assert_array_equal(image, expected_image)
+    numpy.testing.assert_array_equal(centroids, expected_centroids)
+
+
+def test_render_matches_render_frame():
+    params = {**PARAMS, "shot_noise": 0.5, "nDC": 0.5, "tauDC": 2}
+    image, centroids = FramePipeline(seed=5).render(params)
+    expected_image, expected_centroids = render_frame(params, seed=5)
+    numpy.testing.assert_allclose(image, expected_image, atol=1e-8)
+    numpy.testing.assert_array_equal(
+        centroids["id"], expected_centroids["id"]
+    )
+
+
+def test_outputs_are_reproducible_and_read_only():
+    params = {**PARAMS, "shot_noise": 0.5, "nDC": 0.5, "tauDC": 2}
+    image, centroids = FramePipeline(seed=3).render(params)
+    numpy.testing.assert_array_equal(
+        FramePipeline(seed=3).render(params)[0], image
+    )
+    assert not np.array_equal(FramePipeline(seed=4).render(params)[0], image)
+    with pytest.raises(ValueError):
+        image[0, 0] = 1
+    with pytest.raises(ValueError):
+        centroids["u"] = 0
+
+
+def test_noise_stage_matches_add_frame_noise():
+    params = {
+        **PARAMS,
+        "shot_noise": 0.5,
+        "nDC": 0.5,
+        "tauDC": 2,
+        "sensor": {"prnu": 0.01, "seed": 2},
+    }
+    pipeline = FramePipeline(seed=7)
+    image, _ = pipeline.render(params)
+    clean, _ = pipeline.draw(params)
+    numpy.testing.assert_array_equal(
+        image, add_frame_noise(clean, params, seed=7)
+    )
+    # the clean image was not touched by the in place sensor
+    numpy.testing.assert_array_equal(clean, pipeline.draw(PARAMS)[0])
+
+
+def test_roll_sweep_queries_the_catalog_once():
+    pipeline = FramePipeline()
+    for phi0 in (-60, -30, 0, 30, 60):
+        pipeline.render({**PARAMS, "phi0": phi0})
+    assert pipeline.computations["selection"] == 5
+    (star_selection,) = pipeline.star_selections.values()
+    assert star_selection.fetches == 1
+
+
+def test_thinned_roll_sweep_queries_the_thinned_catalog_once():
+    pipeline = FramePipeline()
+    params = {**PARAMS, "magnitude_limit": 8, "stars_per_cell": 2}
+    for phi0 in (-60, 0, 60):
+        stars = pipeline.select({**params, "phi0": phi0})
+    frame = (20, 20, 60, 256, 256, 15, 15, 8)
+    thinned = select_stars(*frame, stars_per_cell=2)
+    numpy.testing.assert_array_equal(stars["index"], thinned["index"])
+    assert 0 < len(thinned) < len(select_stars(*frame))
+    pipeline.select(PARAMS)
+    assert len(pipeline.star_selections) == 2
+    assert [
+        selection.fetches for selection in pipeline.star_selections.values()
+    ] == [1, 1]
+
+
+def test_cache_size():
+    pipeline = FramePipeline(cache_size=2)
+    for level in (0.1, 0.2, 0.3, 0.1):
+        pipeline.render({**PARAMS, "shot_noise": level})
+    assert pipeline.computations["noise"] == 4
+    pipeline.render({**PARAMS, "shot_noise": 0.3})
+    assert pipeline.computations["noise"] == 4
+    pipeline.clear()
+    pipeline.render(PARAMS)
+    assert pipeline.computations["selection"] == 2
+
+
+@pytest.mark.parametrize(
+    "params, match",
+    [
+        ({**PARAMS, "color": 1}, "unknown"),
+        ({name: PARAMS[name] for name in PARAMS if name != "fovX"}, "fovX"),
+    ],
+)
+def test_rejects_invalid_parameters(params, match):
+    with pytest.raises(ValueError, match=match):
+        FramePipeline().render(params)
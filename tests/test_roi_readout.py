@@ -0,0 +1,127 @@
+import numpy as np
+import numpy.testing
+import pytest
+
+from star_field_image_simulator.image_generation.canvas_computation import (
+    draw_star_field_image,
+)
+from star_field_image_simulator.image_generation.data_manipulation import (
+    STAR_DTYPE,
+)
+from star_field_image_simulator.noise_addition.sensor_model import (
+    SensorModel,
+)
+from star_field_image_simulator.roi_readout import (
+    generate_roi_readout,
+    render_windows,
+    roi_windows,
+)
+
+from numpy.random import default_rng
+
+rng = default_rng()
+
+FRAME = {
+    "alpha0": 20,
+    "delta0": 20,
+    "phi0": 0,
+    "resX": 512,
+    "resY": 512,
+    "fovX": 15,
+    "fovY": 15,
+    "magnitude_limit": 5,
+    "num_missing_stars": 0,
+    "num_false_stars": 0,
+    "min_false_star_magnitude": 5,
+    "star_intensity": 100,
+    "star_sigma": 1,
+    "position_noise": 0,
+}
+
+
+def random_stars(num_stars, resX, resY):
+    stars = np.zeros(num_stars, dtype=STAR_DTYPE)
+    stars["index"] = np.arange(num_stars)
+    stars["u"] = stars["true_u"] = rng.uniform(0, resX, num_stars)
+    stars["v"] = stars["true_v"] = rng.uniform(0, resY, num_stars)
+    stars["magnitude"] = rng.uniform(0, 6, num_stars)
+    return stars
+
+
+def test_roi_windows():
+    rois = roi_windows(
+        [10.5, 0.2, 99.9, 300], [20.5, 50, 99.9, 10], 100, 100, 4
+    )
+    numpy.testing.assert_array_equal(
+        rois, [[6, 15, 16, 25], [0, 5, 46, 55], [95, 100, 95, 100]]
+    )
+
+
+@pytest.mark.parametrize("integrated", [True, False])
+@pytest.mark.parametrize("residual_threshold", [None, 0.01])
+def test_windows_match_full_image(integrated, residual_threshold):
+    stars = random_stars(300, 200, 150)
+    image, expected_centroids = draw_star_field_image(
+        stars,
+        200,
+        150,
+        100,
+        1.3,
+        integrated,
+        residual_threshold=residual_threshold,
+        backend="numpy",
+    )
+    rois = [[0, 200, 0, 150], [10, 30, 140, 150], [50, 51, 60, 90]]
+    windows, centroids = render_windows(
+        stars, rois, 200, 150, 100, 1.3, integrated, residual_threshold
+    )
+    for window, (u_start, u_stop, v_start, v_stop) in zip(windows, rois):
+        numpy.testing.assert_allclose(
+            window, image[v_start:v_stop, u_start:u_stop], atol=1e-12
+        )
+    numpy.testing.assert_array_equal(centroids, expected_centroids)
+
+
+def test_readout_around_true_positions():
+    windows, rois, centroids = generate_roi_readout(**FRAME, half_size=5)
+    assert len(windows) == len(rois) == len(centroids)
+    for window, (u_start, u_stop, v_start, v_stop) in zip(windows, rois):
+        assert window.shape == (v_stop - v_start, u_stop - u_start)
+        assert window.max() > 0
+    assert (rois[:, 1] - rois[:, 0] <= 11).all()
+
+
+def test_readout_with_noise_is_reproducible():
+    noise = {
+        "shot_noise": 0.5,
+        "nDC": 0.5,
+        "tauDC": 2,
+        "nRN": 0.1,
+        "sensor": {"seed": 2},
+    }
+    rois = [[0, 40, 0, 30], [100, 120, 200, 260]]
+    windows, _, _ = generate_roi_readout(**FRAME, rois=rois, **noise, seed=5)
+    again, _, _ = generate_roi_readout(**FRAME, rois=rois, **noise, seed=5)
+    for window, other in zip(windows, again):
+        numpy.testing.assert_array_equal(window, other)
+    other, _, _ = generate_roi_readout(**FRAME, rois=rois, **noise, seed=6)
+    assert not np.array_equal(windows[0], other[0])
+
+
+def test_readout_sensor_defects():
+    sensor = {"seed": 8, "prnu": 0.1}
+    rois = np.array([[30, 60, 40, 50]])
+    (clean,), _, _ = generate_roi_readout(**FRAME, rois=rois)
+    (window,), _, _ = generate_roi_readout(**FRAME, rois=rois, sensor=sensor)
+    gain, offset = SensorModel(**sensor).maps(512, 512)
+    numpy.testing.assert_allclose(
+        window, clean * gain[40:50, 30:60] + offset[40:50, 30:60]
+    )
+
+
+def test_readout_around_predictions():
+    windows, rois, _ = generate_roi_readout(
+        **FRAME, predicted=[[100.2, 200.7], [-50, 10]], half_size=3
+    )
+    assert len(windows) == 1
+    numpy.testing.assert_array_equal(rois, [[97, 104, 197, 204]])